@@ -1,38 +1,97 @@
-# scripts/add_data.py
-
-import sqlite3
-import pandas as pd
-from datetime import datetime, timedelta
-import os
-
-# SQLiteデータベースのパス
-DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'eurusd_trading.db')
-
-def add_data():
-    conn = sqlite3.connect(DB_PATH)
-    df_existing = pd.read_sql_query("SELECT * FROM price_data WHERE interval = 'daily' ORDER BY timestamp ASC", conn, parse_dates=['timestamp'])
-    conn.close()
-
-    # 新しいデータを生成（例: 追加で200日分）
-    start_date = df_existing['timestamp'].max() + timedelta(days=1)
-    new_data = {
-        'timestamp': [start_date + timedelta(days=i) for i in range(200)],
-        'symbol': ['EURUSD'] * 200,
-        'open': [1.200 + 0.001 * i for i in range(200)],
-        'high': [1.205 + 0.001 * i for i in range(200)],
-        'low': [1.195 + 0.001 * i for i in range(200)],
-        'close': [1.200 + 0.001 * i for i in range(200)],
-        'volume': [1000 + 10 * i for i in range(200)],
-        'interval': ['daily'] * 200
-    }
-    df_new = pd.DataFrame(new_data)
-
-    # データベースにデータを追加
-    conn = sqlite3.connect(DB_PATH)
-    df_new.to_sql('price_data', conn, if_exists='append', index=False)
-    conn.close()
-
-    print("新しいデータを追加しました。")
-
-if __name__ == "__main__":
-    add_data()
+# scripts/add_data.py
+
+import argparse
+import os
+import logging
+import pandas as pd
+from datetime import timedelta
+from data_coverage import plan_backfill, run_backfill, load_timestamps, trading_calendar
+from fetch_historical_data import fetch_range
+from resample import update_derived_bars, BASE_INTERVAL, DERIVED_INTERVALS
+from synthetic_data import random_walk_ohlcv
+
+# SQLiteデータベースのパス
+DB_PATH = os.environ.get('MT5_DB_PATH', os.path.join(os.path.dirname(__file__), '..', 'data', 'eurusd_trading.db'))
+
+def synthetic_range(symbol, interval, start, end):
+    """
+    指定した期間のバーをランダムウォークで生成します（MT5に接続しない場合の取得関数）。
+
+    同じ期間には常に同じバーを返すよう、開始時刻から乱数シードを決めます。
+
+    Args:
+        symbol (str): シンボル名
+        interval (str): データの間隔
+        start: 最初のバーの開始時刻
+        end: 最後のバーの開始時刻
+
+    Returns:
+        pd.DataFrame: timestamp, open, high, low, close, volume 列を持つデータフレーム
+    """
+    n_bars = len(trading_calendar(start, end, interval))
+    return random_walk_ohlcv(n_bars, symbol, interval, start, seed=int(pd.Timestamp(start).timestamp()))
+
+# 取得元の名前と取得関数の対応
+SOURCES = {
+    'synthetic': synthetic_range,
+    'mt5': fetch_range,
+}
+
+def add_data(symbol='EURUSD', interval=BASE_INTERVAL, since=None, until=None, days=200, source='synthetic'):
+    """
+    保存済みのデータの欠落と、末尾から days 日分の未取得の期間だけを取得して追加します。
+
+    上位の間隔（DERIVED_INTERVALS）は基準の間隔から集計するため、追加した後に集計し直します。
+
+    Args:
+        symbol (str): シンボル名
+        interval (str): データの間隔（DERIVED_INTERVALS 以外）
+        since: 期間の開始時刻（省略時は保存済みの最初のバー）
+        until: 期間の終了時刻（省略時は保存済みの最後のバーの days 日後）
+        days (int): until を省略した場合に末尾から延ばす日数
+        source (str): 取得元（'synthetic' または 'mt5'）
+
+    Returns:
+        dict: {(シンボル, 間隔): 追加したバー数}
+    """
+    if interval in DERIVED_INTERVALS:
+        raise ValueError(f"{interval} は基準の間隔から集計する間隔のため追加できません"
+                         f"（{BASE_INTERVAL} などの基準の間隔を追加してください）")
+    timestamps = load_timestamps(symbol, interval, DB_PATH)
+    if until is None:
+        last = timestamps.max() if len(timestamps) else pd.Timestamp.now().normalize()
+        until = last + timedelta(days=days)
+    if since is None and len(timestamps) == 0:
+        since = pd.Timestamp(until) - timedelta(days=days)
+
+    requests = plan_backfill([symbol], [interval], since, until, DB_PATH)
+    if not requests:
+        print(f"{symbol} {interval}: 欠落しているデータはありません")
+        return {}
+    print(f"{symbol} {interval}: {len(requests)}件の取得で{sum(r.missing for r in requests)}本の欠落を埋めます")
+
+    inserted = run_backfill(requests, SOURCES[source], DB_PATH)
+    rows = inserted.get((symbol, interval), 0)
+    logging.info(f"{symbol} {interval}: {rows}行を追加しました")
+    if rows:
+        # 過去の期間を埋めた場合もあるため、上位の間隔は全期間を集計し直す
+        update_derived_bars(symbol, DERIVED_INTERVALS, interval, DB_PATH, full_refresh=True)
+
+    print(f"新しいデータを{rows}行追加しました。")
+    return inserted
+
+def main():
+    parser = argparse.ArgumentParser(description='price_data の欠落している期間だけを取得して追加します')
+    parser.add_argument('--symbol', default='EURUSD')
+    parser.add_argument('--interval', default=BASE_INTERVAL,
+                        help=f"追加する間隔（{', '.join(DERIVED_INTERVALS)} は追加後に集計し直す）")
+    parser.add_argument('--since', default=None)
+    parser.add_argument('--until', default=None)
+    parser.add_argument('--days', type=int, default=200)
+    parser.add_argument('--source', choices=list(SOURCES), default='synthetic')
+    args = parser.parse_args()
+
+    add_data(args.symbol, args.interval, args.since, args.until, args.days, args.source)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+# scripts/backtest_engine.py
+
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# EnhancedSmaCrossStrategy のパラメータ（backtest_strategy もこの値を使用）
+DEFAULT_PARAMS = {
+    'sma_short_period': 50,
+    'sma_long_period': 200,
+    'atr_period': 14,
+    'risk_percent': 0.01,
+    'bb_period': 50,
+    'bb_dev': 2.1,
+}
+
+DEFAULT_CASH = 100000.0
+
+# 標準偏差が0の場合に使う値（SafeBollingerBands と同じ）
+MIN_STDDEV = 0.00001
+
+TRADE_COLUMNS = ['entry_index', 'exit_index', 'direction', 'entry_price', 'exit_price', 'pnl']
+
+BacktestResult = namedtuple('BacktestResult', ['final_value', 'equity', 'position', 'trades'])
+
+def sma(values, period):
+    """
+    単純移動平均を計算します（最初の period-1 本は NaN）。
+
+    Args:
+        values (np.ndarray): 価格の配列
+        period (int): 期間
+
+    Returns:
+        np.ndarray: 移動平均
+    """
+    return pd.Series(values).rolling(period).mean().to_numpy()
+
+def stddev(values, period):
+    """
+    母標準偏差（backtrader の StandardDeviation と同じ）を計算します。
+
+    Args:
+        values (np.ndarray): 価格の配列
+        period (int): 期間
+
+    Returns:
+        np.ndarray: 標準偏差
+    """
+    return pd.Series(values).rolling(period).std(ddof=0).to_numpy()
+
+def bollinger_bands(close, period, devfactor):
+    """
+    SafeBollingerBands と同じ上下のバンドを計算します。
+
+    Args:
+        close (np.ndarray): 終値の配列
+        period (int): 期間
+        devfactor (float): 標準偏差の倍率
+
+    Returns:
+        tuple: (上バンド, 下バンド)
+    """
+    mid = sma(close, period)
+    sd = stddev(close, period)
+    sd = np.where(sd == 0, MIN_STDDEV, sd)
+    return mid + devfactor * sd, mid - devfactor * sd
+
+def warmup_bars(params):
+    """
+    すべてのインジケーターが揃うまでのバー数（backtrader の minperiod）を返します。
+
+    ATRは前日の終値を使うため period+1 本が必要です。
+
+    Args:
+        params (dict): 戦略のパラメータ
+
+    Returns:
+        int: 最初に売買判定を行うバーまでの本数
+    """
+    return max(params['sma_short_period'], params['sma_long_period'],
+               params['atr_period'] + 1, params['bb_period'])
+
+def _next_true(mask):
+    # 各位置以降で最初に mask が True になる位置（なければ len(mask)）
+    n = len(mask)
+    index = np.where(mask, np.arange(n), n)
+    return np.minimum.accumulate(index[::-1])[::-1]
+
+def simulate(open_, close, sma_short, sma_long, bb_top, bb_bot, warmup, cash=DEFAULT_CASH, stake=1):
+    """
+    インジケーターの配列からSMAクロスの売買をシミュレーションします。
+
+    売買のルールと約定は backtrader で EnhancedSmaCrossStrategy を実行した場合と同じです。
+    - ポジションがなければ、短期SMAが長期SMAより上なら買い、下なら売りの成行注文を出す
+    - 買いポジションは終値が下バンドを下回ったら、売りポジションは上バンドを上回ったら決済する
+    - 注文は次のバーの始値で約定する
+
+    シグナルと決済条件の「次に成立する位置」を配列で求めておき、
+    ループはバーごとではなく取引ごとに1回だけ回します。
+
+    Args:
+        open_ (np.ndarray): 始値
+        close (np.ndarray): 終値
+        sma_short (np.ndarray): 短期SMA
+        sma_long (np.ndarray): 長期SMA
+        bb_top (np.ndarray): ボリンジャーバンドの上バンド
+        bb_bot (np.ndarray): ボリンジャーバンドの下バンド
+        warmup (int): 最初に売買判定を行うバーまでの本数
+        cash (float): 初期資金
+        stake (int): 1回の注文数量
+
+    Returns:
+        BacktestResult: 最終資産、資産曲線、ポジション、取引一覧
+    """
+    n = len(close)
+    start = max(warmup - 1, 0)
+
+    with np.errstate(invalid='ignore'):
+        signal = np.sign(sma_short - sma_long)
+        long_exit = close < bb_bot
+        short_exit = close > bb_top
+    signal = np.nan_to_num(signal)
+    signal[:start] = 0
+
+    next_signal = _next_true(signal != 0)
+    next_exit = {1: _next_true(long_exit), -1: _next_true(short_exit)}
+
+    trades = []
+    i = start
+    while i < n:
+        entry_bar = next_signal[i]
+        # 最後のバーで出した注文は約定しない
+        if entry_bar >= n - 1:
+            break
+        direction = int(signal[entry_bar])
+        fill = entry_bar + 1
+        exit_bar = next_exit[direction][fill]
+        exit_fill = exit_bar + 1 if exit_bar < n - 1 else n
+        trades.append((fill, exit_fill, direction))
+        i = exit_fill
+
+    position_delta = np.zeros(n + 1)
+    cash_delta = np.zeros(n + 1)
+    if trades:
+        fills, exits, directions = (np.array(column) for column in zip(*trades))
+        sizes = directions * stake
+        np.add.at(position_delta, fills, sizes)
+        np.add.at(position_delta, exits, -sizes)
+        np.add.at(cash_delta, fills, -sizes * open_[fills])
+        closed = exits < n
+        np.add.at(cash_delta, exits[closed], sizes[closed] * open_[exits[closed]])
+
+    position = np.cumsum(position_delta[:n])
+    equity = cash + np.cumsum(cash_delta[:n]) + position * close
+
+    trade_frame = pd.DataFrame(trades, columns=TRADE_COLUMNS[:3])
+    if trades:
+        trade_frame['entry_price'] = open_[fills]
+        exit_prices = np.full(len(trades), np.nan)
+        exit_prices[closed] = open_[exits[closed]]
+        trade_frame['exit_price'] = exit_prices
+        trade_frame['pnl'] = (exit_prices - open_[fills]) * sizes
+        # 未決済の取引は exit_index を -1 とする
+        trade_frame.loc[~closed, 'exit_index'] = -1
+    else:
+        trade_frame = pd.DataFrame(columns=TRADE_COLUMNS)
+
+    final_value = float(equity[-1]) if n else cash
+    return BacktestResult(final_value, equity, position, trade_frame)
+
+def run_backtest(df, cash=DEFAULT_CASH, stake=1, **params):
+    """
+    価格データに対して EnhancedSmaCrossStrategy をベクトル化したエンジンで実行します。
+
+    Args:
+        df (pd.DataFrame): open, close 列を持つ価格データ（backtest_strategy.fetch_price_data の戻り値）
+        cash (float): 初期資金
+        stake (int): 1回の注文数量
+        **params: DEFAULT_PARAMS を上書きするパラメータ
+
+    Returns:
+        BacktestResult: 最終資産、資産曲線、ポジション、取引一覧
+    """
+    params = {**DEFAULT_PARAMS, **params}
+    open_ = df['open'].to_numpy(dtype='float64')
+    close = df['close'].to_numpy(dtype='float64')
+    bb_top, bb_bot = bollinger_bands(close, params['bb_period'], params['bb_dev'])
+    return simulate(open_, close,
+                    sma(close, params['sma_short_period']),
+                    sma(close, params['sma_long_period']),
+                    bb_top, bb_bot, warmup_bars(params), cash=cash, stake=stake)
@@ -0,0 +1,42 @@
+# benchmarks/bench_backtest.py
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from backtest_engine import run_backtest
+from backtest_strategy import run_cerebro
+from synthetic_data import random_walk_ohlcv
+
+def _time(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description='ベクトル化エンジンと backtrader Cerebro のバックテスト比較')
+    parser.add_argument('--bars', type=int, default=1_000_000)
+    parser.add_argument('--short', type=int, default=50, help='短期SMAの期間')
+    parser.add_argument('--long', type=int, default=200, help='長期SMAの期間')
+    args = parser.parse_args()
+
+    df = random_walk_ohlcv(args.bars)
+    params = {'sma_short_period': args.short, 'sma_long_period': args.long}
+
+    vectorized, vec_elapsed = _time(run_backtest, df, **params)
+    cerebro_value, cerebro_elapsed = _time(run_cerebro, df, **params)
+
+    # 同じデータで最終資産が一致すること（約定価格・取引のタイミングがすべて同じ）
+    np.testing.assert_allclose(vectorized.final_value, cerebro_value, rtol=0, atol=1e-6)
+    print(f"final value: vectorized={vectorized.final_value:.6f} cerebro={cerebro_value:.6f} "
+          f"({len(vectorized.trades)} trades)")
+    print(f"cerebro {args.bars:,} bars: {cerebro_elapsed:.3f}s")
+    print(f"vectorized {args.bars:,} bars: {vec_elapsed:.3f}s "
+          f"({cerebro_elapsed / max(vec_elapsed, 1e-9):.0f}x)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+# benchmarks/bench_confluence.py
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from confluence import TIMEFRAME_WEIGHTS, ZONE_PIPS, build_zones
+from symbols import SYMBOLS, pip_size
+
+def make_levels(n_symbols, levels_per_interval, seed=0):
+    """
+    シンボル・時間足ごとにランダムな価格レベルを生成します。
+
+    Args:
+        n_symbols (int): シンボル数
+        levels_per_interval (int): シンボル・時間足ごとの価格レベルの数
+        seed (int): 乱数シード
+
+    Returns:
+        pd.DataFrame: symbol, interval, level, strength 列
+    """
+    rng = np.random.default_rng(seed)
+    frames = []
+    for symbol in list(SYMBOLS)[:n_symbols]:
+        base = 10000 * pip_size(symbol)
+        for interval in TIMEFRAME_WEIGHTS:
+            frames.append(pd.DataFrame({
+                'symbol': symbol,
+                'interval': interval,
+                'level': base * (1 + rng.uniform(-0.1, 0.1, levels_per_interval)),
+                'strength': 1 + rng.exponential(1.0, levels_per_interval),
+            }))
+    return pd.concat(frames, ignore_index=True)
+
+def zones_loop(levels, pips=ZONE_PIPS):
+    # 比較用: シンボルごと・価格レベルごとに Python のループでまとめる
+    rows = []
+    for symbol, group in levels.groupby('symbol', sort=True):
+        tolerance = pips * pip_size(symbol)
+        current = None
+        for level, interval, strength in sorted(zip(group['level'], group['interval'], group['strength'])):
+            w = TIMEFRAME_WEIGHTS.get(interval, 1.0) * strength
+            if current is None or level - current['upper'] > tolerance:
+                current = {'symbol': symbol, 'lower': level, 'upper': level, 'weight': 0.0, 'sum': 0.0}
+                rows.append(current)
+            current['upper'] = level
+            current['weight'] += w
+            current['sum'] += w * level
+    return [(r['symbol'], r['sum'] / r['weight'], r['weight']) for r in rows]
+
+def main():
+    parser = argparse.ArgumentParser(description='confluence.build_zones のスループット')
+    parser.add_argument('--symbols', type=int, default=40)
+    parser.add_argument('--levels', type=int, default=50, help='シンボル・時間足ごとの価格レベルの数')
+    args = parser.parse_args()
+
+    levels = make_levels(args.symbols, args.levels)
+
+    start = time.perf_counter()
+    zones = build_zones(levels)
+    elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    expected = zones_loop(levels)
+    loop_elapsed = time.perf_counter() - start
+
+    # ループでまとめた結果と同じゾーンになること
+    assert len(expected) == len(zones)
+    np.testing.assert_allclose(zones['level'], [level for _, level, _ in expected], rtol=1e-12)
+    np.testing.assert_allclose(zones['weight'], [weight for _, _, weight in expected], rtol=1e-12)
+
+    print(f"{len(levels):,} levels, {levels['symbol'].nunique()} symbols -> {len(zones):,} zones")
+    print(f"loop: {loop_elapsed:.3f}s")
+    print(f"build_zones: {elapsed:.3f}s ({len(levels) / elapsed:,.0f} levels/sec, "
+          f"{loop_elapsed / max(elapsed, 1e-9):.0f}x)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+# benchmarks/bench_level_clustering.py
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sklearn.cluster import KMeans
+from level_clustering import cluster_levels, inertia
+
+def make_levels(n_points, n_levels=5, seed=0):
+    """
+    いくつかの価格レベルの周りに集まるピボット値を生成します。
+
+    Args:
+        n_points (int): 値の個数
+        n_levels (int): 真の価格レベルの数
+        seed (int): 乱数シード
+
+    Returns:
+        np.ndarray: 値
+    """
+    rng = np.random.default_rng(seed)
+    centers = 1.05 + np.sort(rng.uniform(0, 0.2, n_levels))
+    labels = rng.integers(0, n_levels, n_points)
+    return centers[labels] + rng.normal(0, 0.004, n_points)
+
+def _time(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description='1次元クラスタリングと sklearn KMeans の比較')
+    parser.add_argument('--points', type=int, default=10_000_000)
+    parser.add_argument('--clusters', type=int, default=5)
+    args = parser.parse_args()
+
+    # 小さなデータでは動的計画法は厳密解なので、KMeans の誤差を上回らないこと
+    small = make_levels(2000, args.clusters, seed=1)
+    dp_small = cluster_levels(small, k=args.clusters, method='dp')
+    kmeans_small = KMeans(n_clusters=args.clusters, random_state=0).fit(small.reshape(-1, 1))
+    assert inertia(small, dp_small) <= kmeans_small.inertia_ * (1 + 1e-9)
+
+    values = make_levels(args.points, args.clusters)
+    kmeans, kmeans_elapsed = _time(KMeans(n_clusters=args.clusters, random_state=0).fit,
+                                   values.reshape(-1, 1))
+    kmeans_inertia = inertia(values, kmeans.cluster_centers_.ravel())
+    print(f"kmeans {args.points:,} points: {kmeans_elapsed:.3f}s inertia={kmeans_inertia:.6f}")
+
+    for method, k in [('dp', args.clusters), ('dp', None), ('kde', args.clusters),
+                      ('minibatch', args.clusters)]:
+        centers, elapsed = _time(cluster_levels, values, k=k, method=method)
+        label = f"{method}{'(auto k)' if k is None else ''}"
+        print(f"{label} {args.points:,} points: {elapsed:.3f}s k={len(centers)} "
+              f"inertia={inertia(values, centers):.6f} ({kmeans_elapsed / max(elapsed, 1e-9):.1f}x)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+# benchmarks/bench_pivot_points.py
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from calculate_pivot_points import calculate_pivot_points, PIVOT_COLUMNS
+from synthetic_data import random_walk_ohlcv
+
+def calculate_pivot_points_loop(df):
+    """
+    従来の iterrows による標準ピボットポイント計算（比較用）。
+
+    Args:
+        df (pd.DataFrame): 価格データ
+
+    Returns:
+        pd.DataFrame: ピボットポイントデータ
+    """
+    pivot_points = []
+    for index, row in df.iterrows():
+        pivot = (row['high'] + row['low'] + row['close']) / 3
+        support1 = (2 * pivot) - row['high']
+        resistance1 = (2 * pivot) - row['low']
+        support2 = pivot - (row['high'] - row['low'])
+        resistance2 = pivot + (row['high'] - row['low'])
+        pivot_points.append({
+            'timestamp': row['timestamp'],
+            'Pivot': pivot,
+            'Support1': support1,
+            'Resistance1': resistance1,
+            'Support2': support2,
+            'Resistance2': resistance2
+        })
+    return pd.DataFrame(pivot_points)
+
+def _time(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description='ピボットポイント計算のベンチマーク')
+    parser.add_argument('--bars', type=int, default=1_000_000)
+    parser.add_argument('--loop-bars', type=int, default=None,
+                        help='iterrows 版に渡すバー数（省略時は --bars と同じ）')
+    args = parser.parse_args()
+
+    df = random_walk_ohlcv(args.bars, interval='15m')
+    loop_bars = args.loop_bars or args.bars
+
+    for method in ['standard', 'fibonacci', 'camarilla', 'woodie']:
+        _, elapsed = _time(calculate_pivot_points, df, method=method)
+        print(f"vectorized[{method}] {args.bars:,} bars: {elapsed:.3f}s")
+
+    vectorized, vec_elapsed = _time(calculate_pivot_points, df.iloc[:loop_bars])
+    looped, loop_elapsed = _time(calculate_pivot_points_loop, df.iloc[:loop_bars])
+    np.testing.assert_allclose(vectorized[PIVOT_COLUMNS].to_numpy(),
+                               looped[PIVOT_COLUMNS].to_numpy(), rtol=1e-12)
+    print(f"iterrows {loop_bars:,} bars: {loop_elapsed:.3f}s")
+    print(f"vectorized {loop_bars:,} bars: {vec_elapsed:.3f}s "
+          f"({loop_elapsed / max(vec_elapsed, 1e-9):.0f}x)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+# benchmarks/bench_storage.py
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from setup_database import setup_database
+from storage import get_backend
+from synthetic_data import random_walk_ohlcv
+
+def _time(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description='SQLite と Parquet の読み込み時間の比較')
+    parser.add_argument('--bars', type=int, default=10_000_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='mt5_bench_')
+    try:
+        df = random_walk_ohlcv(args.bars).set_index('timestamp')
+        db_path = os.path.join(workdir, 'bench.db')
+        setup_database(db_path)
+        backends = {
+            'sqlite': get_backend('sqlite', db_path=db_path),
+            'parquet': get_backend('parquet', root=os.path.join(workdir, 'parquet')),
+        }
+
+        for name, backend in backends.items():
+            _, elapsed = _time(backend.write_ohlc, df, 'EURUSD', '1m')
+            print(f"{name} write {args.bars:,} bars: {elapsed:.2f}s")
+
+        for name, backend in backends.items():
+            timings = []
+            for _ in range(args.repeat):
+                loaded, elapsed = _time(backend.load_ohlc, 'EURUSD', '1m', use_cache=False)
+                timings.append(elapsed)
+            assert len(loaded) == args.bars
+            print(f"{name} load {args.bars:,} bars: best {min(timings):.2f}s")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
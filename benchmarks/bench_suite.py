@@ -0,0 +1,222 @@
+# benchmarks/bench_suite.py
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import platform
+import tempfile
+from contextlib import nullcontext
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import data_access
+from backtest_engine import run_backtest
+from bulk_writer import bulk_write_frame
+from calculate_pivot_points import calculate_pivot_points
+from confluence import build_zones, levels_frame
+from extract_levels import extract_levels
+from filter_levels_with_rsi import calculate_rsi, filter_levels_with_rsi
+from instrumentation import Instrumentation, StageMetrics
+from level_scoring import TOUCH_TOLERANCE_PIPS, count_hits
+from setup_database import setup_database
+from symbols import pip_size
+from synthetic_data import random_walk_ohlcv
+
+PRICE_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume', 'symbol', 'interval']
+
+STAGES = ['ingest', 'load', 'pivots', 'levels', 'rsi_filter', 'combine', 'backtest']
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+# 基準の結果よりこの割合以上遅くなったステージを退行とみなす
+DEFAULT_THRESHOLD = 0.2
+
+NUM_CLUSTERS = 5
+
+def run_series(run, bars, symbol, interval, db_path, stages):
+    """
+    1つの系列に対して各ステージを1回ずつ実行し、計測します。
+
+    Args:
+        run (Instrumentation): 計測
+        bars (pd.DataFrame): random_walk_ohlcv の戻り値
+        symbol (str): シンボル名
+        interval (str): データの間隔
+        db_path (str): ベンチマーク用のデータベースのパス
+        stages (list): 実行するステージ名
+    """
+    def timed(name):
+        # 後段のステージは前段の出力を使うため、対象外のステージも計測せずに実行する
+        if name not in stages:
+            return nullcontext(StageMetrics(name, symbol, interval))
+        return run.stage(name, symbol, interval)
+
+    if 'ingest' in stages:
+        with data_access.connection(db_path) as conn:
+            conn.execute("DELETE FROM price_data WHERE symbol = ? AND interval = ?", (symbol, interval))
+            conn.commit()
+        with timed('ingest') as metrics:
+            metrics.add_rows(bulk_write_frame(db_path, 'price_data', bars.assign(symbol=symbol, interval=interval),
+                                              PRICE_COLUMNS, mode='ignore').rows)
+    if 'load' in stages:
+        with timed('load') as metrics:
+            metrics.add_rows(len(data_access.load_ohlc(symbol, interval, db_path=db_path, use_cache=False)))
+
+    with timed('pivots') as metrics:
+        pivots = calculate_pivot_points(bars)
+        metrics.add_rows(len(pivots))
+    with timed('levels') as metrics:
+        levels = extract_levels(pivots, num_clusters=NUM_CLUSTERS)
+        metrics.add_rows(len(pivots) * 2)
+
+    indexed = bars.set_index('timestamp')
+    if 'rsi_filter' in stages:
+        with timed('rsi_filter') as metrics:
+            rsi = calculate_rsi(indexed, window=14)
+            filter_levels_with_rsi(rsi, levels, indexed['close'].iloc[-1])
+            metrics.add_rows(len(indexed))
+    if 'combine' in stages:
+        with timed('combine') as metrics:
+            scores = count_hits(levels, indexed, TOUCH_TOLERANCE_PIPS * pip_size(symbol))
+            build_zones(levels_frame({interval: levels}, symbol, {interval: scores}))
+            metrics.add_rows(len(indexed))
+    if 'backtest' in stages:
+        with timed('backtest') as metrics:
+            run_backtest(bars)
+            metrics.add_rows(len(bars))
+
+def run_suite(sizes, symbols, intervals, stages=STAGES, repeat=1, seed=0):
+    """
+    バーの本数・シンボル・間隔の組み合わせごとにステージを実行し、最短の時間を集計します。
+
+    Args:
+        sizes (list): 1系列あたりのバーの本数のリスト
+        symbols (list): シンボル名のリスト
+        intervals (list): 間隔のリスト
+        stages (list): 実行するステージ名
+        repeat (int): 繰り返し回数（ステージごとに最短の時間を採用）
+        seed (int): 乱数シード
+
+    Returns:
+        list: bars, symbol, interval, stage, seconds, cpu_seconds, rows, rows_per_sec, max_rss_mb を持つ辞書のリスト
+    """
+    workdir = tempfile.mkdtemp(prefix='mt5_bench_')
+    results = []
+    try:
+        db_path = os.path.join(workdir, 'bench.db')
+        setup_database(db_path)
+        for n_bars in sizes:
+            for symbol in symbols:
+                for interval in intervals:
+                    bars = random_walk_ohlcv(n_bars, symbol, interval, seed=seed)
+                    with Instrumentation('bench_suite', trace_sql=False, json_log=None) as run:
+                        for _ in range(repeat):
+                            run_series(run, bars, symbol, interval, db_path, stages)
+                    summary = run.summary().groupby('stage', sort=False).agg(
+                        seconds=('seconds', 'min'), cpu_seconds=('cpu_seconds', 'min'),
+                        rows=('rows', 'max'), max_rss_mb=('max_rss_mb', 'max'))
+                    for stage, row in summary.iterrows():
+                        result = {'bars': n_bars, 'symbol': symbol, 'interval': interval, 'stage': stage,
+                                  'seconds': row['seconds'], 'cpu_seconds': row['cpu_seconds'],
+                                  'rows': int(row['rows']),
+                                  'rows_per_sec': row['rows'] / row['seconds'] if row['seconds'] else None,
+                                  'max_rss_mb': row['max_rss_mb']}
+                        results.append(result)
+                        print(f"{n_bars:>12,} {symbol} {interval:<6} {stage:<12} {row['seconds']:10.4f}s")
+    finally:
+        data_access.close_all()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+def environment():
+    """
+    結果の比較に必要な実行環境の情報を返します。
+    """
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+    }
+
+def save_results(results, path, args):
+    """
+    結果を JSON で保存します。
+
+    Args:
+        results (list): run_suite の戻り値
+        path (str): 出力先のファイル
+        args (dict): 実行時の引数
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'created_at': datetime.now().isoformat(timespec='seconds'), 'args': args,
+                   'environment': environment(), 'results': results},
+                  f, ensure_ascii=False, indent=2)
+
+def compare(results, baseline_path, threshold=DEFAULT_THRESHOLD):
+    """
+    基準の結果と比較し、遅くなったステージを返します。
+
+    Args:
+        results (list): run_suite の戻り値
+        baseline_path (str): 基準の結果の JSON ファイル
+        threshold (float): 退行とみなす遅くなった割合
+
+    Returns:
+        list: (bars, symbol, interval, stage, 基準の秒数, 今回の秒数) のリスト
+    """
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {(r['bars'], r['symbol'], r['interval'], r['stage']): r['seconds']
+                    for r in json.load(f)['results']}
+    regressions = []
+    for r in results:
+        key = (r['bars'], r['symbol'], r['interval'], r['stage'])
+        if key not in baseline:
+            continue
+        before, after = baseline[key], r['seconds']
+        ratio = after / before if before else float('inf')
+        mark = ' <- 退行' if ratio > 1 + threshold else ''
+        print(f"{r['bars']:>12,} {r['symbol']} {r['interval']:<6} {r['stage']:<12} "
+              f"{before:10.4f}s -> {after:10.4f}s ({ratio:5.2f}x){mark}")
+        if mark:
+            regressions.append((*key, before, after))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='合成データでパイプラインの各ステージの処理時間を計測します')
+    parser.add_argument('--bars', type=int, nargs='+', default=[10_000, 1_000_000, 10_000_000],
+                        help='1系列あたりのバーの本数（複数指定可）')
+    parser.add_argument('--symbols', nargs='+', default=['EURUSD'])
+    parser.add_argument('--intervals', nargs='+', default=['1m'])
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None,
+                        help='結果の JSON の出力先（省略時は benchmarks/results/bench_<日時>.json）')
+    parser.add_argument('--baseline', default=None, help='比較する基準の結果の JSON')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='退行とみなす遅くなった割合')
+    args = parser.parse_args()
+
+    results = run_suite(args.bars, args.symbols, args.intervals, args.stages, args.repeat, args.seed)
+    output = args.output or os.path.join(RESULTS_DIR, f"bench_{datetime.now():%Y%m%d-%H%M%S}.json")
+    save_results(results, output, vars(args))
+    print(f"結果を保存しました: {output}")
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)}件のステージが基準より{args.threshold:.0%}以上遅くなりました")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
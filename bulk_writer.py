@@ -0,0 +1,176 @@
+# scripts/bulk_writer.py
+
+import sqlite3
+import time
+import logging
+from collections import namedtuple
+from itertools import islice
+
+import pandas as pd
+
+import data_access
+from data_access import apply_pragmas, TIMESTAMP_FORMAT
+
+# executemany に一度に渡す行数
+DEFAULT_CHUNK_SIZE = 50000
+
+# 書き込みモードごとの INSERT 句
+_INSERT_VERBS = {
+    'insert': 'INSERT',
+    'replace': 'INSERT OR REPLACE',
+    'ignore': 'INSERT OR IGNORE',
+    'upsert': 'INSERT',
+}
+
+class WriteResult(namedtuple('WriteResult', ['rows', 'seconds'])):
+    """書き込み行数（'ignore' で無視された行は含まない）と所要時間（秒）"""
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.seconds if self.seconds > 0 else float('inf')
+
+def connect(db_path):
+    """
+    PRAGMAを設定済みのSQLite接続を開きます。
+
+    Args:
+        db_path (str): データベースのパス
+
+    Returns:
+        sqlite3.Connection: SQLite接続
+    """
+    conn = sqlite3.connect(db_path)
+    apply_pragmas(conn)
+    return conn
+
+def build_insert_sql(table, columns, mode='insert', conflict_columns=None):
+    """
+    書き込みモードに応じた INSERT 文を組み立てます。
+
+    Args:
+        table (str): テーブル名
+        columns (list): 列名のリスト
+        mode (str): 'insert', 'replace', 'ignore', 'upsert' のいずれか
+        conflict_columns (list): UPSERT時の競合判定列
+
+    Returns:
+        str: INSERT 文
+    """
+    if mode not in _INSERT_VERBS:
+        raise ValueError(f"未対応の書き込みモードです: {mode}")
+
+    placeholders = ', '.join('?' for _ in columns)
+    sql = f"{_INSERT_VERBS[mode]} INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+
+    if mode == 'upsert':
+        if not conflict_columns:
+            raise ValueError("UPSERTには conflict_columns の指定が必要です")
+        updates = [c for c in columns if c not in conflict_columns]
+        if updates:
+            assignments = ', '.join(f"{c} = excluded.{c}" for c in updates)
+            sql += f" ON CONFLICT ({', '.join(conflict_columns)}) DO UPDATE SET {assignments}"
+        else:
+            sql += f" ON CONFLICT ({', '.join(conflict_columns)}) DO NOTHING"
+    return sql
+
+def frame_rows(df, columns, timestamp_columns=('timestamp',), timestamp_storage='text'):
+    """
+    データフレームを executemany に渡せるタプルの列に変換します。
+
+    タイムスタンプ列は列単位で保存形式（文字列またはエポックミリ秒）に変換し、
+    数値は Python の型に変換します。
+
+    Args:
+        df (pd.DataFrame): 変換するデータフレーム
+        columns (list): 出力する列名のリスト
+        timestamp_columns (tuple): 変換するタイムスタンプ列
+        timestamp_storage (str): 'text' または 'epoch_ms'
+
+    Returns:
+        iterator: 行タプルのイテレータ
+    """
+    values = []
+    for column in columns:
+        series = df[column]
+        if column in timestamp_columns and timestamp_storage == 'epoch_ms':
+            values.append(data_access.to_epoch_ms(series).tolist())
+            continue
+        if column in timestamp_columns:
+            series = pd.to_datetime(series).dt.strftime(TIMESTAMP_FORMAT)
+        values.append(series.tolist())
+    return zip(*values)
+
+def _chunks(rows, chunk_size):
+    iterator = iter(rows)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+def bulk_write(db_path, table, columns, rows, mode='insert', conflict_columns=None,
+               chunk_size=DEFAULT_CHUNK_SIZE, conn=None):
+    """
+    行をチャンク単位の executemany で一括書き込みします。
+
+    すべてのチャンクは1つのトランザクション内で書き込まれ、失敗した場合はロールバックされます。
+
+    Args:
+        db_path (str): データベースのパス（conn 指定時は無視）
+        table (str): テーブル名
+        columns (list): 列名のリスト
+        rows (iterable): 行タプルのイテラブル
+        mode (str): 'insert', 'replace', 'ignore', 'upsert' のいずれか
+        conflict_columns (list): UPSERT時の競合判定列
+        chunk_size (int): executemany 1回あたりの行数
+        conn (sqlite3.Connection): 既存の接続（省略時はプールから取得）
+
+    Returns:
+        WriteResult: 書き込んだ行数と所要時間
+    """
+    sql = build_insert_sql(table, columns, mode, conflict_columns)
+    if conn is None:
+        with data_access.connection(db_path) as pooled:
+            return bulk_write(db_path, table, columns, rows, mode, conflict_columns, chunk_size, pooled)
+
+    start = time.perf_counter()
+    total = 0
+    try:
+        with conn:
+            for chunk in _chunks(rows, chunk_size):
+                # 渡した行数ではなく SQLite が実際に書き込んだ行数を数える（'ignore' で無視した行を除く）
+                total += conn.executemany(sql, chunk).rowcount
+    finally:
+        # 書き込み後は読み込みキャッシュを無効にする
+        data_access.bump_generation(db_path)
+
+    result = WriteResult(total, time.perf_counter() - start)
+    logging.info(f"{table}: {result.rows}行を書き込みました（{result.rows_per_sec:,.0f} rows/sec）")
+    return result
+
+def bulk_write_frame(db_path, table, df, columns, mode='insert', conflict_columns=None,
+                     chunk_size=DEFAULT_CHUNK_SIZE, conn=None):
+    """
+    データフレームを一括書き込みします。
+
+    Args:
+        db_path (str): データベースのパス
+        table (str): テーブル名
+        df (pd.DataFrame): 書き込むデータフレーム
+        columns (list): 書き込む列名のリスト（データフレームの列名と一致）
+        mode (str): 'insert', 'replace', 'ignore', 'upsert' のいずれか
+        conflict_columns (list): UPSERT時の競合判定列
+        chunk_size (int): executemany 1回あたりの行数
+        conn (sqlite3.Connection): 既存の接続
+
+    Returns:
+        WriteResult: 書き込んだ行数と所要時間
+    """
+    if conn is None:
+        with data_access.connection(db_path) as pooled:
+            return bulk_write_frame(db_path, table, df, columns, mode, conflict_columns, chunk_size, pooled)
+
+    # timestamp 列はテーブルの保存形式（TEXT / INTEGER）に合わせて変換する
+    rows = frame_rows(df, columns, timestamp_storage=data_access.timestamp_storage(conn, table))
+    return bulk_write(db_path, table, columns, rows, mode=mode,
+                      conflict_columns=conflict_columns, chunk_size=chunk_size, conn=conn)
@@ -1,122 +1,171 @@
-# scripts/calculate_pivot_points.py
-
-import sqlite3
-import pandas as pd
-import os
-import logging
-
-# ログディレクトリとファイル名を設定
-LOG_DIR = os.path.join(os.path.dirname(__file__), '..', 'logs')
-LOG_FILE = os.path.join(LOG_DIR, 'pivot_calculation.log')
-
-# ログディレクトリが存在しない場合は作成
-os.makedirs(LOG_DIR, exist_ok=True)
-
-# ログの設定
-logging.basicConfig(
-    filename=LOG_FILE,
-    level=logging.INFO,
-    format='%(asctime)s %(levelname)s:%(message)s'
-)
-
-# SQLiteデータベースのパス
-DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'eurusd_trading.db')
-
-def fetch_price_data(interval):
-    """
-    データベースから指定した間隔の価格データを取得します。
-    
-    Args:
-        interval (str): データの間隔（'daily' または 'weekly'）
-    
-    Returns:
-        pd.DataFrame: 価格データ
-    """
-    conn = sqlite3.connect(DB_PATH)
-    query = f"""
-    SELECT timestamp, open, high, low, close
-    FROM price_data
-    WHERE interval = '{interval}'
-    ORDER BY timestamp ASC
-    """
-    df = pd.read_sql_query(query, conn, parse_dates=['timestamp'])
-    conn.close()
-    return df
-
-def calculate_pivot_points(df):
-    """
-    ピボットポイント、サポートライン、レジスタンスラインを計算します。
-    
-    Args:
-        df (pd.DataFrame): 価格データ
-    
-    Returns:
-        pd.DataFrame: ピボットポイントデータ
-    """
-    pivot_points = []
-    for index, row in df.iterrows():
-        pivot = (row['high'] + row['low'] + row['close']) / 3
-        support1 = (2 * pivot) - row['high']
-        resistance1 = (2 * pivot) - row['low']
-        support2 = pivot - (row['high'] - row['low'])
-        resistance2 = pivot + (row['high'] - row['low'])
-        pivot_points.append({
-            'timestamp': row['timestamp'],
-            'Pivot': pivot,
-            'Support1': support1,
-            'Resistance1': resistance1,
-            'Support2': support2,
-            'Resistance2': resistance2
-        })
-    return pd.DataFrame(pivot_points)
-
-def save_pivot_points(df_pivot, interval):
-    """
-    計算したピボットポイントをデータベースに保存します。
-    
-    Args:
-        df_pivot (pd.DataFrame): ピボットポイントデータ
-        interval (str): データの間隔（'daily' または 'weekly'）
-    """
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    for _, row in df_pivot.iterrows():
-        try:
-            cursor.execute('''
-                INSERT OR REPLACE INTO pivot_points
-                (timestamp, Pivot, Support1, Resistance1, Support2, Resistance2, symbol, interval)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                row['timestamp'].strftime('%Y-%m-%d %H:%M:%S'),
-                row['Pivot'],
-                row['Support1'],
-                row['Resistance1'],
-                row['Support2'],
-                row['Resistance2'],
-                'EURUSD',
-                interval
-            ))
-        except Exception as e:
-            logging.error(f"Error inserting pivot points for {row['timestamp']}: {e}")
-    
-    conn.commit()
-    conn.close()
-    logging.info(f"{interval}ピボットポイントの計算と保存が完了しました")
-
-def main():
-    intervals = ['daily', 'weekly']
-    for interval in intervals:
-        logging.info(f"{interval}ピボットポイントの計算を開始します")
-        df_price = fetch_price_data(interval)
-        if df_price.empty:
-            logging.warning(f"{interval}データが存在しません")
-            continue
-        df_pivot = calculate_pivot_points(df_price)
-        save_pivot_points(df_pivot, interval)
-        logging.info(f"{interval}ピボットポイントの計算と保存が完了しました")
-    
-    print("ピボットポイントの計算と保存が完了しました。")
-
-if __name__ == "__main__":
-    main()
+# scripts/calculate_pivot_points.py
+
+import pandas as pd
+import numpy as np
+import os
+import logging
+import argparse
+from bulk_writer import bulk_write_frame
+from data_access import load_ohlc
+from watermark import get_watermark, set_watermark, reset_watermark
+from instrumentation import Instrumentation, stage
+
+# ログディレクトリとファイル名を設定
+LOG_DIR = os.path.join(os.path.dirname(__file__), '..', 'logs')
+LOG_FILE = os.path.join(LOG_DIR, 'pivot_calculation.log')
+
+# ログディレクトリが存在しない場合は作成
+os.makedirs(LOG_DIR, exist_ok=True)
+
+# ログの設定
+logging.basicConfig(
+    filename=LOG_FILE,
+    level=logging.INFO,
+    format='%(asctime)s %(levelname)s:%(message)s'
+)
+
+# SQLiteデータベースのパス
+DB_PATH = os.environ.get('MT5_DB_PATH', os.path.join(os.path.dirname(__file__), '..', 'data', 'eurusd_trading.db'))
+
+# ウォーターマークの処理段階名
+STAGE = 'pivot_points'
+
+def fetch_price_data(interval, symbol='EURUSD', since=None):
+    """
+    データベースから指定した間隔の価格データを取得します。
+    
+    Args:
+        interval (str): データの間隔（'daily' または 'weekly'）
+        symbol (str): シンボル名
+        since (str): この時刻以降のバーのみ取得（省略時は全履歴）
+    
+    Returns:
+        pd.DataFrame: 価格データ
+    """
+    # ウォーターマークの位置のバーは集計中の最後のバーとして作り直されている場合があるため、再計算する
+    return load_ohlc(symbol, interval, since=since, db_path=DB_PATH, include_since=True).reset_index()
+
+# ピボットポイントの出力列（この順序・float64 で返す）
+PIVOT_COLUMNS = ['Pivot', 'Support1', 'Resistance1', 'Support2', 'Resistance2']
+
+def _standard_pivots(high, low, close):
+    pivot = (high + low + close) / 3
+    rng = high - low
+    return pivot, 2 * pivot - high, 2 * pivot - low, pivot - rng, pivot + rng
+
+def _fibonacci_pivots(high, low, close):
+    pivot = (high + low + close) / 3
+    rng = high - low
+    return (pivot,
+            pivot - 0.382 * rng, pivot + 0.382 * rng,
+            pivot - 0.618 * rng, pivot + 0.618 * rng)
+
+def _camarilla_pivots(high, low, close):
+    pivot = (high + low + close) / 3
+    rng = (high - low) * 1.1
+    return (pivot,
+            close - rng / 12, close + rng / 12,
+            close - rng / 6, close + rng / 6)
+
+def _woodie_pivots(high, low, close):
+    pivot = (high + low + 2 * close) / 4
+    rng = high - low
+    return pivot, 2 * pivot - high, 2 * pivot - low, pivot - rng, pivot + rng
+
+# 選択可能なピボット計算方式
+PIVOT_METHODS = {
+    'standard': _standard_pivots,
+    'fibonacci': _fibonacci_pivots,
+    'camarilla': _camarilla_pivots,
+    'woodie': _woodie_pivots,
+}
+
+def calculate_pivot_points(df, method='standard'):
+    """
+    ピボットポイント、サポートライン、レジスタンスラインを計算します。
+
+    行ごとのループは行わず、各列をNumPy配列として一括で計算します。
+
+    Args:
+        df (pd.DataFrame): 価格データ
+        method (str): 計算方式（'standard', 'fibonacci', 'camarilla', 'woodie'）
+
+    Returns:
+        pd.DataFrame: ピボットポイントデータ（timestamp 列と float64 のレベル列）
+    """
+    if method not in PIVOT_METHODS:
+        raise ValueError(f"未対応のピボット計算方式です: {method}")
+
+    high = df['high'].to_numpy(dtype=np.float64)
+    low = df['low'].to_numpy(dtype=np.float64)
+    close = df['close'].to_numpy(dtype=np.float64)
+    levels = PIVOT_METHODS[method](high, low, close)
+
+    df_pivot = pd.DataFrame(dict(zip(PIVOT_COLUMNS, levels)))
+    df_pivot.insert(0, 'timestamp', pd.to_datetime(df['timestamp']).to_numpy())
+    return df_pivot
+
+def save_pivot_points(df_pivot, interval, symbol='EURUSD'):
+    """
+    計算したピボットポイントをデータベースに保存します。
+    
+    Args:
+        df_pivot (pd.DataFrame): ピボットポイントデータ
+        interval (str): データの間隔（'daily' または 'weekly'）
+        symbol (str): シンボル名
+    
+    Returns:
+        WriteResult: 書き込み結果（失敗した場合は None）
+    """
+    df_pivot = df_pivot.assign(symbol=symbol, interval=interval)
+    try:
+        result = bulk_write_frame(
+            DB_PATH, 'pivot_points', df_pivot,
+            ['timestamp'] + PIVOT_COLUMNS + ['symbol', 'interval'],
+            mode='replace'
+        )
+    except Exception as e:
+        logging.error(f"Error inserting {interval} pivot points: {e}")
+        return None
+    logging.info(f"{interval}: {result.rows}行のピボットポイントを保存しました（{result.rows_per_sec:,.0f} rows/sec）")
+    return result
+
+def main(symbol='EURUSD', full_refresh=False, trace_sql=False):
+    """
+    前回処理したバー以降の価格データについてピボットポイントを計算・保存します。
+
+    Args:
+        symbol (str): シンボル名
+        full_refresh (bool): True の場合はウォーターマークを無視して全履歴を再計算
+        trace_sql (bool): SQLite のクエリ数と実行時間を計測するか
+    """
+    intervals = ['daily', 'weekly']
+    with Instrumentation(STAGE, trace_sql=trace_sql) as run:
+        for interval in intervals:
+            logging.info(f"{interval}ピボットポイントの計算を開始します")
+            with stage(STAGE, symbol, interval) as metrics:
+                if full_refresh:
+                    reset_watermark(DB_PATH, symbol, interval, STAGE)
+                since = get_watermark(DB_PATH, symbol, interval, STAGE)
+                df_price = fetch_price_data(interval, symbol, since)
+                if df_price.empty:
+                    logging.info(f"{interval}: {since} 以降の新しいデータはありません")
+                    continue
+                df_pivot = calculate_pivot_points(df_price)
+                if save_pivot_points(df_pivot, interval, symbol) is not None:
+                    # 保存に成功した場合のみ処理済み位置を進める
+                    set_watermark(DB_PATH, symbol, interval, STAGE, df_price['timestamp'].iloc[-1])
+                metrics.add_rows(len(df_price))
+            logging.info(f"{interval}ピボットポイントの計算と保存が完了しました（{len(df_price)}本）")
+    run.save(DB_PATH)
+    
+    print("ピボットポイントの計算と保存が完了しました。")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='ピボットポイントを計算して保存します')
+    parser.add_argument('--symbol', default='EURUSD')
+    parser.add_argument('--full-refresh', action='store_true', help='ウォーターマークを無視して全履歴を再処理する')
+    parser.add_argument('--trace-sql', action='store_true',
+                        help='SQLite のクエリ数と実行時間を計測する（書き込みが遅くなります）')
+    args = parser.parse_args()
+    main(args.symbol, args.full_refresh, trace_sql=args.trace_sql)
@@ -0,0 +1,398 @@
+# scripts/chart_rendering.py
+
+import os
+import time
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from matplotlib.figure import Figure
+from matplotlib.collections import LineCollection, PolyCollection
+from matplotlib.lines import Line2D
+import matplotlib.dates as mdates
+
+import data_access
+from data_access import DEFAULT_DB_PATH
+from symbols import get_symbols
+
+# ログディレクトリとファイル名を設定
+LOG_DIR = os.path.join(os.path.dirname(__file__), '..', 'logs')
+LOG_FILE = os.path.join(LOG_DIR, 'chart_rendering.log')
+
+# 出力先のディレクトリ
+REPORT_DIR = os.path.join(os.path.dirname(__file__), '..', 'reports')
+
+FIGSIZE = (14, 7)
+DPI = 100
+
+# 描画する点の数の目安（横幅のピクセル数程度あれば見た目は変わらない）
+MAX_POINTS = FIGSIZE[0] * DPI * 2
+
+# ローソク足は1本の幅が数ピクセル以上になる本数までまとめる
+MAX_CANDLES = 400
+
+# 価格レベルの種類ごとの色（type が NULL のクラスタリングの価格レベルは 'Level'）
+LEVEL_STYLES = {
+    'Support1': 'green',
+    'Support2': 'lightgreen',
+    'Resistance1': 'red',
+    'Resistance2': 'orange',
+    'Level': 'gray',
+}
+
+DOWNSAMPLE_METHODS = ['minmax', 'lttb']
+
+def minmax_downsample(x, y, n_out=MAX_POINTS):
+    """
+    系列を n_out / 2 個の区間に分け、区間ごとの最小値と最大値の点だけを残します。
+
+    1ピクセルに収まる区間の中の最小・最大を描けば、すべての点を描いた場合と
+    同じ縦線になるため、スパイクを失わずに点の数を減らせます。
+
+    Args:
+        x (array-like): 横軸の値（昇順）
+        y (array-like): 縦軸の値
+        n_out (int): 残す点の数の上限
+
+    Returns:
+        tuple: (x, y) の間引いた配列（元の順序）
+    """
+    x, y = np.asarray(x), np.asarray(y, dtype='float64')
+    n_buckets = max(n_out // 2, 1)
+    if len(y) <= n_out:
+        return x, y
+    size = -(-len(y) // n_buckets)
+    padded = np.full(size * n_buckets, np.nan)
+    padded[:len(y)] = y
+    rows = padded.reshape(n_buckets, size)
+    valid = ~np.isnan(rows).all(axis=1)
+    base = np.arange(n_buckets)[valid] * size
+    lows = base + np.nanargmin(rows[valid], axis=1)
+    highs = base + np.nanargmax(rows[valid], axis=1)
+    index = np.unique(np.concatenate((lows, highs)))
+    return x[index], y[index]
+
+def lttb_downsample(x, y, n_out=MAX_POINTS):
+    """
+    Largest-Triangle-Three-Buckets 法で点の数を n_out に減らします。
+
+    区間ごとに、前の区間で選んだ点と次の区間の平均点とで作る三角形の面積が最大になる点を残します。
+    区間の数だけループしますが、区間内の計算は配列演算で行います。
+
+    Args:
+        x (array-like): 横軸の値（昇順）
+        y (array-like): 縦軸の値
+        n_out (int): 残す点の数
+
+    Returns:
+        tuple: (x, y) の間引いた配列
+    """
+    x, y = np.asarray(x), np.asarray(y, dtype='float64')
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return x, y
+    xs = x.astype('float64') if np.issubdtype(x.dtype, np.number) else x.astype('datetime64[ns]').astype('float64')
+    # 最初と最後の点は必ず残し、間の点を n_out - 2 個の区間に分ける
+    edges = (np.arange(n_out - 1) * (n - 2) / (n_out - 2)).astype('int64') + 1
+    edges[-1] = n - 1
+    selected = np.empty(n_out, dtype='int64')
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(n_out - 2):
+        start, stop = edges[i], edges[i + 1]
+        # 次の区間の平均点（最後の区間では最後の点）
+        next_stop = edges[i + 2] if i + 2 < len(edges) else n
+        next_x, next_y = xs[stop:next_stop].mean(), y[stop:next_stop].mean()
+        area = np.abs((xs[previous] - next_x) * (y[start:stop] - y[previous])
+                      - (xs[previous] - xs[start:stop]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(np.nan_to_num(area, nan=-1.0)))
+        selected[i + 1] = previous
+    selected = np.unique(selected)
+    return x[selected], y[selected]
+
+def downsample(x, y, n_out=MAX_POINTS, method='minmax'):
+    """
+    折れ線の点の数を減らします。
+
+    Args:
+        x (array-like): 横軸の値（昇順）
+        y (array-like): 縦軸の値
+        n_out (int): 残す点の数の上限
+        method (str): 'minmax' または 'lttb'
+
+    Returns:
+        tuple: (x, y) の間引いた配列
+    """
+    if method == 'minmax':
+        return minmax_downsample(x, y, n_out)
+    if method == 'lttb':
+        return lttb_downsample(x, y, n_out)
+    raise ValueError(f"未対応の間引き方法です: {method}")
+
+def aggregate_candles(df, max_candles=MAX_CANDLES):
+    """
+    連続する k 本のバーを1本のローソク足にまとめ、max_candles 本以下にします。
+
+    Args:
+        df (pd.DataFrame): timestamp をインデックスとし open, high, low, close 列を持つ価格データ
+        max_candles (int): ローソク足の本数の上限
+
+    Returns:
+        pd.DataFrame: まとめた価格データ（各ローソク足の timestamp は最初のバーの時刻）
+    """
+    n = len(df)
+    if n <= max_candles:
+        return df[['open', 'high', 'low', 'close']]
+    starts = np.arange(0, n, -(-n // max_candles))
+    stops = np.append(starts[1:], n) - 1
+    return pd.DataFrame({
+        'open': df['open'].to_numpy()[starts],
+        'high': np.maximum.reduceat(df['high'].to_numpy(dtype='float64'), starts),
+        'low': np.minimum.reduceat(df['low'].to_numpy(dtype='float64'), starts),
+        'close': df['close'].to_numpy()[stops],
+    }, index=df.index[starts])
+
+def draw_line(ax, df, column='close', max_points=MAX_POINTS, method='minmax', **kwargs):
+    """
+    価格データの1列を間引いて折れ線で描画します。
+
+    Args:
+        ax (matplotlib.axes.Axes): 描画先
+        df (pd.DataFrame): timestamp をインデックスとする価格データ
+        column (str): 描画する列
+        max_points (int): 描画する点の数の上限
+        method (str): 間引き方法（'minmax' または 'lttb'）
+        **kwargs: ax.plot に渡す引数
+    """
+    x, y = downsample(mdates.date2num(df.index), df[column].to_numpy(), max_points, method)
+    ax.plot(x, y, **kwargs)
+
+def draw_candles(ax, df, max_candles=MAX_CANDLES, up_color='green', down_color='red'):
+    """
+    ローソク足を描画します。
+
+    ヒゲは1つの LineCollection、実体は1つの PolyCollection として描くため、
+    本数が多くても描画オブジェクトは2つだけです。
+
+    Args:
+        ax (matplotlib.axes.Axes): 描画先
+        df (pd.DataFrame): timestamp をインデックスとし open, high, low, close 列を持つ価格データ
+        max_candles (int): ローソク足の本数の上限（超える場合は aggregate_candles でまとめる）
+        up_color (str): 陽線の色
+        down_color (str): 陰線の色
+    """
+    candles = aggregate_candles(df, max_candles)
+    if candles.empty:
+        return
+    x = mdates.date2num(candles.index)
+    open_, high, low, close = (candles[c].to_numpy(dtype='float64') for c in ['open', 'high', 'low', 'close'])
+    width = 0.35 * (np.median(np.diff(x)) if len(x) > 1 else 1.0)
+    colors = np.where(close >= open_, up_color, down_color)
+
+    wicks = np.stack([np.column_stack((x, low)), np.column_stack((x, high))], axis=1)
+    ax.add_collection(LineCollection(wicks, colors=colors, linewidths=0.8))
+
+    bottom, top = np.minimum(open_, close), np.maximum(open_, close)
+    bodies = np.stack([np.column_stack((x - width, bottom)), np.column_stack((x - width, top)),
+                       np.column_stack((x + width, top)), np.column_stack((x + width, bottom))], axis=1)
+    ax.add_collection(PolyCollection(bodies, facecolors=colors, edgecolors=colors, linewidths=0.5))
+    ax.autoscale_view()
+
+def draw_levels(ax, levels, xmin, xmax, styles=LEVEL_STYLES):
+    """
+    価格レベルを1つの LineCollection として水平線で描画します。
+
+    同じ種類・同じ値の価格レベルは1本にまとめ、凡例には種類ごとに1つだけ追加します。
+
+    Args:
+        ax (matplotlib.axes.Axes): 描画先
+        levels (pd.DataFrame | array-like): level, type 列を持つデータフレームまたは価格レベルの配列
+        xmin (float): 線の左端（matplotlib の日付の数値）
+        xmax (float): 線の右端（matplotlib の日付の数値）
+        styles (dict): 種類ごとの色
+
+    Returns:
+        list: 凡例に追加するハンドル
+    """
+    if not isinstance(levels, pd.DataFrame):
+        levels = pd.DataFrame({'level': np.asarray(levels, dtype='float64'), 'type': 'Level'})
+    levels = levels.assign(type=levels['type'].fillna('Level')).drop_duplicates(['type', 'level'])
+    levels = levels[levels['type'].isin(list(styles))]
+    if levels.empty:
+        return []
+    y = levels['level'].to_numpy(dtype='float64')
+    segments = np.stack([np.column_stack((np.full(len(y), xmin), y)),
+                         np.column_stack((np.full(len(y), xmax), y))], axis=1)
+    ax.add_collection(LineCollection(segments, colors=levels['type'].map(styles).tolist(),
+                                     linestyles='--', linewidths=0.8))
+    return [Line2D([], [], color=styles[kind], linestyle='--', label=kind)
+            for kind in styles if kind in set(levels['type'])]
+
+def dedupe_legend(ax, extra_handles=(), **kwargs):
+    """
+    同じラベルの凡例を1つにまとめて表示します。
+
+    Args:
+        ax (matplotlib.axes.Axes): 凡例を表示する軸
+        extra_handles (list): 追加するハンドル（draw_levels の戻り値など）
+        **kwargs: ax.legend に渡す引数
+    """
+    handles, labels = ax.get_legend_handles_labels()
+    unique = {}
+    for handle, label in zip(list(handles) + list(extra_handles),
+                             list(labels) + [h.get_label() for h in extra_handles]):
+        if label and not label.startswith('_'):
+            unique.setdefault(label, handle)
+    if unique:
+        ax.legend(list(unique.values()), list(unique.keys()), **kwargs)
+
+def render_chart(df, symbol, interval, levels=None, kind='line', max_points=MAX_POINTS,
+                 method='minmax', max_candles=MAX_CANDLES, title=None, figure=None):
+    """
+    価格データと価格レベルのチャートを作成します。
+
+    pyplot を使わずに Figure を直接作成するため、ディスプレイのない環境でも
+    バッチで保存できます（表示する場合は figure に plt.figure() を渡します）。
+
+    Args:
+        df (pd.DataFrame): timestamp をインデックスとする価格データ
+        symbol (str): シンボル名
+        interval (str): データの間隔
+        levels (pd.DataFrame | array-like): 価格レベル（省略可）
+        kind (str): 'line'（終値の折れ線）または 'candles'（ローソク足）
+        max_points (int): 折れ線の点の数の上限
+        method (str): 折れ線の間引き方法
+        max_candles (int): ローソク足の本数の上限
+        title (str): タイトル（省略時はシンボルと間隔）
+        figure (matplotlib.figure.Figure): 描画先の Figure
+
+    Returns:
+        matplotlib.figure.Figure: 作成したチャート
+    """
+    fig = figure if figure is not None else Figure(figsize=FIGSIZE, dpi=DPI)
+    ax = fig.add_subplot(1, 1, 1)
+
+    if kind == 'candles':
+        draw_candles(ax, df, max_candles)
+    else:
+        draw_line(ax, df, 'close', max_points, method, label='Close Price', color='blue', linewidth=0.8)
+
+    handles = []
+    if levels is not None and len(df):
+        xmin, xmax = mdates.date2num(df.index[[0, -1]])
+        handles = draw_levels(ax, levels, xmin, xmax)
+        ax.autoscale_view()
+
+    ax.xaxis_date()
+    ax.set_title(title or f'{symbol} {interval} {"Candles" if kind == "candles" else "Close Prices"}')
+    ax.set_xlabel('Timestamp')
+    ax.set_ylabel('Price')
+    ax.grid(True, alpha=0.3)
+    dedupe_legend(ax, handles, loc='upper left')
+    fig.autofmt_xdate()
+    return fig
+
+def render_report(symbol, interval, out_dir=REPORT_DIR, kind='line', with_levels=True,
+                  db_path=DEFAULT_DB_PATH, method='minmax'):
+    """
+    1つのシンボル・間隔のチャートをPNGに保存します。
+
+    Args:
+        symbol (str): シンボル名
+        interval (str): データの間隔
+        out_dir (str): 出力先のディレクトリ
+        kind (str): 'line' または 'candles'
+        with_levels (bool): price_levels の価格レベルを重ねるか
+        db_path (str): データベースのパス
+        method (str): 折れ線の間引き方法
+
+    Returns:
+        str: 保存したファイルのパス（価格データがない場合は None）
+    """
+    df = data_access.load_ohlc(symbol, interval, db_path=db_path, use_cache=False)
+    if df.empty:
+        return None
+    levels = data_access.load_price_levels(symbol, interval, db_path) if with_levels else None
+    fig = render_chart(df, symbol, interval, levels, kind=kind, method=method)
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f'{symbol}_{interval}_{kind}.png')
+    fig.savefig(path, dpi=DPI)
+    return path
+
+def _render_task(args):
+    # プロセスプールから呼ばれるため、例外は文字列にして返す
+    try:
+        return args, render_report(*args), None
+    except Exception as e:
+        return args, None, str(e)
+
+def render_reports(symbols, intervals, out_dir=REPORT_DIR, kinds=('line',), with_levels=True,
+                   db_path=DEFAULT_DB_PATH, max_workers=None, method='minmax'):
+    """
+    すべてのシンボル・間隔のチャートをPNGにバッチで保存します。
+
+    Args:
+        symbols (list): シンボル名のリスト
+        intervals (list): 間隔のリスト
+        out_dir (str): 出力先のディレクトリ
+        kinds (tuple): 作成するチャートの種類（'line', 'candles'）
+        with_levels (bool): 価格レベルを重ねるか
+        db_path (str): データベースのパス
+        max_workers (int): ワーカープロセス数（省略時はCPU数、1の場合は同じプロセスで実行）
+        method (str): 折れ線の間引き方法
+
+    Returns:
+        list: 保存したファイルのパス
+    """
+    tasks = [(symbol, interval, out_dir, kind, with_levels, db_path, method)
+             for symbol in symbols for interval in intervals for kind in kinds]
+    max_workers = max_workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    if max_workers == 1 or len(tasks) <= 1:
+        results = list(map(_render_task, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(_render_task, tasks))
+
+    paths = []
+    for (symbol, interval, _, kind, *_), path, error in results:
+        if error is not None:
+            logging.error(f"{symbol} {interval} {kind}: チャートの作成中にエラーが発生しました: {error}")
+            print(f"{symbol} {interval} {kind}: チャートの作成中にエラーが発生しました: {error}")
+        elif path is None:
+            logging.info(f"{symbol} {interval}: データが存在しません")
+        else:
+            paths.append(path)
+    logging.info(f"{len(paths)}枚のチャートを{time.perf_counter() - start:.2f}秒で保存しました")
+    return paths
+
+def main():
+    os.makedirs(LOG_DIR, exist_ok=True)
+    logging.basicConfig(
+        filename=LOG_FILE,
+        level=logging.INFO,
+        format='%(asctime)s %(levelname)s:%(message)s'
+    )
+
+    parser = argparse.ArgumentParser(description='価格データと価格レベルのチャートをPNGにバッチで保存します')
+    parser.add_argument('--symbol', action='append', dest='symbols', help='シンボル（省略時はすべて）')
+    parser.add_argument('--interval', action='append', dest='intervals',
+                        help="間隔（省略時は 'daily' と 'weekly'）")
+    parser.add_argument('--kind', action='append', dest='kinds', choices=['line', 'candles'])
+    parser.add_argument('--method', choices=DOWNSAMPLE_METHODS, default='minmax', help='折れ線の間引き方法')
+    parser.add_argument('--no-levels', action='store_true', help='価格レベルを重ねない')
+    parser.add_argument('--out-dir', default=REPORT_DIR)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--db-path', default=DEFAULT_DB_PATH)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    paths = render_reports(get_symbols(args.symbols), args.intervals or ['daily', 'weekly'], args.out_dir,
+                           tuple(args.kinds or ['line']), not args.no_levels, args.db_path, args.workers,
+                           args.method)
+    print(f"{len(paths)}枚のチャートを{time.perf_counter() - start:.2f}秒で保存しました（{args.out_dir}）")
+
+if __name__ == "__main__":
+    main()
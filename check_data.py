@@ -1,35 +1,55 @@
-import sqlite3
-
-def check_intervals(db_path='data/eurusd_trading.db'):
-    """
-    SQLiteデータベース内のprice_dataテーブルに存在するインターバルを確認します。
-    
-    Args:
-        db_path (str): データベースのパス
-    
-    Returns:
-        list: 存在するインターバルのリスト
-    """
-    try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        query = "SELECT DISTINCT interval FROM price_data"
-        cursor.execute(query)
-        intervals = cursor.fetchall()
-        conn.close()
-        return [interval[0] for interval in intervals]
-    except Exception as e:
-        print(f"データベースへの接続中にエラーが発生しました: {e}")
-        return []
-
-def main():
-    intervals = check_intervals()
-    if intervals:
-        print("データベースに存在するインターバル:")
-        for interval in intervals:
-            print(f"- {interval}")
-    else:
-        print("price_dataテーブルにデータが存在しません。")
-
-if __name__ == "__main__":
-    main()
+from data_access import connection
+from data_coverage import coverage_index
+
+def check_intervals(db_path='data/eurusd_trading.db'):
+    """
+    SQLiteデータベース内のprice_dataテーブルに存在するインターバルを確認します。
+    
+    Args:
+        db_path (str): データベースのパス
+    
+    Returns:
+        list: 存在するインターバルのリスト
+    """
+    try:
+        with connection(db_path) as conn:
+            intervals = conn.execute("SELECT DISTINCT interval FROM price_data").fetchall()
+        return [interval[0] for interval in intervals]
+    except Exception as e:
+        print(f"データベースへの接続中にエラーが発生しました: {e}")
+        return []
+
+def check_coverage(db_path='data/eurusd_trading.db'):
+    """
+    price_dataテーブルのシリーズごとに、取引カレンダーに対する欠落を確認します。
+
+    Args:
+        db_path (str): データベースのパス
+
+    Returns:
+        pd.DataFrame: symbol, interval, first, last, bars, expected, missing, gaps, coverage 列
+    """
+    try:
+        index, _ = coverage_index(db_path=db_path)
+        return index
+    except Exception as e:
+        print(f"欠落の確認中にエラーが発生しました: {e}")
+        return None
+
+def main():
+    intervals = check_intervals()
+    if intervals:
+        print("データベースに存在するインターバル:")
+        for interval in intervals:
+            print(f"- {interval}")
+    else:
+        print("price_dataテーブルにデータが存在しません。")
+        return
+
+    coverage = check_coverage()
+    if coverage is not None and not coverage.empty:
+        print("シリーズごとの欠落:")
+        print(coverage.to_string(index=False))
+
+if __name__ == "__main__":
+    main()
@@ -1,110 +1,122 @@
-import sqlite3
-import pandas as pd
-
-def load_filtered_levels(symbol, interval, db_path='data/eurusd_trading.db'):
-    """
-    SQLiteデータベースからフィルタリングされた価格レベルを読み込みます。
-
-    Args:
-        symbol (str): シンボル名
-        interval (str): データの間隔（'daily' または 'weekly'）
-        db_path (str): データベースのパス
-
-    Returns:
-        list: フィルタリングされた価格レベルのリスト
-    """
-    try:
-        conn = sqlite3.connect(db_path)
-        query = f"""
-        SELECT level
-        FROM filtered_price_levels
-        WHERE symbol = '{symbol}' AND interval = '{interval}'
-        """
-        df = pd.read_sql_query(query, conn)
-        conn.close()
-        return df['level'].tolist()
-    except Exception as e:
-        print(f"データベースからの読み込み中にエラーが発生しました: {e}")
-        return []
-
-def combine_levels(daily_levels, weekly_levels):
-    """
-    日足と週足のサポート・レジスタンスラインを統合します。
-
-    Args:
-        daily_levels (list): 日足の価格レベル
-        weekly_levels (list): 週足の価格レベル
-
-    Returns:
-        list: 統合された価格レベルのリスト
-    """
-    combined = sorted(list(set(daily_levels + weekly_levels)))
-    return combined
-
-def save_combined_levels(combined_levels, symbol, db_path='data/eurusd_trading.db'):
-    """
-    統合された価格レベルをSQLiteデータベースに保存します。
-
-    Args:
-        combined_levels (list): 統合された価格レベルのリスト
-        symbol (str): シンボル名
-        db_path (str): データベースのパス
-    """
-    try:
-        conn = sqlite3.connect(db_path)
-        for level in combined_levels:
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO combined_price_levels (symbol, level)
-                VALUES (?, ?)
-            ''', (symbol, level))
-        conn.commit()
-        conn.close()
-        print("統合された価格レベルをデータベースに保存しました")
-    except Exception as e:
-        print(f"SQLiteへの保存中にエラーが発生しました: {e}")
-
-def setup_combined_price_levels_table(db_path='data/eurusd_trading.db'):
-    """
-    combined_price_levels テーブルを作成します。
-
-    Args:
-        db_path (str): データベースのパス
-    """
-    try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS combined_price_levels (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            symbol TEXT,
-            level REAL
-        )
-        ''')
-        conn.commit()
-        conn.close()
-        print("combined_price_levels テーブルを作成しました")
-    except Exception as e:
-        print(f"SQLiteへの接続中にエラーが発生しました: {e}")
-
-def main():
-    SYMBOL = 'EURUSD'
-    db_path = 'data/eurusd_trading.db'
-    
-    # combined_price_levels テーブルのセットアップ
-    setup_combined_price_levels_table(db_path)
-    
-    # フィルタリングされた価格レベルの読み込み
-    # ここでは filter_levels_with_rsi.py で保存された filtered_price_levels テーブルを使用
-    daily_levels = load_filtered_levels(SYMBOL, 'daily', db_path)
-    weekly_levels = load_filtered_levels(SYMBOL, 'weekly', db_path)
-    
-    # 水平線の統合
-    combined_levels = combine_levels(daily_levels, weekly_levels)
-    print(f"統合された価格レベル: {combined_levels}")
-    
-    # データベースに保存
-    save_combined_levels(combined_levels, SYMBOL, db_path)
-
-if __name__ == "__main__":
-    main()
+import sqlite3
+import data_access
+from bulk_writer import bulk_write
+from data_access import read_frame, DEFAULT_DB_PATH
+from confluence import ZONE_PIPS, build_zones, levels_frame, save_zones
+from level_scoring import load_level_scores
+from symbols import get_symbols, DEFAULT_SYMBOL
+
+def load_filtered_levels(symbol, interval, db_path='data/eurusd_trading.db'):
+    """
+    SQLiteデータベースからフィルタリングされた価格レベルを読み込みます。
+
+    Args:
+        symbol (str): シンボル名
+        interval (str): データの間隔（'daily' または 'weekly'）
+        db_path (str): データベースのパス
+
+    Returns:
+        list: フィルタリングされた価格レベルのリスト
+    """
+    try:
+        query = """
+        SELECT level
+        FROM filtered_price_levels
+        WHERE symbol = ? AND interval = ?
+        """
+        df = read_frame(query, (symbol, interval), db_path)
+        return df['level'].tolist()
+    except Exception as e:
+        print(f"データベースからの読み込み中にエラーが発生しました: {e}")
+        return []
+
+def combine_levels(daily_levels, weekly_levels, symbol=DEFAULT_SYMBOL, pips=ZONE_PIPS):
+    """
+    日足と週足のサポート・レジスタンスラインを統合します。
+
+    confluence.build_zones で近接する価格レベルを時間足の重み付きのゾーンにまとめ、
+    各ゾーンの代表値を返します。
+
+    Args:
+        daily_levels (list): 日足の価格レベル
+        weekly_levels (list): 週足の価格レベル
+        symbol (str): シンボル名（pips の換算に使用）
+        pips (float): 同じゾーンにまとめる隣との差（pips）
+
+    Returns:
+        list: 統合された価格レベルのリスト
+    """
+    levels = levels_frame({'daily': daily_levels, 'weekly': weekly_levels}, symbol)
+    return build_zones(levels, pips)['level'].tolist()
+
+def save_combined_levels(combined_levels, symbol, db_path='data/eurusd_trading.db'):
+    """
+    統合された価格レベルをSQLiteデータベースに保存します。
+
+    同じシンボルの既存の行は、同じトランザクション内で最新の結果に置き換えます。
+
+    Args:
+        combined_levels (list): 統合された価格レベルのリスト
+        symbol (str): シンボル名
+        db_path (str): データベースのパス
+    """
+    try:
+        rows = [(symbol, float(level)) for level in combined_levels]
+        with data_access.connection(db_path) as conn:
+            conn.execute("DELETE FROM combined_price_levels WHERE symbol = ?", (symbol,))
+            result = bulk_write(db_path, 'combined_price_levels', ['symbol', 'level'], rows, conn=conn)
+        print(f"統合された価格レベルをデータベースに保存しました（{result.rows_per_sec:,.0f} rows/sec）")
+    except Exception as e:
+        print(f"SQLiteへの保存中にエラーが発生しました: {e}")
+
+def setup_combined_price_levels_table(db_path='data/eurusd_trading.db'):
+    """
+    combined_price_levels テーブルを作成します。
+
+    Args:
+        db_path (str): データベースのパス
+    """
+    try:
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS combined_price_levels (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            symbol TEXT,
+            level REAL
+        )
+        ''')
+        conn.commit()
+        conn.close()
+        print("combined_price_levels テーブルを作成しました")
+    except Exception as e:
+        print(f"SQLiteへの接続中にエラーが発生しました: {e}")
+
+def main(symbols=None, top_n=None):
+    db_path = DEFAULT_DB_PATH
+    
+    # combined_price_levels テーブルのセットアップ
+    setup_combined_price_levels_table(db_path)
+    
+    for symbol in get_symbols(symbols or [DEFAULT_SYMBOL]):
+        # フィルタリングされた価格レベルの読み込み
+        # ここでは filter_levels_with_rsi.py で保存された filtered_price_levels テーブルを使用
+        daily_levels = load_filtered_levels(symbol, 'daily', db_path)
+        weekly_levels = load_filtered_levels(symbol, 'weekly', db_path)
+        
+        # 水平線の統合（level_scoring.py で保存したスコアを強さとして重みに反映）
+        scores = {interval: load_level_scores(symbol, [interval], db_path) for interval in ['daily', 'weekly']}
+        levels = levels_frame({'daily': daily_levels, 'weekly': weekly_levels}, symbol, scores)
+        zones = build_zones(levels)
+        if top_n is not None:
+            # 重みの大きい順に top_n 個のゾーンだけ残す
+            zones = zones.nlargest(top_n, 'weight').sort_values('level')
+        combined_levels = zones['level'].tolist()
+        print(f"{symbol} 統合された価格レベル: {combined_levels}")
+        
+        # データベースに保存
+        save_combined_levels(combined_levels, symbol, db_path)
+        save_zones(zones, db_path, symbols=[symbol])
+
+if __name__ == "__main__":
+    main()
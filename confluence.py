@@ -0,0 +1,231 @@
+# scripts/confluence.py
+
+import os
+import logging
+import argparse
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import data_access
+from bulk_writer import bulk_write_frame
+from data_access import DEFAULT_DB_PATH, TIMESTAMP_FORMAT
+from level_scoring import load_level_scores, level_strength
+from symbols import get_symbols, pip_size, DEFAULT_SYMBOL
+from setup_database import LEVEL_ZONES_TABLE, LEVEL_ZONES_DDL, LEVEL_ZONES_INDEX_DDL
+
+# ログディレクトリとファイル名を設定
+LOG_DIR = os.path.join(os.path.dirname(__file__), '..', 'logs')
+LOG_FILE = os.path.join(LOG_DIR, 'confluence.log')
+
+# 時間足ごとの重み（長い時間足の価格レベルほど重視する）
+TIMEFRAME_WEIGHTS = {
+    '15m': 1.0,
+    '30m': 1.5,
+    '1h': 2.0,
+    '4h': 3.0,
+    'daily': 5.0,
+    'weekly': 8.0,
+    'monthly': 13.0,
+}
+
+# 隣の価格レベルとの差がこの距離（pips）以内なら同じゾーンにまとめる
+ZONE_PIPS = 5.0
+
+ZONE_COLUMNS = ['symbol', 'level', 'lower', 'upper', 'weight', 'count', 'intervals']
+
+def strength_from_score(score):
+    """
+    level_scoring のスコアを重みの倍率に変換します（スコアが0以下またはない場合は1）。
+
+    Args:
+        score (array-like): スコア（反発 - ブレイク）
+
+    Returns:
+        np.ndarray: 倍率（1 + log(1 + スコア)）
+    """
+    score = np.nan_to_num(np.asarray(score, dtype='float64'), nan=0.0)
+    return 1.0 + np.log1p(np.maximum(score, 0.0))
+
+def levels_frame(levels_by_interval, symbol, scores=None):
+    """
+    間隔ごとの価格レベルを build_zones に渡す縦持ちのデータフレームにします。
+
+    Args:
+        levels_by_interval (dict): {間隔: 価格レベルのリスト}
+        symbol (str): シンボル名
+        scores (dict | pd.DataFrame): {間隔: スコア} またはすべての間隔に共通のスコア（省略可）
+
+    Returns:
+        pd.DataFrame: symbol, interval, level, strength 列
+    """
+    frames = []
+    for interval, levels in levels_by_interval.items():
+        levels = np.asarray(levels, dtype='float64')
+        interval_scores = scores.get(interval) if isinstance(scores, dict) else scores
+        strength = strength_from_score(level_strength(levels, interval_scores))
+        frames.append(pd.DataFrame({'symbol': symbol, 'interval': interval,
+                                    'level': levels, 'strength': strength}))
+    if not frames:
+        return pd.DataFrame(columns=['symbol', 'interval', 'level', 'strength'])
+    return pd.concat(frames, ignore_index=True)
+
+def build_zones(levels, pips=ZONE_PIPS, weights=TIMEFRAME_WEIGHTS):
+    """
+    複数の時間足・シンボルの価格レベルを、重み付きの価格帯（ゾーン）にまとめます。
+
+    シンボル・価格の順に並べ、シンボルが変わるか隣との差が pips を超えた位置でゾーンを区切ります。
+    各ゾーンの代表値は時間足の重み × 強さで重み付けした平均で、集計はすべて区切り位置に対する
+    numpy.add.reduceat / bincount で行います（シンボル数・価格レベル数によらずループしない）。
+
+    Args:
+        levels (pd.DataFrame): symbol, interval, level 列（と任意の strength 列）
+        pips (float): 同じゾーンにまとめる隣との差（pips、シンボルごとの pip_size で換算）
+        weights (dict): 時間足ごとの重み（ない時間足は1）
+
+    Returns:
+        pd.DataFrame: symbol, level, lower, upper, weight, count, intervals 列（シンボル・価格の昇順）
+    """
+    df = levels.dropna(subset=['level'])
+    if df.empty:
+        return pd.DataFrame(columns=ZONE_COLUMNS)
+
+    # 文字列の列は一度だけ整数のコードに変換し、以降の並べ替え・集計はすべて配列で行う
+    symbol_codes, symbols = pd.factorize(df['symbol'], sort=True)
+    interval_codes, intervals = pd.factorize(df['interval'])
+    level = df['level'].to_numpy(dtype='float64')
+    weight = np.array([weights.get(interval, 1.0) for interval in intervals])[interval_codes]
+    if 'strength' in df.columns:
+        weight = weight * df['strength'].fillna(1.0).to_numpy(dtype='float64')
+
+    order = np.lexsort((level, symbol_codes))
+    symbol_codes, interval_codes = symbol_codes[order], interval_codes[order]
+    level, weight = level[order], weight[order]
+    bin_size = np.array([pips * pip_size(symbol) for symbol in symbols])[symbol_codes]
+
+    n = len(level)
+    start = np.ones(n, dtype=bool)
+    start[1:] = (symbol_codes[1:] != symbol_codes[:-1]) | (np.diff(level) > bin_size[1:])
+    starts = np.flatnonzero(start)
+    stops = np.append(starts[1:], n)
+    zone = np.cumsum(start) - 1
+
+    total = np.add.reduceat(weight, starts)
+    center = np.add.reduceat(weight * level, starts) / total
+    # ゾーンごとの時間足の種類数（ゾーンと時間足の組の重複を除いて数える）
+    pairs = np.unique(zone * len(intervals) + interval_codes)
+    n_intervals = np.bincount(pairs // len(intervals), minlength=len(starts))
+
+    return pd.DataFrame({
+        'symbol': symbols[symbol_codes[starts]],
+        'level': center,
+        'lower': level[starts],
+        'upper': level[stops - 1],
+        'weight': total,
+        'count': stops - starts,
+        'intervals': n_intervals,
+    }, columns=ZONE_COLUMNS)
+
+def save_zones(zones, db_path=DEFAULT_DB_PATH, symbols=None):
+    """
+    ゾーンを level_zones テーブルに保存します。
+
+    対象のシンボルの既存の行は、同じトランザクション内で最新の結果に置き換えます
+    （ゾーンがなくなったシンボルの行も削除するため、空の結果でも呼び出します）。
+
+    Args:
+        zones (pd.DataFrame): build_zones の戻り値
+        db_path (str): データベースのパス
+        symbols (list): 置き換えるシンボル（省略時は zones に含まれるシンボル）
+    """
+    df = zones.assign(updated_at=datetime.now().strftime(TIMESTAMP_FORMAT))
+    if symbols is None:
+        symbols = df['symbol'].unique()
+    with data_access.connection(db_path) as conn:
+        conn.execute(LEVEL_ZONES_DDL)
+        conn.executemany(f"DELETE FROM {LEVEL_ZONES_TABLE} WHERE symbol = ?", [(symbol,) for symbol in symbols])
+        bulk_write_frame(db_path, LEVEL_ZONES_TABLE, df, ZONE_COLUMNS + ['updated_at'], conn=conn)
+
+def load_zones(symbol, db_path=DEFAULT_DB_PATH):
+    """
+    保存済みのゾーンを読み込みます。
+
+    Args:
+        symbol (str): シンボル名
+        db_path (str): データベースのパス
+
+    Returns:
+        pd.DataFrame: symbol, level, lower, upper, weight, count, intervals 列
+    """
+    query = f"""
+    SELECT {', '.join(ZONE_COLUMNS)}
+    FROM {LEVEL_ZONES_TABLE}
+    WHERE symbol = ?
+    ORDER BY level ASC
+    """
+    return data_access.read_frame(query, (symbol,), db_path)
+
+def load_interval_levels(symbol, intervals, db_path=DEFAULT_DB_PATH):
+    """
+    filtered_price_levels から間隔ごとの価格レベルを読み込みます。
+
+    Args:
+        symbol (str): シンボル名
+        intervals (list): 読み込む間隔
+        db_path (str): データベースのパス
+
+    Returns:
+        dict: {間隔: 価格レベルのリスト}
+    """
+    placeholders = ', '.join('?' * len(intervals))
+    query = f"""
+    SELECT interval, level
+    FROM filtered_price_levels
+    WHERE symbol = ? AND interval IN ({placeholders})
+    """
+    df = data_access.read_frame(query, (symbol, *intervals), db_path)
+    return {interval: group['level'].tolist() for interval, group in df.groupby('interval')}
+
+def main():
+    os.makedirs(LOG_DIR, exist_ok=True)
+    logging.basicConfig(
+        filename=LOG_FILE,
+        level=logging.INFO,
+        format='%(asctime)s %(levelname)s:%(message)s'
+    )
+
+    parser = argparse.ArgumentParser(description='複数の時間足の価格レベルを重み付きのゾーンにまとめます')
+    parser.add_argument('--symbol', action='append', dest='symbols')
+    parser.add_argument('--interval', action='append', dest='intervals',
+                        help="まとめる価格レベルの間隔（省略時は 'daily' と 'weekly'）")
+    parser.add_argument('--pips', type=float, default=ZONE_PIPS)
+    parser.add_argument('--db-path', default=DEFAULT_DB_PATH)
+    args = parser.parse_args()
+
+    intervals = args.intervals or ['daily', 'weekly']
+    frames, loaded = [], []
+    for symbol in get_symbols(args.symbols or [DEFAULT_SYMBOL]):
+        try:
+            levels = load_interval_levels(symbol, intervals, args.db_path)
+            scores = {interval: load_level_scores(symbol, [interval], args.db_path) for interval in levels}
+            frames.append(levels_frame(levels, symbol, scores))
+            loaded.append(symbol)
+        except Exception as e:
+            logging.error(f"{symbol}: 価格レベルの読み込み中にエラーが発生しました: {e}")
+            print(f"{symbol}: 価格レベルの読み込み中にエラーが発生しました: {e}")
+    if not loaded:
+        print("価格レベルが存在しません")
+        return
+
+    # すべてのシンボルをまとめて1回で集計する（価格レベルがなくなったシンボルのゾーンも削除する）
+    zones = build_zones(pd.concat(frames, ignore_index=True), pips=args.pips)
+    save_zones(zones, args.db_path, symbols=loaded)
+    if zones.empty:
+        print("価格レベルが存在しません")
+        return
+    logging.info(f"{zones['symbol'].nunique()}シンボル {len(zones)}ゾーンを保存しました")
+    print(zones.to_string(index=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,427 @@
+# scripts/data_access.py
+
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+# デフォルトのデータベースのパス（環境変数 MT5_DB_PATH で変更可能）
+DEFAULT_DB_PATH = os.environ.get('MT5_DB_PATH', 'data/eurusd_trading.db')
+
+# タイムスタンプを TEXT で保存する際の書式
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# プールに保持する接続数の上限
+POOL_SIZE = 4
+
+# キャッシュするデータフレーム数の上限
+CACHE_SIZE = 32
+
+OHLC_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+PIVOT_COLUMNS = ['Pivot', 'Support1', 'Resistance1', 'Support2', 'Resistance2']
+
+def apply_pragmas(conn):
+    """
+    読み書き共通のPRAGMAを設定します。
+
+    Args:
+        conn (sqlite3.Connection): SQLite接続
+    """
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA temp_store=MEMORY')
+
+# 接続の貸し出し時・返却時に呼ぶ関数の組（instrumentation がクエリの計測に使う）
+_connection_hooks = []
+
+def add_connection_hook(on_checkout, on_return=None):
+    """
+    プールから接続を貸し出すたびに呼ぶ関数を登録します。
+
+    Args:
+        on_checkout (callable): 貸し出した接続を受け取る関数
+        on_return (callable): 返却される接続を受け取る関数（省略可）
+    """
+    _connection_hooks.append((on_checkout, on_return))
+
+def remove_connection_hook(on_checkout, on_return=None):
+    """
+    add_connection_hook で登録した関数を解除します。
+    """
+    if (on_checkout, on_return) in _connection_hooks:
+        _connection_hooks.remove((on_checkout, on_return))
+
+class ConnectionPool:
+    """
+    1つのデータベースファイルに対する接続プール。
+
+    接続は貸し出し中は1つの利用者だけが使い、返却後に再利用されます。
+    """
+
+    def __init__(self, db_path, max_size=POOL_SIZE):
+        self.db_path = db_path
+        self.max_size = max_size
+        self._idle = []
+        self._lock = threading.Lock()
+        self._probe = None
+        self._probe_lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        apply_pragmas(conn)
+        return conn
+
+    @contextmanager
+    def connection(self):
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = self._connect()
+        hooks = list(_connection_hooks)
+        for on_checkout, _ in hooks:
+            on_checkout(conn)
+        try:
+            yield conn
+        finally:
+            for _, on_return in reversed(hooks):
+                if on_return is not None:
+                    on_return(conn)
+            if conn.in_transaction:
+                conn.rollback()
+            with self._lock:
+                if len(self._idle) < self.max_size:
+                    self._idle.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
+
+    def data_version(self):
+        """
+        他の接続によるコミットを検出するための PRAGMA data_version を返します。
+        """
+        with self._probe_lock:
+            if self._probe is None:
+                self._probe = self._connect()
+            return self._probe.execute('PRAGMA data_version').fetchone()[0]
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+        with self._probe_lock:
+            if self._probe is not None:
+                self._probe.close()
+                self._probe = None
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def _pool_key(db_path):
+    # fork した子プロセスに親の接続を共有させないよう、プロセスIDもキーに含める
+    return (os.getpid(), os.path.abspath(db_path))
+
+def get_pool(db_path=DEFAULT_DB_PATH):
+    """
+    データベースごとの接続プールを取得します。
+
+    Args:
+        db_path (str): データベースのパス
+
+    Returns:
+        ConnectionPool: 接続プール
+    """
+    key = _pool_key(db_path)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(db_path)
+        return pool
+
+@contextmanager
+def connection(db_path=DEFAULT_DB_PATH):
+    """
+    プールから接続を借り、ブロックの終了時に返却します。
+
+    Args:
+        db_path (str): データベースのパス
+    """
+    with get_pool(db_path).connection() as conn:
+        yield conn
+
+def close_all():
+    """
+    すべての接続プールを閉じます。
+    """
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close_all()
+
+# プロセス内での書き込み世代（bulk_writer が書き込みのたびに進める）
+_generations = {}
+
+def bump_generation(db_path=DEFAULT_DB_PATH):
+    """
+    書き込み世代を進め、このデータベースのキャッシュを無効にします。
+
+    Args:
+        db_path (str): データベースのパス
+    """
+    key = _pool_key(db_path)
+    _generations[key] = _generations.get(key, 0) + 1
+
+def write_generation(db_path=DEFAULT_DB_PATH):
+    """
+    現在の書き込み世代を返します。
+
+    プロセス内の書き込み回数と、他プロセスによるコミットを示す data_version の組です。
+
+    Args:
+        db_path (str): データベースのパス
+
+    Returns:
+        tuple: 書き込み世代
+    """
+    return (_generations.get(_pool_key(db_path), 0), get_pool(db_path).data_version())
+
+class FrameCache:
+    """
+    読み込んだデータフレームのLRUキャッシュ。
+
+    エントリは書き込み世代とともに保持され、世代が変わったものは破棄されます。
+    """
+
+    def __init__(self, maxsize=CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, generation):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != generation:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, generation, df):
+        with self._lock:
+            self._entries[key] = (generation, df)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+frame_cache = FrameCache()
+
+def timestamp_storage(conn, table='price_data'):
+    """
+    テーブルの timestamp 列の保存形式を返します。
+
+    Args:
+        conn (sqlite3.Connection): SQLite接続
+        table (str): テーブル名
+
+    Returns:
+        str: INTEGER（エポックミリ秒）の場合は 'epoch_ms'、それ以外は 'text'
+    """
+    for row in conn.execute(f'PRAGMA table_info({table})'):
+        if row[1] == 'timestamp':
+            return 'epoch_ms' if row[2].upper() == 'INTEGER' else 'text'
+    return 'text'
+
+def to_epoch_ms(values):
+    """
+    タイムスタンプをエポックミリ秒の int64 配列に変換します。
+
+    Args:
+        values (array-like): datetime または文字列のタイムスタンプ
+
+    Returns:
+        np.ndarray: エポックミリ秒
+    """
+    index = pd.DatetimeIndex(pd.to_datetime(values))
+    return index.as_unit('ms').asi8
+
+def from_epoch_ms(values):
+    """
+    エポックミリ秒の配列を文字列を経由せずに DatetimeIndex に変換します。
+
+    Args:
+        values (array-like): エポックミリ秒
+
+    Returns:
+        pd.DatetimeIndex: 変換後のタイムスタンプ
+    """
+    return pd.DatetimeIndex(np.asarray(values, dtype='int64').view('datetime64[ms]'))
+
+def parse_timestamps(values):
+    """
+    読み込んだ timestamp 列を DatetimeIndex に変換します。
+
+    整数（エポックミリ秒）の列は文字列の解析を行わずに変換します。
+
+    Args:
+        values (array-like): タイムスタンプ文字列またはエポックミリ秒
+
+    Returns:
+        pd.DatetimeIndex: 変換後のタイムスタンプ
+    """
+    values = pd.Series(values)
+    if pd.api.types.is_integer_dtype(values.dtype):
+        return from_epoch_ms(values.to_numpy())
+    try:
+        return pd.DatetimeIndex(pd.to_datetime(values, format=TIMESTAMP_FORMAT))
+    except (ValueError, TypeError):
+        # ISO形式など書式の異なる行が混在している場合
+        return pd.DatetimeIndex(pd.to_datetime(values, format='ISO8601'))
+
+def read_frame(query, params=(), db_path=DEFAULT_DB_PATH, index_col=None):
+    """
+    パラメータ化したクエリでデータフレームを読み込みます。
+
+    timestamp 列がある場合は DatetimeIndex 形式に変換します。
+
+    Args:
+        query (str): SQLクエリ
+        params (tuple): クエリパラメータ
+        db_path (str): データベースのパス
+        index_col (str): インデックスにする列名
+
+    Returns:
+        pd.DataFrame: 読み込まれたデータフレーム
+    """
+    with connection(db_path) as conn:
+        df = pd.read_sql_query(query, conn, params=params)
+    if 'timestamp' in df.columns:
+        df['timestamp'] = parse_timestamps(df['timestamp'])
+    if index_col is not None:
+        df = df.set_index(index_col)
+    return df
+
+def _range_clause(since, until, include_since=False):
+    clause, params = '', []
+    if since is not None:
+        clause += ' AND timestamp >= ?' if include_since else ' AND timestamp > ?'
+        params.append(since)
+    if until is not None:
+        clause += ' AND timestamp <= ?'
+        params.append(until)
+    return clause, params
+
+def _cached_read(key, db_path, query, params, use_cache):
+    generation = write_generation(db_path) if use_cache else None
+    if use_cache:
+        df = frame_cache.get(key, generation)
+        if df is not None:
+            return df.copy()
+    df = read_frame(query, params, db_path, index_col='timestamp')
+    if use_cache:
+        frame_cache.put(key, generation, df)
+        df = df.copy()
+    return df
+
+def _as_bound(value, storage):
+    # 範囲指定の値をテーブルの保存形式に合わせる
+    if value is None:
+        return None
+    if storage == 'epoch_ms':
+        return int(to_epoch_ms([value])[0])
+    # 文字列もそのまま比較すると '2024-01-05' と '2024-01-05 00:00:00' が別の値になるため正規化する
+    return pd.Timestamp(value).strftime(TIMESTAMP_FORMAT)
+
+def _bounds(db_path, table, since, until):
+    with connection(db_path) as conn:
+        storage = timestamp_storage(conn, table)
+    return _as_bound(since, storage), _as_bound(until, storage)
+
+def load_ohlc(symbol, interval, since=None, until=None, db_path=DEFAULT_DB_PATH, use_cache=True,
+              include_since=False):
+    """
+    価格データ（OHLCV）を読み込みます。
+
+    同じ (シンボル, 間隔, 範囲) の読み込みは、書き込みが行われるまでキャッシュから返されます。
+
+    Args:
+        symbol (str): シンボル名
+        interval (str): データの間隔
+        since: この時刻より後のバーのみ取得（省略時は先頭から）
+        until: この時刻以前のバーのみ取得（省略時は末尾まで）
+        db_path (str): データベースのパス
+        use_cache (bool): キャッシュを使用するか
+        include_since (bool): True の場合は since の時刻のバーも含める
+
+    Returns:
+        pd.DataFrame: timestamp をインデックスとする価格データ
+    """
+    since, until = _bounds(db_path, 'price_data', since, until)
+    clause, params = _range_clause(since, until, include_since)
+    query = f"""
+    SELECT timestamp, {', '.join(OHLC_COLUMNS)}
+    FROM price_data
+    WHERE symbol = ? AND interval = ?{clause}
+    ORDER BY timestamp ASC
+    """
+    key = ('price_data', os.path.abspath(db_path), symbol, interval, since, until, include_since)
+    return _cached_read(key, db_path, query, [symbol, interval] + params, use_cache)
+
+def load_pivot_points(symbol, interval, since=None, until=None, db_path=DEFAULT_DB_PATH, use_cache=True,
+                      include_since=False):
+    """
+    ピボットポイントデータを読み込みます。
+
+    Args:
+        symbol (str): シンボル名
+        interval (str): データの間隔
+        since: この時刻より後の行のみ取得
+        until: この時刻以前の行のみ取得
+        db_path (str): データベースのパス
+        use_cache (bool): キャッシュを使用するか
+        include_since (bool): True の場合は since の時刻の行も含める
+
+    Returns:
+        pd.DataFrame: timestamp をインデックスとするピボットポイントデータ
+    """
+    since, until = _bounds(db_path, 'pivot_points', since, until)
+    clause, params = _range_clause(since, until, include_since)
+    query = f"""
+    SELECT timestamp, {', '.join(PIVOT_COLUMNS)}
+    FROM pivot_points
+    WHERE symbol = ? AND interval = ?{clause}
+    ORDER BY timestamp ASC
+    """
+    key = ('pivot_points', os.path.abspath(db_path), symbol, interval, since, until, include_since)
+    return _cached_read(key, db_path, query, [symbol, interval] + params, use_cache)
+
+def load_price_levels(symbol, interval, db_path=DEFAULT_DB_PATH):
+    """
+    価格レベルを読み込みます。
+
+    Args:
+        symbol (str): シンボル名
+        interval (str): データの間隔
+        db_path (str): データベースのパス
+
+    Returns:
+        pd.DataFrame: timestamp, level, type 列を持つデータフレーム
+    """
+    query = """
+    SELECT timestamp, level, type
+    FROM price_levels
+    WHERE symbol = ? AND interval = ?
+    ORDER BY timestamp ASC
+    """
+    return read_frame(query, (symbol, interval), db_path)
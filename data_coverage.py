@@ -0,0 +1,367 @@
+# scripts/data_coverage.py
+
+import os
+import logging
+import argparse
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+import data_access
+from bulk_writer import bulk_write_frame
+from data_access import DEFAULT_DB_PATH
+from data_quality import clean_price_data, interval_step
+from resample import RESAMPLE_RULES, find_base_interval
+from symbols import get_symbols, DEFAULT_SYMBOL
+
+# ログディレクトリとファイル名を設定
+LOG_DIR = os.path.join(os.path.dirname(__file__), '..', 'logs')
+LOG_FILE = os.path.join(LOG_DIR, 'data_coverage.log')
+
+PRICE_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume', 'symbol', 'interval']
+
+# 休場日（土曜・日曜）。週足・月足には適用しない
+WEEKEND_DAYS = (5, 6)
+
+# 欠落の間にある保存済みのバーがこの本数以下なら、2つの欠落を1回の取得にまとめる
+# （数本の重複取得は INSERT OR IGNORE で捨てられ、取得の回数を減らす方が安い）
+MERGE_BARS = 10
+
+# 1回の取得で要求する最大のバー数（MT5 の copy_rates_range の上限に余裕を持たせた値）
+MAX_REQUEST_BARS = 50000
+
+# まとめて書き込む取得の数
+BATCH_SIZE = 20
+
+COVERAGE_COLUMNS = ['symbol', 'interval', 'first', 'last', 'bars', 'expected', 'missing', 'gaps', 'coverage']
+
+# 取得する範囲（start と end はどちらも取得するバーの開始時刻、bars は範囲内のカレンダー上のバー数）
+BackfillRequest = namedtuple('BackfillRequest', ['symbol', 'interval', 'start', 'end', 'bars', 'missing'])
+
+def _bucket_start(timestamp, interval):
+    # 時刻を含むバーの開始時刻（カレンダーの起点）を返す
+    timestamp = pd.Timestamp(timestamp)
+    if interval == 'monthly':
+        return timestamp.normalize().replace(day=1)
+    if interval == 'weekly':
+        # 週足は日曜始まり（resample.RESAMPLE_RULES の 'W-SUN'）
+        return timestamp.normalize() - pd.Timedelta(days=(timestamp.dayofweek + 1) % 7)
+    return timestamp.floor(interval_step(interval))
+
+def trading_calendar(start, end, interval):
+    """
+    期間内に存在するはずのバーの開始時刻を返します。
+
+    日足以下の間隔では週末（WEEKEND_DAYS）のバーを除きます。
+
+    Args:
+        start: 期間の開始時刻（この時刻を含むバーから）
+        end: 期間の終了時刻（この時刻以前に始まるバーまで）
+        interval (str): データの間隔
+
+    Returns:
+        pd.DatetimeIndex: バーの開始時刻（昇順）
+    """
+    start, end = _bucket_start(start, interval), pd.Timestamp(end)
+    if interval == 'monthly':
+        return pd.date_range(start, end, freq='MS')
+    if interval == 'weekly':
+        return pd.date_range(start, end, freq='7D')
+    step = interval_step(interval)
+    if step is None:
+        raise ValueError(f"未対応の間隔です: {interval}")
+    calendar = pd.date_range(start, end, freq=step)
+    return calendar[~np.isin(calendar.dayofweek, WEEKEND_DAYS)]
+
+def missing_positions(timestamps, calendar, interval):
+    """
+    カレンダーのうち、保存済みのバーが存在しない位置を返します。
+
+    各タイムスタンプが属するカレンダー上のバーを二分探索で求めるため、
+    カレンダーの刻みからずれた時刻のバーも対応するバーとして数えます。
+
+    Args:
+        timestamps (array-like): 保存済みのバーのタイムスタンプ
+        calendar (pd.DatetimeIndex): trading_calendar の戻り値
+        interval (str): データの間隔
+
+    Returns:
+        np.ndarray: 欠落しているカレンダー上の位置（昇順）
+    """
+    stamps = pd.DatetimeIndex(timestamps).as_unit('ns').asi8
+    grid = calendar.as_unit('ns').asi8
+    if len(grid) == 0:
+        return np.array([], dtype='int64')
+    positions = np.searchsorted(grid, stamps, side='right') - 1
+    valid = positions >= 0
+    step = interval_step(interval)
+    if step is not None and interval != 'weekly':
+        # 週末を除いたカレンダーでは、直前のバーの期間を過ぎた時刻（土曜のバーなど）は数えない
+        valid &= stamps < grid[np.maximum(positions, 0)] + step.value
+    present = np.zeros(len(grid), dtype=bool)
+    present[positions[valid]] = True
+    return np.flatnonzero(~present)
+
+def _runs(positions, merge_bars=0):
+    # 昇順の位置を連続した区間（間の空きが merge_bars 以下なら同じ区間）に分け、開始・終了位置を返す
+    if len(positions) == 0:
+        return positions, positions
+    breaks = np.flatnonzero(np.diff(positions) > merge_bars + 1)
+    starts = positions[np.concatenate(([0], breaks + 1))]
+    ends = positions[np.concatenate((breaks, [len(positions) - 1]))]
+    return starts, ends
+
+def missing_ranges(timestamps, interval, start=None, end=None):
+    """
+    保存済みのバーの欠落している範囲を求めます。
+
+    Args:
+        timestamps (array-like): 保存済みのバーのタイムスタンプ
+        interval (str): データの間隔
+        start: 確認する期間の開始時刻（省略時は最初のバー）
+        end: 確認する期間の終了時刻（省略時は最後のバー）
+
+    Returns:
+        pd.DataFrame: start, end（欠落の最初と最後のバーの開始時刻）, bars 列
+    """
+    timestamps = pd.DatetimeIndex(timestamps)
+    if start is None and end is None and len(timestamps) == 0:
+        return pd.DataFrame(columns=['start', 'end', 'bars'])
+    calendar = trading_calendar(timestamps.min() if start is None else start,
+                                timestamps.max() if end is None else end, interval)
+    starts, ends = _runs(missing_positions(timestamps, calendar, interval))
+    return pd.DataFrame({'start': calendar[starts], 'end': calendar[ends], 'bars': ends - starts + 1})
+
+def load_timestamps(symbol, interval, db_path=DEFAULT_DB_PATH):
+    """
+    保存済みのバーのタイムスタンプだけを読み込みます（主キーのみを読むため価格の列は読みません）。
+
+    Args:
+        symbol (str): シンボル名
+        interval (str): データの間隔
+        db_path (str): データベースのパス
+
+    Returns:
+        pd.DatetimeIndex: タイムスタンプ（昇順）
+    """
+    query = "SELECT timestamp FROM price_data WHERE symbol = ? AND interval = ? ORDER BY timestamp ASC"
+    return pd.DatetimeIndex(data_access.read_frame(query, (symbol, interval), db_path)['timestamp'])
+
+def stored_series(db_path=DEFAULT_DB_PATH):
+    """
+    price_data に保存されているシリーズの一覧と期間を返します。
+
+    Args:
+        db_path (str): データベースのパス
+
+    Returns:
+        pd.DataFrame: symbol, interval, first, last, bars 列
+    """
+    query = """
+    SELECT symbol, interval, MIN(timestamp) AS first, MAX(timestamp) AS last, COUNT(*) AS bars
+    FROM price_data
+    GROUP BY symbol, interval
+    """
+    df = data_access.read_frame(query, (), db_path)
+    for column in ['first', 'last']:
+        df[column] = data_access.parse_timestamps(df[column]) if len(df) else pd.Series(dtype='datetime64[ns]')
+    return df
+
+def coverage_index(symbols=None, intervals=None, since=None, until=None, db_path=DEFAULT_DB_PATH):
+    """
+    シリーズごとに、期間内のカレンダーに対するバーの充足状況を求めます。
+
+    Args:
+        symbols (list): 対象のシンボル（省略時は保存済みのすべて）
+        intervals (list): 対象の間隔（省略時は保存済みのすべて）
+        since: 確認する期間の開始時刻（省略時はシリーズの最初のバー）
+        until: 確認する期間の終了時刻（省略時はシリーズの最後のバー）
+        db_path (str): データベースのパス
+
+    Returns:
+        tuple: (COVERAGE_COLUMNS 列のデータフレーム, {(シンボル, 間隔): missing_ranges の戻り値})
+    """
+    series = stored_series(db_path)
+    if symbols:
+        series = series[series['symbol'].isin(symbols)]
+    if intervals:
+        series = series[series['interval'].isin(intervals)]
+
+    rows, ranges = [], {}
+    for symbol, interval, first, last, bars in series.itertuples(index=False):
+        if interval not in RESAMPLE_RULES:
+            continue
+        start = first if since is None else pd.Timestamp(since)
+        end = last if until is None else pd.Timestamp(until)
+        gaps = missing_ranges(load_timestamps(symbol, interval, db_path), interval, start, end)
+        expected = len(trading_calendar(start, end, interval))
+        missing = int(gaps['bars'].sum())
+        ranges[(symbol, interval)] = gaps
+        rows.append((symbol, interval, first, last, bars, expected, missing, len(gaps),
+                     1.0 - missing / expected if expected else 1.0))
+    return pd.DataFrame(rows, columns=COVERAGE_COLUMNS), ranges
+
+def plan_series(symbol, interval, timestamps, start, end, merge_bars=MERGE_BARS, max_bars=MAX_REQUEST_BARS):
+    """
+    1つのシリーズの欠落を埋める取得の一覧を作成します。
+
+    保存済みのバーが merge_bars 本以下しか挟まらない欠落は1回の取得にまとめ、
+    max_bars 本を超える範囲は分割します。
+
+    Args:
+        symbol (str): シンボル名
+        interval (str): データの間隔
+        timestamps (array-like): 保存済みのバーのタイムスタンプ
+        start: 期間の開始時刻
+        end: 期間の終了時刻
+        merge_bars (int): 欠落をまとめる保存済みのバー数の上限
+        max_bars (int): 1回の取得で要求する最大のバー数
+
+    Returns:
+        list: BackfillRequest のリスト（時刻順）
+    """
+    calendar = trading_calendar(start, end, interval)
+    positions = missing_positions(timestamps, calendar, interval)
+    run_starts, run_ends = _runs(positions, merge_bars)
+
+    requests = []
+    for run_start, run_end in zip(run_starts.tolist(), run_ends.tolist()):
+        for first in range(run_start, run_end + 1, max_bars):
+            last = min(first + max_bars - 1, run_end)
+            missing = np.searchsorted(positions, last, side='right') - np.searchsorted(positions, first)
+            requests.append(BackfillRequest(symbol, interval, calendar[first], calendar[last],
+                                            last - first + 1, int(missing)))
+    return requests
+
+def plan_backfill(symbols=None, intervals=None, since=None, until=None, db_path=DEFAULT_DB_PATH,
+                  merge_bars=MERGE_BARS, max_bars=MAX_REQUEST_BARS):
+    """
+    欠落しているバーだけを取得する最小限の取得の一覧を作成します。
+
+    間隔を省略した場合は、シンボルごとに保存済みの最も短い間隔（上位の間隔はここから
+    resample で生成されるため取得しない）を対象にします。
+
+    Args:
+        symbols (list): 対象のシンボル
+        intervals (list): 対象の間隔（省略時はシンボルの基準の間隔）
+        since: 期間の開始時刻（省略時はシリーズの最初のバー）
+        until: 期間の終了時刻（省略時はシリーズの最後のバー）
+        db_path (str): データベースのパス
+        merge_bars (int): 欠落をまとめる保存済みのバー数の上限
+        max_bars (int): 1回の取得で要求する最大のバー数
+
+    Returns:
+        list: BackfillRequest のリスト
+    """
+    requests = []
+    for symbol in get_symbols(symbols or [DEFAULT_SYMBOL]):
+        targets = intervals or [find_base_interval(symbol, db_path)]
+        for interval in targets:
+            if interval is None:
+                continue
+            timestamps = load_timestamps(symbol, interval, db_path)
+            if len(timestamps) == 0 and (since is None or until is None):
+                logging.info(f"{symbol} {interval}: 保存済みのバーがないため期間を決められません")
+                continue
+            start = timestamps.min() if since is None else pd.Timestamp(since)
+            end = timestamps.max() if until is None else pd.Timestamp(until)
+            requests.extend(plan_series(symbol, interval, timestamps, start, end, merge_bars, max_bars))
+    return requests
+
+def _next_bar(timestamp, interval):
+    # 指定した時刻に始まるバーの次のバーの開始時刻を返す
+    if interval == 'monthly':
+        return pd.Timestamp(timestamp) + pd.offsets.MonthBegin(1)
+    if interval == 'weekly':
+        return pd.Timestamp(timestamp) + pd.Timedelta(days=7)
+    return pd.Timestamp(timestamp) + interval_step(interval)
+
+def _request_bars(request, fetcher):
+    # 取得したバーをクリーニングし、要求した範囲に含まれるものだけを残す
+    df = fetcher(request.symbol, request.interval, request.start, request.end)
+    if df is None or df.empty:
+        return None
+    df, _ = clean_price_data(df, request.interval)
+    df = df[(df['timestamp'] >= request.start) & (df['timestamp'] < _next_bar(request.end, request.interval))]
+    return df.assign(symbol=request.symbol, interval=request.interval)
+
+def run_backfill(requests, fetcher, db_path=DEFAULT_DB_PATH, batch_size=BATCH_SIZE):
+    """
+    取得の一覧を batch_size 件ずつ実行し、price_data に書き込みます。
+
+    バッチごとに取得したバーをシリーズ単位でまとめて INSERT OR IGNORE するため、
+    まとめた取得に含まれる保存済みのバーは上書きされず、中断しても書き込み済みのバッチは残ります。
+
+    Args:
+        requests (list): plan_backfill の戻り値
+        fetcher (callable): fetcher(symbol, interval, start, end) で timestamp, open, high, low, close,
+            volume 列のデータフレームを返す関数
+        db_path (str): データベースのパス
+        batch_size (int): まとめて書き込む取得の数
+
+    Returns:
+        dict: {(シンボル, 間隔): 追加したバー数}
+    """
+    inserted = {}
+    for offset in range(0, len(requests), batch_size):
+        batch = requests[offset:offset + batch_size]
+        frames = []
+        for request in batch:
+            try:
+                df = _request_bars(request, fetcher)
+            except Exception as e:
+                logging.error(f"{request.symbol} {request.interval} {request.start}〜{request.end}: "
+                              f"取得中にエラーが発生しました: {e}")
+                print(f"{request.symbol} {request.interval} {request.start}〜{request.end}: "
+                      f"取得中にエラーが発生しました: {e}")
+                continue
+            if df is not None and not df.empty:
+                frames.append(df)
+        if not frames:
+            continue
+
+        df = pd.concat(frames, ignore_index=True)
+        with data_access.connection(db_path) as conn:
+            for key, group in df.groupby(['symbol', 'interval'], sort=False):
+                # INSERT OR IGNORE で実際に追加された行数を接続の変更数から求める
+                before = conn.total_changes
+                bulk_write_frame(db_path, 'price_data', group, PRICE_COLUMNS, mode='ignore', conn=conn)
+                inserted[key] = inserted.get(key, 0) + conn.total_changes - before
+        logging.info(f"バックフィル: {offset + len(batch)}/{len(requests)}件を実行しました")
+    return inserted
+
+def main():
+    os.makedirs(LOG_DIR, exist_ok=True)
+    logging.basicConfig(
+        filename=LOG_FILE,
+        level=logging.INFO,
+        format='%(asctime)s %(levelname)s:%(message)s'
+    )
+
+    parser = argparse.ArgumentParser(description='price_data の欠落を確認し、埋めるための取得の一覧を表示します')
+    parser.add_argument('--symbol', action='append', dest='symbols')
+    parser.add_argument('--interval', action='append', dest='intervals')
+    parser.add_argument('--since', default=None, help='確認する期間の開始時刻')
+    parser.add_argument('--until', default=None, help='確認する期間の終了時刻')
+    parser.add_argument('--merge-bars', type=int, default=MERGE_BARS)
+    parser.add_argument('--max-bars', type=int, default=MAX_REQUEST_BARS)
+    parser.add_argument('--db-path', default=DEFAULT_DB_PATH)
+    args = parser.parse_args()
+
+    index, _ = coverage_index(args.symbols, args.intervals, args.since, args.until, args.db_path)
+    if index.empty:
+        print("price_dataテーブルにデータが存在しません。")
+        return
+    print(index.to_string(index=False))
+
+    requests = plan_backfill(args.symbols or index['symbol'].unique().tolist(), args.intervals,
+                             args.since, args.until, args.db_path, args.merge_bars, args.max_bars)
+    print(f"取得の一覧: {len(requests)}件, {sum(r.bars for r in requests)}本"
+          f"（うち欠落 {sum(r.missing for r in requests)}本）")
+    for request in requests[:50]:
+        print(f"  {request.symbol} {request.interval}: {request.start} 〜 {request.end} "
+              f"({request.bars}本, 欠落 {request.missing}本)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,357 @@
+# scripts/data_quality.py
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+import data_access
+from data_access import DEFAULT_DB_PATH
+from resample import RESAMPLE_RULES
+from symbols import DEFAULT_SYMBOL
+
+PRICE_FIELDS = ['open', 'high', 'low', 'close']
+
+# 外れ値の判定に使う直近のバー数と、判定を始めるまでに必要なバー数
+MAD_WINDOW = 50
+MAD_MIN_PERIODS = 20
+
+# 直近の騰落率の中央値からの乖離が MAD（正規分布換算）のこの倍数を超えたものを異常とする
+MAD_THRESHOLD = 10.0
+
+# 価格が動かない期間に MAD が0になるのを防ぐ下限（対数騰落率、おおよそ0.1pip）
+MIN_RETURN_SCALE = 1e-5
+
+# MAD を正規分布の標準偏差に換算する係数
+MAD_TO_STD = 1.4826
+
+REPORT_KEYS = ['rows_in', 'rows_out', 'duplicates', 'out_of_order', 'invalid', 'filled',
+               'ohlc_fixed', 'flat', 'outliers', 'wicks_clipped', 'gaps', 'missing_bars']
+
+def interval_step(interval):
+    """
+    間隔の1本あたりの長さを返します（月足など長さが一定でない場合は None）。
+
+    Args:
+        interval (str): データの間隔（'15m', '1h', 'daily' など）
+
+    Returns:
+        pd.Timedelta: 1本あたりの長さ
+    """
+    rule = RESAMPLE_RULES.get(interval)
+    if rule is None or rule == 'MS':
+        return None
+    if rule.startswith('W-'):
+        return pd.Timedelta(days=7)
+    return pd.Timedelta(rule)
+
+class CleaningReport:
+    """
+    クリーニングで修正・除外した件数と、検出した欠落期間を保持します。
+    """
+
+    def __init__(self):
+        self.counts = dict.fromkeys(REPORT_KEYS, 0)
+        self.gaps = []
+
+    def add(self, key, n):
+        self.counts[key] += int(n)
+
+    def __getitem__(self, key):
+        return self.counts[key]
+
+    def summary(self):
+        """
+        ログ出力用の1行の要約を返します。
+        """
+        return ', '.join(f"{key}={value}" for key, value in self.counts.items())
+
+class DataCleaner:
+    """
+    価格データをチャンクごとにクリーニングします。
+
+    出力した直近 2 * window 本の終値（中央値と MAD の計算に必要な長さ）と未確定の最後の2本のバーを
+    状態として持ち越すため、全期間を一度にメモリに載せなくても、一括で処理した場合と同じバーを出力します。
+    （最後のバーは次のチャンクの同じ時刻の行で置き換わることがあり、その前のバーのスパイクの判定は
+    最後のバーの終値で決まるため、2本を未確定とする）
+
+    1. 時刻のない行・価格が正でない行を除外し、欠損した価格は直前の値で補完
+    2. 同じ時刻の重複を keep に従って解消（前のチャンクの最後の時刻と同じ行も重複として扱い、
+       それより前の時刻の行は除外）
+    3. 安値 <= 始値・終値 <= 高値 を満たさないバーの高値・安値を修正
+    4. 間隔のカレンダーに対する欠落期間を検出（週末の休場は除く）
+    5. 直近の騰落率の中央値と MAD から外れ値を判定
+       - 終値: 異常な騰落の直後に逆向きの異常な騰落で戻ったバー（スパイク）を除外
+         （戻らない急変は相場の変化として残すため、1本先を見てから確定する）。
+         騰落率は常に残したバーの終値から計算し、スパイクを除いた後のバーはその前の残したバーと比べ直す
+       - ヒゲ: 実体からの長さが異常なヒゲを実体の位置まで切り詰める
+    """
+
+    def __init__(self, interval=None, window=MAD_WINDOW, threshold=MAD_THRESHOLD,
+                 keep='last', drop_flat=False):
+        """
+        Args:
+            interval (str): データの間隔（欠落期間の検出に使用、省略時は検出しない）
+            window (int): 外れ値の判定に使う直近のバー数
+            threshold (float): 外れ値とみなす乖離（MAD の倍数）
+            keep (str): 時刻が重複した場合に残す行（'first' または 'last'）
+            drop_flat (bool): 始値 = 終値 かつ 高値 = 安値 の値動きのないバーを除外するか
+        """
+        self.step = interval_step(interval) if interval else None
+        self.window = window
+        self.threshold = threshold
+        self.keep = keep
+        self.drop_flat = drop_flat
+        # 出力したバーの直近の終値と、確定できない最後の2本のバー（外れ値の判定前）、これまでの最後の時刻
+        self.closes = np.empty(0)
+        self.pending = None
+        self.last_timestamp = None
+        self.report = CleaningReport()
+
+    def clean(self, chunk):
+        """
+        チャンクを1つクリーニングします（時刻の昇順に続くチャンクを順番に渡します）。
+
+        各チャンクの最後の2本のバーは次のチャンクと合わせて判定するため、次の呼び出しか flush で出力されます。
+
+        Args:
+            chunk (pd.DataFrame): timestamp, open, high, low, close（, volume）列を持つデータフレーム
+
+        Returns:
+            pd.DataFrame: クリーニング済みのデータフレーム（timestamp の昇順）
+        """
+        # 欠落期間は置き換える前の最後のバーから数える（置き換えた時刻の前の欠落は数え済み）
+        previous = self.pending['timestamp'].iloc[-1] if self._has_pending() else None
+        df = self._validate(chunk)
+        self._detect_gaps(df, previous)
+
+        if self.pending is not None:
+            df = pd.concat([self.pending, df])
+        if df.empty:
+            return df
+        final = max(len(df) - 2, 0)
+        self.pending = df.iloc[final:]
+        return self._emit(self._drop_outliers(df, final))
+
+    def flush(self):
+        """
+        保留している最後のバーを出力します（入力の終わりで呼び出します）。
+
+        Returns:
+            pd.DataFrame: 保留していたバー（ない場合は空）
+        """
+        pending, self.pending = self.pending, None
+        if pending is None or pending.empty:
+            return pd.DataFrame(columns=PRICE_FIELDS)
+        return self._emit(self._drop_outliers(pending, len(pending)))
+
+    def _emit(self, df):
+        self.closes = self._history(self.closes, df['close'].to_numpy(dtype='float64'))
+        self.report.add('rows_out', len(df))
+        return df
+
+    def _validate(self, chunk):
+        report = self.report
+        report.add('rows_in', len(chunk))
+        df = chunk[chunk['timestamp'].notna()].sort_values('timestamp', kind='mergesort')
+
+        # 重複の解消
+        duplicated = df['timestamp'].duplicated(keep=self.keep)
+        report.add('duplicates', duplicated.sum())
+        df = df[~duplicated]
+        if self.last_timestamp is not None:
+            late = df['timestamp'] < self.last_timestamp
+            report.add('out_of_order', late.sum())
+            df = df[~late]
+            # 前のチャンクの最後の時刻と同じ行は重複（keep='last' なら未確定の最後のバーを置き換える）
+            same = df['timestamp'] == self.last_timestamp
+            if same.any():
+                report.add('duplicates', 1)
+                if self.keep == 'last':
+                    if self._has_pending() and self.pending['timestamp'].iloc[-1] == self.last_timestamp:
+                        self.pending = self.pending.iloc[:-1]
+                else:
+                    df = df[~same]
+        if not df.empty:
+            self.last_timestamp = df['timestamp'].iloc[-1]
+
+        # 不正な値の除外と欠損値の補完
+        prices = df[PRICE_FIELDS]
+        invalid = (prices <= 0).any(axis=1) | prices.isna().all(axis=1)
+        report.add('invalid', invalid.sum())
+        df = df[~invalid].copy()
+        missing = df[PRICE_FIELDS].isna()
+        if missing.to_numpy().any():
+            # 前の値で補完する（チャンクの先頭は前のチャンクの最後のバーから）
+            report.add('filled', missing.any(axis=1).sum())
+            prices = df[PRICE_FIELDS]
+            if self._has_pending():
+                prices = pd.concat([self.pending[PRICE_FIELDS].iloc[-1:].astype('float64'), prices])
+            df[PRICE_FIELDS] = prices.ffill().iloc[-len(df):].to_numpy()
+            df = df.dropna(subset=PRICE_FIELDS)
+        if 'volume' in df.columns:
+            df['volume'] = df['volume'].fillna(0)
+
+        # OHLC の整合性（高値・安値が始値・終値を含むように修正）
+        body_high = df[['open', 'close']].max(axis=1)
+        body_low = df[['open', 'close']].min(axis=1)
+        broken = (df['high'] < body_high) | (df['low'] > body_low)
+        if broken.any():
+            report.add('ohlc_fixed', broken.sum())
+            df['high'] = df[PRICE_FIELDS].max(axis=1)
+            df['low'] = df[PRICE_FIELDS].min(axis=1)
+
+        if self.drop_flat:
+            flat = (df['open'] == df['close']) & (df['high'] == df['low'])
+            report.add('flat', flat.sum())
+            df = df[~flat]
+        return df
+
+    def _has_pending(self):
+        return self.pending is not None and not self.pending.empty
+
+    def _history(self, history, closes):
+        # MAD は window 本の中央値の window 本分の中央値のため、2 * window 本を持ち越す
+        return np.concatenate([history, closes])[-2 * self.window:]
+
+    def _kept(self, closes, spike, end):
+        # end より前の残したバーの終値（出力済みのものを含めて直近 2 * window 本）
+        begin = max(end - 4 * self.window, 0)
+        kept = closes[begin:end][~spike[begin:end]]
+        if begin > 0 and len(kept) < 2 * self.window:
+            kept = closes[:end][~spike[:end]]
+        return self._history(self.closes, kept)
+
+    def _zscores(self, history, closes):
+        # 残したバーの直近の終値とつなげて、騰落率の中央値と MAD を計算する
+        offset = len(history)
+        returns = np.log(pd.Series(np.concatenate([history, closes]))).diff()
+        median = returns.rolling(self.window, min_periods=MAD_MIN_PERIODS).median()
+        mad = (returns - median).abs().rolling(self.window, min_periods=MAD_MIN_PERIODS).median()
+        scale = np.maximum(MAD_TO_STD * mad, MIN_RETURN_SCALE).iloc[offset:].to_numpy(copy=True)
+        return (returns - median).iloc[offset:].to_numpy() / scale, scale
+
+    def _spikes(self, z, begin, end):
+        # 異常な騰落の直後に逆向きの異常な騰落で戻ったバーをスパイクとする
+        z, z_next = z[begin:end], np.append(z[begin + 1:end + 1], np.nan)[:end - begin]
+        return begin + np.flatnonzero(((z > self.threshold) & (z_next < -self.threshold))
+                                      | ((z < -self.threshold) & (z_next > self.threshold)))
+
+    def _drop_outliers(self, df, final):
+        closes = df['close'].to_numpy(dtype='float64')
+        z, scale = self._zscores(self.closes, closes)
+        candidates = self._spikes(z, 0, len(df))
+        spike = np.zeros(len(df), dtype=bool)
+        start = end = 0
+        while True:
+            # 計算し直したバーの中になければ、最初に見つけた候補のうち end 以降の最初のもの
+            hits = self._spikes(z, start, end)
+            if len(hits) == 0:
+                hits = candidates[np.searchsorted(candidates, end):]
+                if len(hits) == 0:
+                    break
+            # 最初のスパイクを除き、直後のバーは残したバーの終値で計算し直す
+            # （チャンクの区切りで除外した場合と同じく、除外したバーを後のバーの騰落率や MAD に使わない）。
+            # 中央値と MAD は直近 2 * window 本の終値で決まるため、それより先のバーは計算し直さなくてよい
+            first = hits[0]
+            spike[first] = True
+            start, end = first + 1, min(first + 2 * self.window + 2, len(df))
+            z[start:end], scale[start:end] = self._zscores(self._kept(closes, spike, first), closes[start:end])
+        # 確定する先頭の final 本だけを出力し、数える（残りは次のチャンクと合わせて判定し直す）
+        self.report.add('outliers', spike[:final].sum())
+
+        # 実体から異常に離れたヒゲは実体の位置まで切り詰める
+        df = df.copy()
+        body_high = np.maximum(df['open'], df['close'])
+        body_low = np.minimum(df['open'], df['close'])
+        limit = self.threshold * scale
+        upper = (np.log(df['high'] / body_high) > limit).to_numpy()
+        lower = (np.log(body_low / df['low']) > limit).to_numpy()
+        self.report.add('wicks_clipped', (upper | lower)[:final].sum())
+        df.loc[upper, 'high'] = body_high[upper]
+        df.loc[lower, 'low'] = body_low[lower]
+        return df.iloc[:final][~spike[:final]]
+
+    def _detect_gaps(self, df, previous=None):
+        if self.step is None or df.empty:
+            return
+        timestamps = df['timestamp']
+        if previous is not None:
+            timestamps = pd.concat([pd.Series([previous]), timestamps], ignore_index=True)
+        stamps = pd.DatetimeIndex(timestamps)
+        previous, current = stamps[:-1], stamps[1:]
+        delta = (current - previous).to_numpy()
+        step = self.step.to_timedelta64()
+        gap = delta > step
+        # 金曜から日曜・月曜への間隔は休場のため欠落としない
+        weekend = ((previous.dayofweek >= 4) & np.isin(current.dayofweek, [6, 0])
+                   & (delta <= np.timedelta64(3, 'D') + step))
+        gap &= ~weekend
+        if not gap.any():
+            return
+        missing = delta[gap] // step - 1
+        self.report.add('gaps', gap.sum())
+        self.report.add('missing_bars', missing.sum())
+        self.report.gaps.extend(zip(previous[gap], current[gap], missing.tolist()))
+
+def iter_clean(chunks, cleaner=None, **kwargs):
+    """
+    チャンクのイテレータを順番にクリーニングします。
+
+    Args:
+        chunks (iterable): 価格データのチャンク（import_history.iter_csv_chunks など）
+        cleaner (DataCleaner): 使用するクリーナー（省略時は kwargs から作成）
+        **kwargs: DataCleaner の引数
+
+    Yields:
+        pd.DataFrame: クリーニング済みのチャンク
+    """
+    cleaner = cleaner or DataCleaner(**kwargs)
+    for chunk in chunks:
+        cleaned = cleaner.clean(chunk)
+        if not cleaned.empty:
+            yield cleaned
+    last = cleaner.flush()
+    if not last.empty:
+        yield last
+
+def clean_price_data(df, interval=None, chunk_size=None, **kwargs):
+    """
+    価格データをクリーニングします。
+
+    Args:
+        df (pd.DataFrame): timestamp 列（または DatetimeIndex）を持つ価格データ
+        interval (str): データの間隔（欠落期間の検出に使用）
+        chunk_size (int): この行数ずつ処理する（省略時は一括）
+        **kwargs: DataCleaner の引数
+
+    Returns:
+        tuple: (クリーニング済みのデータフレーム, CleaningReport)
+    """
+    indexed = 'timestamp' not in df.columns
+    if indexed:
+        df = df.rename_axis('timestamp').reset_index()
+    size = chunk_size or max(len(df), 1)
+    cleaner = DataCleaner(interval, **kwargs)
+    parts = list(iter_clean((df.iloc[start:start + size] for start in range(0, len(df), size)), cleaner))
+    cleaned = pd.concat(parts) if parts else df.iloc[:0]
+    if indexed:
+        cleaned = cleaned.set_index('timestamp')
+    return cleaned, cleaner.report
+
+def main():
+    parser = argparse.ArgumentParser(description='保存済みの価格データの品質を確認します（データは変更しません）')
+    parser.add_argument('--symbol', default=DEFAULT_SYMBOL)
+    parser.add_argument('--interval', default='daily')
+    parser.add_argument('--chunk-size', type=int, default=100000)
+    parser.add_argument('--db-path', default=DEFAULT_DB_PATH)
+    args = parser.parse_args()
+
+    df = data_access.load_ohlc(args.symbol, args.interval, db_path=args.db_path)
+    _, report = clean_price_data(df, args.interval, chunk_size=args.chunk_size)
+    print(f"{args.symbol} {args.interval}: {report.summary()}")
+    for start, end, missing in report.gaps[:20]:
+        print(f"  欠落: {pd.Timestamp(start)} → {pd.Timestamp(end)} ({missing}本)")
+
+if __name__ == "__main__":
+    main()
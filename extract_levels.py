@@ -1,119 +1,129 @@
-import sqlite3
-import pandas as pd
-from sklearn.cluster import KMeans
-import numpy as np
-import os
-
-def load_pivot_points(symbol, interval, db_path='data/eurusd_trading.db'):
-    """
-    SQLiteデータベースからピボットポイントデータを読み込みます。
-
-    Args:
-        symbol (str): シンボル名
-        interval (str): データの間隔（'daily' または 'weekly'）
-        db_path (str): データベースのパス
-
-    Returns:
-        pd.DataFrame: 読み込まれたピボットポイントデータフレーム
-    """
-    try:
-        conn = sqlite3.connect(db_path)
-        query = f"""
-        SELECT timestamp, Pivot, Support1, Resistance1, Support2, Resistance2
-        FROM pivot_points
-        WHERE symbol = '{symbol}' AND interval = '{interval}'
-        ORDER BY timestamp ASC
-        """
-        df = pd.read_sql_query(query, conn, parse_dates=['timestamp'], index_col='timestamp')
-        conn.close()
-        return df
-    except Exception as e:
-        print(f"データベースからの読み込み中にエラーが発生しました: {e}")
-        return pd.DataFrame()
-
-def extract_levels(df, num_clusters=5):
-    """
-    高値と安値をクラスタリングし、サポート・レジスタンスラインを抽出します。
-
-    Args:
-        df (pd.DataFrame): ピボットポイントを含むデータフレーム
-        num_clusters (int): クラスタ数
-
-    Returns:
-        list: 抽出された価格レベルのリスト
-    """
-    high_prices = df['Resistance1'].values.reshape(-1, 1)
-    low_prices = df['Support1'].values.reshape(-1, 1)
-    all_prices = np.vstack((high_prices, low_prices))
-
-    kmeans = KMeans(n_clusters=num_clusters, random_state=0)
-    kmeans.fit(all_prices)
-    levels = sorted([cluster[0] for cluster in kmeans.cluster_centers_])
-    return levels
-
-def save_levels_to_db(levels, symbol, interval, db_path='data/eurusd_trading.db'):
-    """
-    抽出された価格レベルをSQLiteデータベースに保存します。
-
-    Args:
-        levels (list): 抽出された価格レベルのリスト
-        symbol (str): シンボル名
-        interval (str): データの間隔（'daily' または 'weekly'）
-        db_path (str): データベースのパス
-    """
-    try:
-        conn = sqlite3.connect(db_path)
-        for level in levels:
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO price_levels (symbol, interval, level)
-                VALUES (?, ?, ?)
-            ''', (symbol, interval, level))
-        conn.commit()
-        conn.close()
-        print(f"{interval}データの価格レベルをデータベースに保存しました")
-    except Exception as e:
-        print(f"SQLiteへの保存中にエラーが発生しました: {e}")
-
-def setup_price_levels_table(db_path='data/eurusd_trading.db'):
-    """
-    price_levels テーブルを作成します。
-
-    Args:
-        db_path (str): データベースのパス
-    """
-    try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS price_levels (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            symbol TEXT,
-            interval TEXT,
-            level REAL
-        )
-        ''')
-        conn.commit()
-        conn.close()
-        print("price_levels テーブルを作成しました")
-    except Exception as e:
-        print(f"SQLiteへの接続中にエラーが発生しました: {e}")
-
-def main():
-    SYMBOL = 'EURUSD'
-    INTERVALS = ['daily', 'weekly']
-    db_path = 'data/eurusd_trading.db'
-    
-    # price_levels テーブルのセットアップ
-    setup_price_levels_table(db_path)
-    
-    for interval in INTERVALS:
-        df = load_pivot_points(SYMBOL, interval, db_path)
-        if not df.empty:
-            levels = extract_levels(df, num_clusters=5)
-            save_levels_to_db(levels, SYMBOL, interval, db_path)
-        else:
-            print(f"{interval}データが存在しません")
-
-if __name__ == "__main__":
-    main()
+import sqlite3
+import pandas as pd
+import numpy as np
+import os
+from bulk_writer import bulk_write
+from level_clustering import cluster_levels
+import data_access
+from symbols import get_symbols, DEFAULT_SYMBOL
+
+def load_pivot_points(symbol, interval, db_path='data/eurusd_trading.db'):
+    """
+    SQLiteデータベースからピボットポイントデータを読み込みます。
+
+    Args:
+        symbol (str): シンボル名
+        interval (str): データの間隔（'daily' または 'weekly'）
+        db_path (str): データベースのパス
+
+    Returns:
+        pd.DataFrame: 読み込まれたピボットポイントデータフレーム
+    """
+    try:
+        return data_access.load_pivot_points(symbol, interval, db_path=db_path)
+    except Exception as e:
+        print(f"データベースからの読み込み中にエラーが発生しました: {e}")
+        return pd.DataFrame()
+
+def extract_levels(df, num_clusters=5, method='dp', init=None):
+    """
+    高値と安値をクラスタリングし、サポート・レジスタンスラインを抽出します。
+
+    Args:
+        df (pd.DataFrame): ピボットポイントを含むデータフレーム
+        num_clusters (int): クラスタ数（None の場合は自動で選択）
+        method (str): level_clustering のクラスタリング方式（'dp', 'kde', 'minibatch'）
+        init (list): 前回の価格レベル（ウォームスタート）
+
+    Returns:
+        list: 抽出された価格レベルのリスト
+    """
+    all_prices = np.concatenate((df['Resistance1'].to_numpy(), df['Support1'].to_numpy()))
+    levels = cluster_levels(all_prices, k=num_clusters, method=method, init=init)
+    return [float(level) for level in levels]
+
+def load_previous_levels(symbol, interval, db_path='data/eurusd_trading.db'):
+    """
+    前回保存したクラスタリングの価格レベルを読み込みます（ウォームスタート用）。
+
+    Args:
+        symbol (str): シンボル名
+        interval (str): データの間隔（'daily' または 'weekly'）
+        db_path (str): データベースのパス
+
+    Returns:
+        list: 価格レベルのリスト（存在しない場合は空）
+    """
+    try:
+        df = data_access.load_price_levels(symbol, interval, db_path=db_path)
+        # type のない行がクラスタリングの結果（type のある行はピボット由来）
+        return sorted(set(df.loc[df['type'].isna(), 'level'].tolist()))
+    except Exception as e:
+        print(f"前回の価格レベルの読み込み中にエラーが発生しました: {e}")
+        return []
+
+def save_levels_to_db(levels, symbol, interval, db_path='data/eurusd_trading.db'):
+    """
+    抽出された価格レベルをSQLiteデータベースに保存します。
+
+    同じシンボル・間隔の前回のクラスタリング結果は、同じトランザクション内で最新の結果に置き換えます。
+
+    Args:
+        levels (list): 抽出された価格レベルのリスト
+        symbol (str): シンボル名
+        interval (str): データの間隔（'daily' または 'weekly'）
+        db_path (str): データベースのパス
+    """
+    try:
+        rows = [(symbol, interval, float(level)) for level in levels]
+        with data_access.connection(db_path) as conn:
+            conn.execute("DELETE FROM price_levels WHERE symbol = ? AND interval = ? AND type IS NULL",
+                         (symbol, interval))
+            result = bulk_write(db_path, 'price_levels', ['symbol', 'interval', 'level'], rows, conn=conn)
+        print(f"{interval}データの価格レベルをデータベースに保存しました（{result.rows_per_sec:,.0f} rows/sec）")
+    except Exception as e:
+        print(f"SQLiteへの保存中にエラーが発生しました: {e}")
+
+def setup_price_levels_table(db_path='data/eurusd_trading.db'):
+    """
+    price_levels テーブルを作成します。
+
+    Args:
+        db_path (str): データベースのパス
+    """
+    try:
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS price_levels (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            symbol TEXT,
+            interval TEXT,
+            level REAL
+        )
+        ''')
+        conn.commit()
+        conn.close()
+        print("price_levels テーブルを作成しました")
+    except Exception as e:
+        print(f"SQLiteへの接続中にエラーが発生しました: {e}")
+
+def main(symbols=None, method='dp'):
+    INTERVALS = ['daily', 'weekly']
+    db_path = data_access.DEFAULT_DB_PATH
+    
+    # price_levels テーブルのセットアップ
+    setup_price_levels_table(db_path)
+    
+    for symbol in get_symbols(symbols or [DEFAULT_SYMBOL]):
+        for interval in INTERVALS:
+            df = load_pivot_points(symbol, interval, db_path)
+            if not df.empty:
+                previous = load_previous_levels(symbol, interval, db_path)
+                levels = extract_levels(df, num_clusters=5, method=method, init=previous)
+                save_levels_to_db(levels, symbol, interval, db_path)
+            else:
+                print(f"{symbol} {interval}データが存在しません")
+
+if __name__ == "__main__":
+    main()
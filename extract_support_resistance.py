@@ -1,136 +1,171 @@
-# scripts/extract_support_resistance.py
-
-import sqlite3
-import pandas as pd
-import os
-import logging
-
-# ログディレクトリとファイル名を設定
-LOG_DIR = os.path.join(os.path.dirname(__file__), '..', 'logs')
-LOG_FILE = os.path.join(LOG_DIR, 'support_resistance_extraction.log')
-
-# ログディレクトリが存在しない場合は作成
-os.makedirs(LOG_DIR, exist_ok=True)
-
-# ログの設定
-logging.basicConfig(
-    filename=LOG_FILE,
-    level=logging.INFO,
-    format='%(asctime)s %(levelname)s:%(message)s'
-)
-
-# SQLiteデータベースのパス
-DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'eurusd_trading.db')
-
-def fetch_pivot_points(interval):
-    """
-    データベースから指定した間隔のピボットポイントを取得します。
-    
-    Args:
-        interval (str): データの間隔（'daily' または 'weekly'）
-    
-    Returns:
-        pd.DataFrame: ピボットポイントデータ
-    """
-    conn = sqlite3.connect(DB_PATH)
-    query = f"""
-    SELECT timestamp, Pivot, Support1, Resistance1, Support2, Resistance2
-    FROM pivot_points
-    WHERE interval = '{interval}'
-    ORDER BY timestamp ASC
-    """
-    df = pd.read_sql_query(query, conn, parse_dates=['timestamp'])
-    conn.close()
-    return df
-
-def save_support_resistance(df_sr, interval):
-    """
-    抽出したサポートラインとレジスタンスラインをデータベースに保存します。
-    
-    Args:
-        df_sr (pd.DataFrame): サポートラインとレジスタンスラインを含むデータフレーム
-        interval (str): データの間隔（'daily' または 'weekly'）
-    """
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    for _, row in df_sr.iterrows():
-        try:
-            # Support1
-            cursor.execute('''
-                INSERT OR REPLACE INTO price_levels 
-                (timestamp, symbol, interval, level, type)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (
-                row['timestamp'].strftime('%Y-%m-%d %H:%M:%S'),
-                'EURUSD',
-                interval,
-                row['Support1'],
-                'Support1'
-            ))
-            # Support2
-            cursor.execute('''
-                INSERT OR REPLACE INTO price_levels 
-                (timestamp, symbol, interval, level, type)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (
-                row['timestamp'].strftime('%Y-%m-%d %H:%M:%S'),
-                'EURUSD',
-                interval,
-                row['Support2'],
-                'Support2'
-            ))
-            # Resistance1
-            cursor.execute('''
-                INSERT OR REPLACE INTO price_levels 
-                (timestamp, symbol, interval, level, type)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (
-                row['timestamp'].strftime('%Y-%m-%d %H:%M:%S'),
-                'EURUSD',
-                interval,
-                row['Resistance1'],
-                'Resistance1'
-            ))
-            # Resistance2
-            cursor.execute('''
-                INSERT OR REPLACE INTO price_levels 
-                (timestamp, symbol, interval, level, type)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (
-                row['timestamp'].strftime('%Y-%m-%d %H:%M:%S'),
-                'EURUSD',
-                interval,
-                row['Resistance2'],
-                'Resistance2'
-            ))
-        except Exception as e:
-            logging.error(f"Error inserting price level for {row['timestamp']}: {e}")
-            print(f"Error inserting price level for {row['timestamp']}: {e}")
-            # エラー発生時にスクリプトを停止する場合は以下をコメント解除
-            # raise e
-    
-    conn.commit()
-    conn.close()
-    logging.info(f"{interval}データのサポートラインとレジスタンスラインをデータベースに保存しました")
-
-def main():
-    intervals = ['daily', 'weekly']
-    for interval in intervals:
-        logging.info(f"{interval}データのサポートラインとレジスタンスライン抽出を開始します")
-        df_pivot = fetch_pivot_points(interval)
-        if df_pivot.empty:
-            logging.warning(f"{interval}データのピボットポイントがデータベースに存在しません")
-            continue
-        
-        # サポートラインとレジスタンスラインの抽出
-        df_sr = df_pivot[['timestamp', 'Support1', 'Support2', 'Resistance1', 'Resistance2']].copy()
-        
-        # データベースへの保存
-        save_support_resistance(df_sr, interval)
-        logging.info(f"{interval}データのサポートラインとレジスタンスライン抽出と保存が完了しました")
-    
-    print("サポートラインとレジスタンスラインの抽出と保存が完了しました。")
-
-if __name__ == "__main__":
-    main()
+# scripts/extract_support_resistance.py
+
+import pandas as pd
+import os
+import logging
+import argparse
+import data_access
+from bulk_writer import bulk_write_frame
+from data_access import load_pivot_points, TIMESTAMP_FORMAT
+from watermark import get_watermark, set_watermark, reset_watermark
+from instrumentation import Instrumentation, stage
+
+# ログディレクトリとファイル名を設定
+LOG_DIR = os.path.join(os.path.dirname(__file__), '..', 'logs')
+LOG_FILE = os.path.join(LOG_DIR, 'support_resistance_extraction.log')
+
+# ログディレクトリが存在しない場合は作成
+os.makedirs(LOG_DIR, exist_ok=True)
+
+# ログの設定
+logging.basicConfig(
+    filename=LOG_FILE,
+    level=logging.INFO,
+    format='%(asctime)s %(levelname)s:%(message)s'
+)
+
+# SQLiteデータベースのパス
+DB_PATH = os.environ.get('MT5_DB_PATH', os.path.join(os.path.dirname(__file__), '..', 'data', 'eurusd_trading.db'))
+
+# ウォーターマークの処理段階名
+STAGE = 'support_resistance'
+
+LEVEL_COLUMNS = ['timestamp', 'symbol', 'interval', 'level', 'type']
+
+# 作り直したバーの既存のレベルを削除する条件（symbol = ? に続けて使用）。
+# レベルの値が変わると一意制約では置き換わらないため、書き込む最初の時刻以降の行を削除してから書き込む
+REFRESH_CONDITION = "interval = ? AND type IS NOT NULL AND timestamp >= ?"
+
+def fetch_pivot_points(interval, symbol='EURUSD', since=None):
+    """
+    データベースから指定した間隔のピボットポイントを取得します。
+    
+    Args:
+        interval (str): データの間隔（'daily' または 'weekly'）
+        symbol (str): シンボル名
+        since (str): この時刻以降のピボットポイントのみ取得（省略時は全履歴）
+    
+    Returns:
+        pd.DataFrame: ピボットポイントデータ
+    """
+    # ウォーターマークの位置のバーは作り直されている場合があるため、その行も再処理する
+    return load_pivot_points(symbol, interval, since=since, db_path=DB_PATH, include_since=True).reset_index()
+
+def support_resistance_rows(df_sr, interval, symbol='EURUSD'):
+    """
+    サポートラインとレジスタンスラインを price_levels の行形式（縦持ち）に変換します。
+    
+    Args:
+        df_sr (pd.DataFrame): サポートラインとレジスタンスラインを含むデータフレーム
+        interval (str): データの間隔（'daily' または 'weekly'）
+        symbol (str): シンボル名
+    
+    Returns:
+        pd.DataFrame: timestamp, symbol, interval, level, type 列を持つデータフレーム
+    """
+    return df_sr.melt(
+        id_vars='timestamp',
+        value_vars=['Support1', 'Support2', 'Resistance1', 'Resistance2'],
+        var_name='type',
+        value_name='level'
+    ).assign(symbol=symbol, interval=interval)[LEVEL_COLUMNS]
+
+def refresh_scope(df_levels, interval):
+    """
+    support_resistance_rows の行で置き換える範囲の条件とパラメータを返します。
+
+    Args:
+        df_levels (pd.DataFrame): support_resistance_rows の戻り値
+        interval (str): データの間隔
+
+    Returns:
+        tuple: (REFRESH_CONDITION, パラメータ)
+    """
+    first = pd.Timestamp(df_levels['timestamp'].min()).strftime(TIMESTAMP_FORMAT)
+    return REFRESH_CONDITION, (interval, first)
+
+def write_support_resistance_rows(db_path, df_levels, symbol, interval):
+    """
+    support_resistance_rows の行を、同じ範囲の既存の行と同じトランザクション内で置き換えます。
+
+    Args:
+        db_path (str): データベースのパス
+        df_levels (pd.DataFrame): support_resistance_rows の戻り値
+        symbol (str): シンボル名
+        interval (str): データの間隔
+
+    Returns:
+        WriteResult: 書き込み結果
+    """
+    condition, params = refresh_scope(df_levels, interval)
+    with data_access.connection(db_path) as conn:
+        conn.execute(f"DELETE FROM price_levels WHERE symbol = ? AND {condition}", (symbol, *params))
+        return bulk_write_frame(db_path, 'price_levels', df_levels, LEVEL_COLUMNS, mode='replace', conn=conn)
+
+def save_support_resistance(df_sr, interval, symbol='EURUSD'):
+    """
+    抽出したサポートラインとレジスタンスラインをデータベースに保存します。
+    
+    Args:
+        df_sr (pd.DataFrame): サポートラインとレジスタンスラインを含むデータフレーム
+        interval (str): データの間隔（'daily' または 'weekly'）
+        symbol (str): シンボル名
+    
+    Returns:
+        WriteResult: 書き込み結果（失敗した場合は None）
+    """
+    # 4種類のレベルを縦持ちに変換し、1回の一括書き込みで保存
+    df_levels = support_resistance_rows(df_sr, interval, symbol)
+    try:
+        result = write_support_resistance_rows(DB_PATH, df_levels, symbol, interval)
+        print(f"{interval}: {result.rows}行の価格レベルを保存しました（{result.rows_per_sec:,.0f} rows/sec）")
+    except Exception as e:
+        logging.error(f"Error inserting {interval} price levels: {e}")
+        print(f"Error inserting {interval} price levels: {e}")
+        return None
+
+    logging.info(f"{interval}データのサポートラインとレジスタンスラインをデータベースに保存しました")
+    return result
+
+def main(symbol='EURUSD', full_refresh=False, trace_sql=False):
+    """
+    前回処理したピボットポイント以降についてサポート・レジスタンスラインを抽出・保存します。
+
+    Args:
+        symbol (str): シンボル名
+        full_refresh (bool): True の場合はウォーターマークを無視して全履歴を再処理
+        trace_sql (bool): SQLite のクエリ数と実行時間を計測するか
+    """
+    intervals = ['daily', 'weekly']
+    with Instrumentation(STAGE, trace_sql=trace_sql) as run:
+        for interval in intervals:
+            logging.info(f"{interval}データのサポートラインとレジスタンスライン抽出を開始します")
+            with stage(STAGE, symbol, interval) as metrics:
+                if full_refresh:
+                    reset_watermark(DB_PATH, symbol, interval, STAGE)
+                since = get_watermark(DB_PATH, symbol, interval, STAGE)
+                df_pivot = fetch_pivot_points(interval, symbol, since)
+                if df_pivot.empty:
+                    logging.info(f"{interval}: {since} 以降の新しいピボットポイントはありません")
+                    continue
+
+                # サポートラインとレジスタンスラインの抽出
+                df_sr = df_pivot[['timestamp', 'Support1', 'Support2', 'Resistance1', 'Resistance2']].copy()
+
+                # データベースへの保存（成功した場合のみ処理済み位置を進める）
+                if save_support_resistance(df_sr, interval, symbol) is not None:
+                    set_watermark(DB_PATH, symbol, interval, STAGE, df_sr['timestamp'].iloc[-1])
+                metrics.add_rows(len(df_sr))
+            logging.info(f"{interval}データのサポートラインとレジスタンスライン抽出と保存が完了しました")
+    run.save(DB_PATH)
+    
+    print("サポートラインとレジスタンスラインの抽出と保存が完了しました。")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='ピボットポイントからサポート・レジスタンスラインを抽出して保存します')
+    parser.add_argument('--symbol', default='EURUSD')
+    parser.add_argument('--full-refresh', action='store_true', help='ウォーターマークを無視して全履歴を再処理する')
+    parser.add_argument('--trace-sql', action='store_true',
+                        help='SQLite のクエリ数と実行時間を計測する（書き込みが遅くなります）')
+    args = parser.parse_args()
+    main(args.symbol, args.full_refresh, trace_sql=args.trace_sql)
@@ -1,76 +1,137 @@
-import sqlite3
-import pandas as pd
-import os
-import logging
-from datetime import datetime
-
-# ログディレクトリとファイル名を設定
-LOG_DIR = os.path.join(os.path.dirname(__file__), '..', 'logs')
-LOG_FILE = os.path.join(LOG_DIR, 'historical_data_fetch.log')
-
-os.makedirs(LOG_DIR, exist_ok=True)
-
-logging.basicConfig(
-    filename=LOG_FILE,
-    level=logging.INFO,
-    format='%(asctime)s %(levelname)s:%(message)s'
-)
-
-DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'eurusd_trading.db')
-
-def fetch_and_store_data(interval):
-    data = {
-        'timestamp': pd.date_range(start='2024-01-01', periods=10, freq='D'),
-        'open': [1.1750, 1.1800, 1.1850, 1.1900, 1.1950, 1.2000, 1.2050, 1.2100, 1.2150, 1.2200],
-        'high': [1.1800, 1.1850, 1.1900, 1.1950, 1.2000, 1.2050, 1.2100, 1.2150, 1.2200, 1.2250],
-        'low': [1.1700, 1.1750, 1.1800, 1.1850, 1.1900, 1.1950, 1.2000, 1.2050, 1.2100, 1.2150],
-        'close': [1.1780, 1.1830, 1.1880, 1.1930, 1.1980, 1.2030, 1.2080, 1.2130, 1.2180, 1.2230],
-        'volume': [1000, 1100, 1200, 1300, 1400, 1500, 1600, 1700, 1800, 1900],
-        'symbol': ['EURUSD'] * 10
-    }
-    df = pd.DataFrame(data)
-
-    # データのクリーニング
-        # 重複データの削除
-    df.drop_duplicates(subset='timestamp', keep='first', inplace=True)
-
-    # 価格変動のないデータを除外
-    df = df[(df['open'] != df['close']) | (df['high'] != df['low'])]
-
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    for _, row in df.iterrows():
-        try:
-            cursor.execute('''
-                INSERT INTO price_data (timestamp, open, high, low, close, volume, symbol, interval)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                row['timestamp'].strftime('%Y-%m-%d %H:%M:%S'),
-                row['open'],
-                row['high'],
-                row['low'],
-                row['close'],
-                row['volume'],
-                row['symbol'],
-                interval
-            ))
-        except Exception as e:
-            logging.error(f"Error inserting data for {row['timestamp']}: {e}")
-            print(f"Error inserting data for {row['timestamp']}: {e}")
-
-    conn.commit()
-    conn.close()
-    logging.info(f"{interval}データの取得と保存が完了しました")
-
-def main():
-    intervals = ['daily', 'weekly', '1h', '15m']
-    for interval in intervals:
-        logging.info(f"{interval}データの取得を開始します")
-        fetch_and_store_data(interval)
-        logging.info(f"{interval}データの取得と保存が完了しました")
-    
-    print("ヒストリカルデータの取得と保存が完了しました。")
-
-if __name__ == "__main__":
-    main()
+import pandas as pd
+import os
+import logging
+import argparse
+from datetime import datetime
+from bulk_writer import bulk_write_frame
+from data_quality import clean_price_data
+from symbols import get_symbols, DEFAULT_SYMBOL
+from resample import update_derived_bars, BASE_INTERVAL, DERIVED_INTERVALS
+from synthetic_data import random_walk_ohlcv
+from instrumentation import Instrumentation, stage
+
+try:
+    import MetaTrader5 as mt5
+except ImportError:  # 期間を指定した取得（fetch_range）を使用しない場合は不要
+    mt5 = None
+
+# ログディレクトリとファイル名を設定
+LOG_DIR = os.path.join(os.path.dirname(__file__), '..', 'logs')
+LOG_FILE = os.path.join(LOG_DIR, 'historical_data_fetch.log')
+
+os.makedirs(LOG_DIR, exist_ok=True)
+
+logging.basicConfig(
+    filename=LOG_FILE,
+    level=logging.INFO,
+    format='%(asctime)s %(levelname)s:%(message)s'
+)
+
+DB_PATH = os.environ.get('MT5_DB_PATH', os.path.join(os.path.dirname(__file__), '..', 'data', 'eurusd_trading.db'))
+
+PRICE_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume', 'symbol', 'interval']
+
+# fetch_data で生成するバーの開始時刻と本数
+FETCH_START = '2024-01-01'
+FETCH_BARS = 1000
+
+# 間隔名と MT5 の時間足定数名の対応
+MT5_TIMEFRAMES = {
+    '1m': 'TIMEFRAME_M1',
+    '5m': 'TIMEFRAME_M5',
+    '15m': 'TIMEFRAME_M15',
+    '30m': 'TIMEFRAME_M30',
+    '1h': 'TIMEFRAME_H1',
+    '4h': 'TIMEFRAME_H4',
+    'daily': 'TIMEFRAME_D1',
+    'weekly': 'TIMEFRAME_W1',
+    'monthly': 'TIMEFRAME_MN1',
+}
+
+def fetch_data(interval, symbol='EURUSD'):
+    """
+    ヒストリカルデータを取得し、クリーニングしたデータフレームを返します（保存はしません）。
+
+    Args:
+        interval (str): データの間隔
+        symbol (str): シンボル名
+
+    Returns:
+        pd.DataFrame: 価格データ
+    """
+    # 同じシンボル・間隔には毎回同じランダムウォークを返す
+    df = random_walk_ohlcv(FETCH_BARS, symbol, interval, FETCH_START).assign(symbol=symbol)
+
+    # データのクリーニング（重複・価格変動のないデータの除外、OHLC の修正、スパイクの除外）
+    df, report = clean_price_data(df, interval, keep='first', drop_flat=True)
+    logging.info(f"{symbol} {interval}データのクリーニング: {report.summary()}")
+
+    return df.assign(interval=interval)
+
+def fetch_range(symbol, interval, start, end):
+    """
+    MT5ターミナルから指定した期間のバーだけを取得します（data_coverage.run_backfill の取得関数）。
+
+    Args:
+        symbol (str): シンボル名
+        interval (str): データの間隔
+        start: 取得する最初のバーの開始時刻
+        end: 取得する最後のバーの開始時刻
+
+    Returns:
+        pd.DataFrame: timestamp, open, high, low, close, volume 列を持つデータフレーム
+    """
+    if mt5 is None:
+        raise ImportError("期間を指定した取得には MetaTrader5 パッケージが必要です（pip install MetaTrader5）")
+    if not mt5.initialize():
+        raise RuntimeError(f"MT5の初期化に失敗しました: {mt5.last_error()}")
+    try:
+        rates = mt5.copy_rates_range(symbol, getattr(mt5, MT5_TIMEFRAMES[interval]),
+                                     pd.Timestamp(start).to_pydatetime(), pd.Timestamp(end).to_pydatetime())
+    finally:
+        mt5.shutdown()
+    if rates is None or len(rates) == 0:
+        return pd.DataFrame(columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+    return pd.DataFrame({
+        'timestamp': pd.to_datetime(rates['time'].astype('int64'), unit='s'),
+        'open': rates['open'],
+        'high': rates['high'],
+        'low': rates['low'],
+        'close': rates['close'],
+        'volume': rates['tick_volume'].astype('float64'),
+    })
+
+def fetch_and_store_data(interval, symbol='EURUSD'):
+    with stage('fetch', symbol, interval) as metrics:
+        df = fetch_data(interval, symbol)
+        try:
+            # 既存の行と重複する場合はスキップ
+            result = bulk_write_frame(DB_PATH, 'price_data', df, PRICE_COLUMNS, mode='ignore')
+            metrics.add_rows(result.rows)
+            print(f"{symbol} {interval}: {result.rows}行を保存しました（{result.rows_per_sec:,.0f} rows/sec）")
+        except Exception as e:
+            logging.error(f"Error inserting {symbol} {interval} data: {e}")
+            print(f"Error inserting {symbol} {interval} data: {e}")
+
+    logging.info(f"{symbol} {interval}データの取得と保存が完了しました")
+
+def main(symbols=None, trace_sql=False):
+    with Instrumentation('fetch_historical_data', trace_sql=trace_sql) as run:
+        for symbol in get_symbols(symbols or [DEFAULT_SYMBOL]):
+            # 取得するのは基準の間隔のみとし、上位の間隔はそこから生成する
+            logging.info(f"{symbol} {BASE_INTERVAL}データの取得を開始します")
+            fetch_and_store_data(BASE_INTERVAL, symbol)
+            with stage('resample', symbol):
+                update_derived_bars(symbol, DERIVED_INTERVALS, BASE_INTERVAL, DB_PATH)
+    run.save(DB_PATH)
+    
+    print("ヒストリカルデータの取得と保存が完了しました。")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='ヒストリカルデータを取得して保存します')
+    parser.add_argument('--symbol', action='append', dest='symbols',
+                        help='対象のシンボル（複数指定可、省略時は EURUSD）')
+    parser.add_argument('--trace-sql', action='store_true',
+                        help='SQLite のクエリ数と実行時間を計測する（書き込みが遅くなります）')
+    args = parser.parse_args()
+    main(args.symbols, trace_sql=args.trace_sql)
@@ -1,127 +1,145 @@
-import sqlite3
-import pandas as pd
-from ta.momentum import RSIIndicator
-import os
-
-def load_price_data(symbol, interval, db_path='data/eurusd_trading.db'):
-    """
-    SQLiteデータベースから価格データを読み込みます。
-
-    Args:
-        symbol (str): シンボル名
-        interval (str): データの間隔（'15m' または '1h' など）
-        db_path (str): データベースのパス
-
-    Returns:
-        pd.DataFrame: 読み込まれた価格データフレーム
-    """
-    try:
-        conn = sqlite3.connect(db_path)
-        query = f"""
-        SELECT timestamp, open, high, low, close, volume
-        FROM price_data
-        WHERE symbol = '{symbol}' AND interval = '{interval}'
-        ORDER BY timestamp ASC
-        """
-        df = pd.read_sql_query(query, conn, parse_dates=['timestamp'], index_col='timestamp')
-        conn.close()
-        return df
-    except Exception as e:
-        print(f"データベースからの読み込み中にエラーが発生しました: {e}")
-        return pd.DataFrame()
-
-def calculate_rsi(df, window=14):
-    """
-    RSIを計算します。
-
-    Args:
-        df (pd.DataFrame): 価格データフレーム
-        window (int): RSIの計算ウィンドウ
-
-    Returns:
-        pd.Series: RSI値のシリーズ
-    """
-    rsi = RSIIndicator(close=df['close'], window=window)
-    return rsi.rsi()
-
-def filter_levels_with_rsi(rsi, levels, rsi_threshold=50):
-    """
-    RSIを用いてサポート・レジスタンスラインをフィルタリングします。
-
-    Args:
-        rsi (pd.Series): RSI値のシリーズ
-        levels (list): 抽出された価格レベルのリスト
-        rsi_threshold (float): RSIの閾値
-
-    Returns:
-        list: フィルタリングされた価格レベルのリスト
-    """
-    latest_rsi = rsi.iloc[-1]
-
-    if latest_rsi > rsi_threshold:
-        # RSIが高い場合、レジスタンスラインを重視
-        filtered_levels = [level for level in levels if level > current_price]
-    elif latest_rsi < rsi_threshold:
-        # RSIが低い場合、サポートラインを重視
-        filtered_levels = [level for level in levels if level < current_price]
-    else:
-        filtered_levels = levels
-
-    return filtered_levels
-
-def load_price_levels(symbol, interval, db_path='data/eurusd_trading.db'):
-    """
-    SQLiteデータベースから価格レベルを読み込みます。
-
-    Args:
-        symbol (str): シンボル名
-        interval (str): データの間隔（'daily' または 'weekly'）
-        db_path (str): データベースのパス
-
-    Returns:
-        list: 読み込まれた価格レベルのリスト
-    """
-    try:
-        conn = sqlite3.connect(db_path)
-        query = f"""
-        SELECT level
-        FROM price_levels
-        WHERE symbol = '{symbol}' AND interval = '{interval}'
-        """
-        df = pd.read_sql_query(query, conn)
-        conn.close()
-        return df['level'].tolist()
-    except Exception as e:
-        print(f"データベースからの読み込み中にエラーが発生しました: {e}")
-        return []
-
-def main():
-    SYMBOL = 'EURUSD'
-    INTERVAL = '1h'  # 例として1時間足を使用
-    db_path = 'data/eurusd_trading.db'
-    
-    # 価格データの読み込み
-    df = load_price_data(SYMBOL, INTERVAL, db_path)
-    if df.empty:
-        print("価格データが存在しません")
-        return
-    
-    # RSIの計算
-    df['RSI'] = calculate_rsi(df, window=14)
-    
-    # 最新の価格
-    current_price = df['close'].iloc[-1]
-    
-    # ピボットポイントから価格レベルの読み込み
-    daily_levels = load_price_levels(SYMBOL, 'daily', db_path)
-    weekly_levels = load_price_levels(SYMBOL, 'weekly', db_path)
-    combined_levels = sorted(list(set(daily_levels + weekly_levels)))
-    
-    # RSIによるフィルタリング
-    filtered_levels = filter_levels_with_rsi(df['RSI'], combined_levels, rsi_threshold=50)
-    
-    # フィルタリングされた価格レベルを表示
-    print(f"フィルタリングされた価格レベル: {filtered_levels}")
-
-if __name__ == "__main__":
-    main()
+import pandas as pd
+from ta.momentum import RSIIndicator
+import os
+import data_access
+from bulk_writer import bulk_write
+from data_access import DEFAULT_DB_PATH
+from level_index import LevelIndex
+from level_scoring import load_level_scores, top_levels
+from symbols import get_symbols, DEFAULT_SYMBOL
+
+def load_price_data(symbol, interval, db_path='data/eurusd_trading.db', backend=None):
+    """
+    SQLiteデータベース（または指定した保存先）から価格データを読み込みます。
+
+    Args:
+        symbol (str): シンボル名
+        interval (str): データの間隔（'15m' または '1h' など）
+        db_path (str): データベースのパス
+        backend: storage.get_backend で取得した保存先（省略時は db_path のSQLite）
+
+    Returns:
+        pd.DataFrame: 読み込まれた価格データフレーム
+    """
+    try:
+        if backend is not None:
+            return backend.load_ohlc(symbol, interval)
+        return data_access.load_ohlc(symbol, interval, db_path=db_path)
+    except Exception as e:
+        print(f"データベースからの読み込み中にエラーが発生しました: {e}")
+        return pd.DataFrame()
+
+def calculate_rsi(df, window=14):
+    """
+    RSIを計算します。
+
+    Args:
+        df (pd.DataFrame): 価格データフレーム
+        window (int): RSIの計算ウィンドウ
+
+    Returns:
+        pd.Series: RSI値のシリーズ
+    """
+    rsi = RSIIndicator(close=df['close'], window=window)
+    return rsi.rsi()
+
+def filter_levels_with_rsi(rsi, levels, current_price, rsi_threshold=50, max_levels=None):
+    """
+    RSIを用いてサポート・レジスタンスラインをフィルタリングします。
+
+    Args:
+        rsi (pd.Series | float): RSI値のシリーズ、または最新のRSI値（indicators.RSI.value など）
+        levels (LevelIndex | list): 価格レベルの索引、または抽出された価格レベルのリスト
+        current_price (float): 最新の価格
+        rsi_threshold (float): RSIの閾値
+        max_levels (int): 価格に近い順に残す数（省略時はすべて）
+
+    Returns:
+        list: フィルタリングされた価格レベルのリスト（昇順）
+    """
+    latest_rsi = rsi.iloc[-1] if isinstance(rsi, pd.Series) else rsi
+    index = levels if isinstance(levels, LevelIndex) else LevelIndex(levels)
+
+    if latest_rsi > rsi_threshold:
+        # RSIが高い場合、レジスタンスラインを重視
+        filtered_levels = index.resistances_above(current_price, max_levels)
+    elif latest_rsi < rsi_threshold:
+        # RSIが低い場合、サポートラインを重視
+        filtered_levels = index.supports_below(current_price, max_levels)
+    else:
+        filtered_levels = index.tolist()
+
+    return filtered_levels
+
+def save_filtered_levels(levels, symbol, interval, db_path='data/eurusd_trading.db'):
+    """
+    フィルタリングされた価格レベルを filtered_price_levels テーブルに保存します。
+
+    同じシンボル・間隔の既存の行は、同じトランザクション内で最新の結果に置き換えます。
+
+    Args:
+        levels (list): フィルタリングされた価格レベルのリスト
+        symbol (str): シンボル名
+        interval (str): データの間隔（'daily' または 'weekly'）
+        db_path (str): データベースのパス
+    """
+    try:
+        rows = [(symbol, interval, float(level)) for level in levels]
+        with data_access.connection(db_path) as conn:
+            conn.execute("DELETE FROM filtered_price_levels WHERE symbol = ? AND interval = ?",
+                         (symbol, interval))
+            result = bulk_write(db_path, 'filtered_price_levels', ['symbol', 'interval', 'level'],
+                                rows, conn=conn)
+        print(f"{symbol} {interval}: フィルタリングされた価格レベルを保存しました（{result.rows}行）")
+    except Exception as e:
+        print(f"SQLiteへの保存中にエラーが発生しました: {e}")
+
+def load_price_levels(symbol, interval, db_path='data/eurusd_trading.db'):
+    """
+    SQLiteデータベースから価格レベルを読み込みます。
+
+    Args:
+        symbol (str): シンボル名
+        interval (str): データの間隔（'daily' または 'weekly'）
+        db_path (str): データベースのパス
+
+    Returns:
+        list: 読み込まれた価格レベルのリスト
+    """
+    try:
+        df = data_access.load_price_levels(symbol, interval, db_path=db_path)
+        return df['level'].tolist()
+    except Exception as e:
+        print(f"データベースからの読み込み中にエラーが発生しました: {e}")
+        return []
+
+def main(symbols=None, top_n=None):
+    INTERVAL = '1h'  # 例として1時間足を使用
+    db_path = DEFAULT_DB_PATH
+    
+    for symbol in get_symbols(symbols or [DEFAULT_SYMBOL]):
+        # 価格データの読み込み
+        df = load_price_data(symbol, INTERVAL, db_path)
+        if df.empty:
+            print(f"{symbol}: 価格データが存在しません")
+            continue
+        
+        # RSIの計算
+        df['RSI'] = calculate_rsi(df, window=14)
+        
+        # 最新の価格
+        current_price = df['close'].iloc[-1]
+        
+        # ピボットポイントから抽出した価格レベルを間隔ごとにフィルタリングして保存
+        for level_interval in ['daily', 'weekly']:
+            levels = LevelIndex(load_price_levels(symbol, level_interval, db_path))
+            filtered_levels = filter_levels_with_rsi(df['RSI'], levels, current_price, rsi_threshold=50)
+            if top_n is not None:
+                # level_scoring.py で保存したスコアの高い順に top_n 本だけ残す
+                scores = load_level_scores(symbol, [level_interval], db_path)
+                filtered_levels = top_levels(filtered_levels, scores, top_n)
+            print(f"{symbol} {level_interval} フィルタリングされた価格レベル: {filtered_levels}")
+            save_filtered_levels(filtered_levels, symbol, level_interval, db_path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,390 @@
+# scripts/import_history.py
+
+import os
+import time
+import hashlib
+import logging
+import argparse
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import data_access
+from bulk_writer import bulk_write_frame
+from data_access import DEFAULT_DB_PATH, TIMESTAMP_FORMAT
+from setup_database import IMPORT_PROGRESS_TABLE, IMPORT_PROGRESS_DDL
+
+# ログディレクトリとファイル名を設定
+LOG_DIR = os.path.join(os.path.dirname(__file__), '..', 'logs')
+LOG_FILE = os.path.join(LOG_DIR, 'import_history.log')
+
+# 1チャンクあたりの行数（メモリ使用量はこの値に比例し、ファイルサイズには依存しない）
+DEFAULT_CHUNK_SIZE = 100000
+
+PRICE_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume', 'symbol', 'interval']
+
+# HSTファイルのヘッダ（148バイト）
+HST_HEADER_DTYPE = np.dtype([
+    ('version', '<i4'),
+    ('copyright', 'S64'),
+    ('symbol', 'S12'),
+    ('period', '<i4'),
+    ('digits', '<i4'),
+    ('timesign', '<i4'),
+    ('last_sync', '<i4'),
+    ('unused', '<i4', 13),
+])
+
+# HSTファイルのバーレコード（バージョンごと）
+HST_RECORD_DTYPES = {
+    400: np.dtype([
+        ('ctm', '<i4'),
+        ('open', '<f8'),
+        ('low', '<f8'),
+        ('high', '<f8'),
+        ('close', '<f8'),
+        ('volume', '<f8'),
+    ]),
+    401: np.dtype([
+        ('ctm', '<i8'),
+        ('open', '<f8'),
+        ('high', '<f8'),
+        ('low', '<f8'),
+        ('close', '<f8'),
+        ('volume', '<i8'),
+        ('spread', '<i4'),
+        ('real_volume', '<i8'),
+    ]),
+}
+
+# HSTヘッダの period（分）とこのリポジトリの間隔名の対応
+HST_PERIODS = {
+    1: '1m',
+    5: '5m',
+    15: '15m',
+    30: '30m',
+    60: '1h',
+    240: '4h',
+    1440: 'daily',
+    10080: 'weekly',
+    43200: 'monthly',
+}
+
+def setup_import_progress_table(db_path=DEFAULT_DB_PATH):
+    """
+    インポートの進捗を記録するテーブルを作成します。
+
+    Args:
+        db_path (str): データベースのパス
+    """
+    with data_access.connection(db_path) as conn, conn:
+        conn.execute(IMPORT_PROGRESS_DDL)
+
+def read_hst_header(path):
+    """
+    HSTファイルのヘッダを読み込みます。
+
+    Args:
+        path (str): HSTファイルのパス
+
+    Returns:
+        dict: version, symbol, period, digits を持つ辞書
+    """
+    header = np.fromfile(path, dtype=HST_HEADER_DTYPE, count=1)
+    if len(header) == 0:
+        raise ValueError(f"HSTファイルのヘッダを読み込めません: {path}")
+    header = header[0]
+    version = int(header['version'])
+    if version not in HST_RECORD_DTYPES:
+        raise ValueError(f"未対応のHSTバージョンです: {version}")
+    return {
+        'version': version,
+        'symbol': header['symbol'].split(b'\0', 1)[0].decode('ascii', 'ignore'),
+        'period': int(header['period']),
+        'digits': int(header['digits']),
+    }
+
+def iter_hst_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE, skip_rows=0):
+    """
+    HSTファイルのバーをチャンク単位で読み込むジェネレータ。
+
+    レコードは構造化dtypeで直接読み込み、ファイル全体はメモリに載せません。
+
+    Args:
+        path (str): HSTファイルのパス
+        chunk_size (int): 1チャンクあたりのバー数
+        skip_rows (int): 先頭から読み飛ばすバー数（再開時）
+
+    Yields:
+        pd.DataFrame: timestamp, open, high, low, close, volume 列を持つデータフレーム
+    """
+    record_dtype = HST_RECORD_DTYPES[read_hst_header(path)['version']]
+    with open(path, 'rb') as f:
+        f.seek(HST_HEADER_DTYPE.itemsize + skip_rows * record_dtype.itemsize)
+        while True:
+            records = np.fromfile(f, dtype=record_dtype, count=chunk_size)
+            if len(records) == 0:
+                return
+            yield pd.DataFrame({
+                'timestamp': pd.to_datetime(records['ctm'].astype('int64'), unit='s'),
+                'open': records['open'],
+                'high': records['high'],
+                'low': records['low'],
+                'close': records['close'],
+                'volume': records['volume'].astype('float64'),
+            })
+
+def _csv_layout(path):
+    # 先頭行から区切り文字とヘッダの有無を判定する
+    with open(path, 'r', encoding='utf-8-sig', errors='ignore') as f:
+        first = f.readline()
+    sep = '\t' if '\t' in first else (';' if ';' in first else ',')
+    has_header = any(c.isalpha() for c in first.replace('.', '').replace(':', '').replace('-', ''))
+    return sep, has_header
+
+def _normalize_csv_chunk(chunk):
+    # MT5のエクスポート（<DATE> <TIME> ... <TICKVOL> <VOL>）と timestamp 列の形式をそろえる
+    chunk = chunk.rename(columns=lambda c: str(c).strip().strip('<>').lower())
+    if 'timestamp' in chunk.columns:
+        stamps = chunk['timestamp'].astype(str)
+    else:
+        stamps = chunk['date'].astype(str)
+        if 'time' in chunk.columns:
+            stamps = stamps + ' ' + chunk['time'].astype(str)
+    timestamp = pd.to_datetime(stamps.str.replace('.', '-', regex=False), format='ISO8601', errors='coerce')
+
+    if 'tickvol' in chunk.columns:
+        volume = chunk['tickvol']
+    elif 'volume' in chunk.columns:
+        volume = chunk['volume']
+    else:
+        volume = chunk.get('vol', 0)
+
+    return pd.DataFrame({
+        'timestamp': timestamp,
+        'open': pd.to_numeric(chunk['open'], errors='coerce'),
+        'high': pd.to_numeric(chunk['high'], errors='coerce'),
+        'low': pd.to_numeric(chunk['low'], errors='coerce'),
+        'close': pd.to_numeric(chunk['close'], errors='coerce'),
+        'volume': pd.to_numeric(volume, errors='coerce').astype('float64'),
+    })
+
+def iter_csv_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE, skip_rows=0):
+    """
+    CSVファイルのバーをチャンク単位で読み込むジェネレータ。
+
+    MT5の「バーのエクスポート」形式（タブ区切り、<DATE> <TIME> ヘッダ）、
+    timestamp 列を持つCSV、ヘッダなしの date,time,open,high,low,close,volume 形式に対応します。
+
+    Args:
+        path (str): CSVファイルのパス
+        chunk_size (int): 1チャンクあたりの行数
+        skip_rows (int): 先頭から読み飛ばすデータ行数（再開時）
+
+    Yields:
+        pd.DataFrame: timestamp, open, high, low, close, volume 列を持つデータフレーム
+    """
+    sep, has_header = _csv_layout(path)
+    header_rows = 1 if has_header else 0
+    options = {'sep': sep, 'chunksize': chunk_size, 'dtype': str}
+    if not has_header:
+        options.update(header=None, names=['date', 'time', 'open', 'high', 'low', 'close', 'volume'],
+                       usecols=range(7))
+    if skip_rows:
+        options['skiprows'] = range(header_rows, header_rows + skip_rows)
+
+    with pd.read_csv(path, **options) as reader:
+        for chunk in reader:
+            yield _normalize_csv_chunk(chunk)
+
+def validate_bars(df):
+    """
+    価格データのチャンクを検証し、不正な行とチャンク内の重複を除外します。
+
+    Args:
+        df (pd.DataFrame): timestamp, open, high, low, close, volume 列を持つデータフレーム
+
+    Returns:
+        tuple: (検証済みのデータフレーム, 除外した不正な行数)
+    """
+    prices = df[['open', 'high', 'low', 'close']]
+    valid = (
+        df['timestamp'].notna()
+        & prices.notna().all(axis=1)
+        & (prices > 0).all(axis=1)
+        & (df['high'] >= prices.max(axis=1))
+        & (df['low'] <= prices.min(axis=1))
+    )
+    invalid = int((~valid).sum())
+    df = df[valid]
+    # チャンク内で同じ時刻のバーが重複する場合は後のものを採用する
+    df = df[~df['timestamp'].duplicated(keep='last')]
+    return df, invalid
+
+def _existing_timestamps(conn, symbol, interval, first, last):
+    # チャンクの時刻範囲にある保存済みのバーを主キーの範囲検索で取得する
+    storage = data_access.timestamp_storage(conn, 'price_data')
+    if storage == 'epoch_ms':
+        bounds = [int(v) for v in data_access.to_epoch_ms([first, last])]
+    else:
+        bounds = [first.strftime(TIMESTAMP_FORMAT), last.strftime(TIMESTAMP_FORMAT)]
+    rows = conn.execute(
+        "SELECT timestamp FROM price_data "
+        "WHERE symbol = ? AND interval = ? AND timestamp >= ? AND timestamp <= ?",
+        [symbol, interval] + bounds
+    ).fetchall()
+    return data_access.parse_timestamps([row[0] for row in rows])
+
+def _head_hash(path, size=65536):
+    # ファイルが差し替えられていないかを先頭部分のハッシュで判定する
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read(size)).hexdigest()
+
+def get_progress(db_path, path, symbol, interval):
+    """
+    ファイルのインポートの進捗を取得します。
+
+    Args:
+        db_path (str): データベースのパス
+        path (str): インポートするファイルのパス
+        symbol (str): シンボル名
+        interval (str): データの間隔
+
+    Returns:
+        dict: file_size, head_hash, rows_read, rows_inserted, completed を持つ辞書（未記録の場合は None）
+    """
+    setup_import_progress_table(db_path)
+    with data_access.connection(db_path) as conn:
+        row = conn.execute(
+            f"SELECT file_size, head_hash, rows_read, rows_inserted, completed "
+            f"FROM {IMPORT_PROGRESS_TABLE} WHERE path = ? AND symbol = ? AND interval = ?",
+            (os.path.abspath(path), symbol, interval)
+        ).fetchone()
+    if row is None:
+        return None
+    return dict(zip(['file_size', 'head_hash', 'rows_read', 'rows_inserted', 'completed'], row))
+
+def _save_progress(conn, path, symbol, interval, file_size, head_hash, rows_read, rows_inserted, completed):
+    conn.execute(f'''
+        INSERT INTO {IMPORT_PROGRESS_TABLE}
+        (path, symbol, interval, file_size, head_hash, rows_read, rows_inserted, completed, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (path, symbol, interval) DO UPDATE SET
+            file_size = excluded.file_size,
+            head_hash = excluded.head_hash,
+            rows_read = excluded.rows_read,
+            rows_inserted = excluded.rows_inserted,
+            completed = excluded.completed,
+            updated_at = excluded.updated_at
+    ''', (os.path.abspath(path), symbol, interval, file_size, head_hash, rows_read, rows_inserted,
+          int(completed), datetime.now().strftime(TIMESTAMP_FORMAT)))
+
+def import_history(path, symbol=None, interval=None, db_path=DEFAULT_DB_PATH,
+                   chunk_size=DEFAULT_CHUNK_SIZE, restart=False):
+    """
+    CSV/HSTのヒストリーファイルをチャンク単位で price_data に取り込みます。
+
+    各チャンクは検証・保存済みのバーとの重複除外の後、進捗の更新と同じトランザクションで書き込まれます。
+    中断した場合は、次回の実行時に最後にコミットしたチャンクの次から再開します。
+    前回の取り込み後にファイルへ追記されたバーも、続きから取り込みます。
+
+    Args:
+        path (str): インポートするファイルのパス（拡張子 .hst はHST形式、それ以外はCSV）
+        symbol (str): シンボル名（HSTの場合は省略時にヘッダの値を使用）
+        interval (str): データの間隔（HSTの場合は省略時にヘッダの period から決定）
+        db_path (str): データベースのパス
+        chunk_size (int): 1チャンクあたりの行数
+        restart (bool): True の場合は進捗を無視して先頭から取り込む
+
+    Returns:
+        dict: rows_read, inserted, duplicates, invalid, seconds を持つ辞書
+    """
+    is_hst = path.lower().endswith('.hst')
+    if is_hst:
+        header = read_hst_header(path)
+        symbol = symbol or header['symbol']
+        interval = interval or HST_PERIODS.get(header['period'], f"{header['period']}m")
+    if not symbol or not interval:
+        raise ValueError("CSVファイルのインポートには symbol と interval の指定が必要です")
+
+    file_size = os.path.getsize(path)
+    head_hash = _head_hash(path)
+    progress = get_progress(db_path, path, symbol, interval)
+
+    rows_read = rows_inserted = 0
+    if (progress is not None and not restart
+            and progress['head_hash'] == head_hash and progress['file_size'] <= file_size):
+        rows_read, rows_inserted = progress['rows_read'], progress['rows_inserted']
+        if progress['completed'] and progress['file_size'] == file_size:
+            print(f"{path}: 取り込み済みです（{rows_read}行）")
+            return {'rows_read': rows_read, 'inserted': 0, 'duplicates': 0, 'invalid': 0, 'seconds': 0.0}
+        if rows_read:
+            print(f"{path}: {rows_read}行目から再開します")
+
+    chunks = (iter_hst_chunks if is_hst else iter_csv_chunks)(path, chunk_size, skip_rows=rows_read)
+    stats = {'rows_read': 0, 'inserted': 0, 'duplicates': 0, 'invalid': 0}
+    start = time.perf_counter()
+
+    with data_access.connection(db_path) as conn:
+        for chunk in chunks:
+            bars, invalid = validate_bars(chunk)
+            duplicates = len(chunk) - invalid - len(bars)
+            if not bars.empty:
+                existing = _existing_timestamps(conn, symbol, interval,
+                                                bars['timestamp'].min(), bars['timestamp'].max())
+                new = ~bars['timestamp'].isin(existing)
+                duplicates += int((~new).sum())
+                bars = bars[new]
+
+            rows_read += len(chunk)
+            rows_inserted += len(bars)
+            # チャンクの書き込みと進捗の更新を1つのトランザクションでコミットする
+            with conn:
+                _save_progress(conn, path, symbol, interval, file_size, head_hash,
+                               rows_read, rows_inserted, False)
+                if not bars.empty:
+                    bulk_write_frame(db_path, 'price_data', bars.assign(symbol=symbol, interval=interval),
+                                     PRICE_COLUMNS, mode='ignore', conn=conn)
+
+            stats['rows_read'] += len(chunk)
+            stats['inserted'] += len(bars)
+            stats['duplicates'] += duplicates
+            stats['invalid'] += invalid
+            logging.info(f"{path}: {rows_read}行まで読み込みました（追加 {len(bars)}行, "
+                         f"重複 {duplicates}行, 不正 {invalid}行）")
+
+        with conn:
+            _save_progress(conn, path, symbol, interval, file_size, head_hash,
+                           rows_read, rows_inserted, True)
+
+    stats['seconds'] = time.perf_counter() - start
+    rate = stats['rows_read'] / stats['seconds'] if stats['seconds'] > 0 else float('inf')
+    print(f"{symbol} {interval}: {stats['rows_read']}行を読み込み、{stats['inserted']}行を追加しました"
+          f"（重複 {stats['duplicates']}行, 不正 {stats['invalid']}行, {rate:,.0f} rows/sec）")
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description='CSV/HSTのヒストリーファイルを price_data に取り込みます')
+    parser.add_argument('paths', nargs='+', help='インポートするファイル')
+    parser.add_argument('--symbol', help='シンボル名（HSTの場合は省略可）')
+    parser.add_argument('--interval', help='データの間隔（HSTの場合は省略可）')
+    parser.add_argument('--db-path', default=DEFAULT_DB_PATH)
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--restart', action='store_true', help='進捗を無視して先頭から取り込む')
+    args = parser.parse_args()
+
+    # setup_database からも読み込まれるため、ログの設定はコマンドとして実行した場合のみ行う
+    os.makedirs(LOG_DIR, exist_ok=True)
+    logging.basicConfig(
+        filename=LOG_FILE,
+        level=logging.INFO,
+        format='%(asctime)s %(levelname)s:%(message)s'
+    )
+
+    for path in args.paths:
+        import_history(path, args.symbol, args.interval, args.db_path,
+                       chunk_size=args.chunk_size, restart=args.restart)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+# scripts/indicators.py
+
+import json
+import math
+from collections import deque
+
+# 標準偏差が0の場合に使う値（SafeBollingerBands と同じ）
+MIN_STDDEV = 0.00001
+
+# 丸め誤差が蓄積しないよう、この回数ごとに窓内の合計を計算し直す
+RESUM_INTERVAL = 10000
+
+class SMA:
+    """
+    単純移動平均を1本ごとに O(1) で更新するインジケーター。
+
+    窓内の値の合計を保持し、追加された値と窓から外れた値の差分だけを反映します。
+    出力は backtest_engine.sma（pandas の rolling mean）と同じです。
+    """
+
+    def __init__(self, period):
+        self.period = period
+        self.window = deque(maxlen=period)
+        self.total = 0.0
+        self.updates = 0
+
+    def update(self, value):
+        """
+        新しい値を追加し、移動平均を返します（period 本に満たない間は NaN）。
+        """
+        if len(self.window) == self.period:
+            self.total -= self.window[0]
+        self.window.append(value)
+        self.total += value
+        self.updates += 1
+        if self.updates % RESUM_INTERVAL == 0:
+            self.total = math.fsum(self.window)
+        return self.value
+
+    @property
+    def value(self):
+        if len(self.window) < self.period:
+            return math.nan
+        return self.total / self.period
+
+    def get_state(self):
+        return {'period': self.period, 'window': list(self.window), 'total': self.total,
+                'updates': self.updates}
+
+    def set_state(self, state):
+        self.window = deque(state['window'], maxlen=self.period)
+        self.total = state['total']
+        self.updates = state['updates']
+
+class RollingStd:
+    """
+    移動標準偏差を1本ごとに O(1) で更新するインジケーター。
+
+    Welford法の平均と偏差平方和を、窓に入る値と窓から外れる値の両方について更新します。
+    ddof=0 の場合は backtest_engine.stddev（母標準偏差）と同じです。
+    """
+
+    def __init__(self, period, ddof=0):
+        self.period = period
+        self.ddof = ddof
+        self.window = deque(maxlen=period)
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.updates = 0
+
+    def update(self, value):
+        """
+        新しい値を追加し、標準偏差を返します（period 本に満たない間は NaN）。
+        """
+        if len(self.window) == self.period:
+            old = self.window[0]
+            self.window.append(value)
+            delta = value - old
+            old_mean = self.mean
+            self.mean += delta / self.period
+            self.m2 += delta * (value - self.mean + old - old_mean)
+        else:
+            self.window.append(value)
+            delta = value - self.mean
+            self.mean += delta / len(self.window)
+            self.m2 += delta * (value - self.mean)
+        self.updates += 1
+        if self.updates % RESUM_INTERVAL == 0:
+            self._recompute()
+        return self.value
+
+    def _recompute(self):
+        values = list(self.window)
+        self.mean = math.fsum(values) / len(values)
+        self.m2 = math.fsum((v - self.mean) ** 2 for v in values)
+
+    @property
+    def value(self):
+        if len(self.window) < self.period:
+            return math.nan
+        # 丸め誤差で負になった場合は0とする
+        return math.sqrt(max(self.m2, 0.0) / (self.period - self.ddof))
+
+    def get_state(self):
+        return {'period': self.period, 'ddof': self.ddof, 'window': list(self.window),
+                'mean': self.mean, 'm2': self.m2, 'updates': self.updates}
+
+    def set_state(self, state):
+        self.window = deque(state['window'], maxlen=self.period)
+        self.mean = state['mean']
+        self.m2 = state['m2']
+        self.updates = state['updates']
+
+class BollingerBands:
+    """
+    ボリンジャーバンドを1本ごとに O(1) で更新するインジケーター。
+
+    SafeBollingerBands と同じく、標準偏差が0の場合は MIN_STDDEV を使います。
+    """
+
+    def __init__(self, period=20, devfactor=2.0):
+        self.period = period
+        self.devfactor = devfactor
+        self.sma = SMA(period)
+        self.std = RollingStd(period)
+
+    def update(self, value):
+        """
+        新しい終値を追加し、(mid, top, bot) を返します。
+        """
+        self.sma.update(value)
+        self.std.update(value)
+        return self.value
+
+    @property
+    def value(self):
+        mid, sd = self.sma.value, self.std.value
+        if sd == 0:
+            sd = MIN_STDDEV
+        return mid, mid + self.devfactor * sd, mid - self.devfactor * sd
+
+    def get_state(self):
+        return {'period': self.period, 'devfactor': self.devfactor,
+                'sma': self.sma.get_state(), 'std': self.std.get_state()}
+
+    def set_state(self, state):
+        self.sma.set_state(state['sma'])
+        self.std.set_state(state['std'])
+
+class ATR:
+    """
+    ATR（Wilderの平滑化）を1本ごとに O(1) で更新するインジケーター。
+
+    backtrader の AverageTrueRange と同じく、真の値幅は2本目から計算し、
+    最初の period 本の単純平均を初期値として平滑化します（出力は period+1 本目から）。
+    """
+
+    def __init__(self, period=14):
+        self.period = period
+        self.prev_close = None
+        self.seed = []
+        self.atr = math.nan
+
+    def update(self, high, low, close):
+        """
+        新しいバーを追加し、ATRを返します（値が揃うまでは NaN）。
+        """
+        if self.prev_close is not None:
+            tr = max(high, self.prev_close) - min(low, self.prev_close)
+            if len(self.seed) < self.period:
+                self.seed.append(tr)
+                if len(self.seed) == self.period:
+                    self.atr = math.fsum(self.seed) / self.period
+            else:
+                self.atr += (tr - self.atr) / self.period
+        self.prev_close = close
+        return self.atr
+
+    @property
+    def value(self):
+        return self.atr
+
+    def get_state(self):
+        return {'period': self.period, 'prev_close': self.prev_close,
+                'seed': list(self.seed), 'atr': self.atr}
+
+    def set_state(self, state):
+        self.prev_close = state['prev_close']
+        self.seed = list(state['seed'])
+        self.atr = state['atr']
+
+class RSI:
+    """
+    RSIを1本ごとに O(1) で更新するインジケーター。
+
+    ta の RSIIndicator（alpha=1/window, adjust=False の指数平滑）と同じ値を返します。
+    最初のバーは上昇幅・下落幅ともに0として平滑化を始め、window 本目から値を出力します。
+    """
+
+    def __init__(self, window=14):
+        self.window = window
+        self.alpha = 1 / window
+        self.prev_close = None
+        self.avg_gain = 0.0
+        self.avg_loss = 0.0
+        self.count = 0
+
+    def update(self, close):
+        """
+        新しい終値を追加し、RSIを返します（window 本に満たない間は NaN）。
+        """
+        if self.prev_close is None:
+            gain = loss = 0.0
+        else:
+            change = close - self.prev_close
+            gain, loss = max(change, 0.0), max(-change, 0.0)
+
+        if self.count == 0:
+            self.avg_gain, self.avg_loss = gain, loss
+        else:
+            self.avg_gain += self.alpha * (gain - self.avg_gain)
+            self.avg_loss += self.alpha * (loss - self.avg_loss)
+        self.prev_close = close
+        self.count += 1
+        return self.value
+
+    @property
+    def value(self):
+        if self.count < self.window:
+            return math.nan
+        if self.avg_loss == 0:
+            return 100.0
+        return 100 - 100 / (1 + self.avg_gain / self.avg_loss)
+
+    def get_state(self):
+        return {'window': self.window, 'prev_close': self.prev_close, 'avg_gain': self.avg_gain,
+                'avg_loss': self.avg_loss, 'count': self.count}
+
+    def set_state(self, state):
+        self.prev_close = state['prev_close']
+        self.avg_gain = state['avg_gain']
+        self.avg_loss = state['avg_loss']
+        self.count = state['count']
+
+INDICATORS = {
+    'sma': (SMA, ['period']),
+    'rolling_std': (RollingStd, ['period', 'ddof']),
+    'bollinger': (BollingerBands, ['period', 'devfactor']),
+    'atr': (ATR, ['period']),
+    'rsi': (RSI, ['window']),
+}
+
+_KINDS = {cls: kind for kind, (cls, _) in INDICATORS.items()}
+
+def dumps(indicator):
+    """
+    インジケーターの状態をJSON文字列に変換します。
+
+    Args:
+        indicator: SMA, RollingStd, BollingerBands, ATR, RSI のいずれか
+
+    Returns:
+        str: JSON文字列
+    """
+    return json.dumps({'kind': _KINDS[type(indicator)], 'state': indicator.get_state()})
+
+def loads(text):
+    """
+    dumps で保存した状態からインジケーターを復元します。
+
+    Args:
+        text (str): JSON文字列
+
+    Returns:
+        インジケーター（保存した時点の続きから update できる）
+    """
+    data = json.loads(text)
+    cls, arg_names = INDICATORS[data['kind']]
+    state = data['state']
+    indicator = cls(**{name: state[name] for name in arg_names})
+    indicator.set_state(state)
+    return indicator
@@ -0,0 +1,468 @@
+# scripts/instrumentation.py
+
+import os
+import re
+import sys
+import json
+import time
+import logging
+import threading
+import tracemalloc
+import cProfile
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+import data_access
+from bulk_writer import bulk_write_frame
+from data_access import TIMESTAMP_FORMAT
+from setup_database import METRICS_TABLE, METRICS_DDL, METRICS_INDEX_DDL
+
+try:
+    import resource
+except ImportError:  # Windows ではプロセスの最大RSSは記録しない
+    resource = None
+
+try:
+    from pyinstrument import Profiler as PyinstrumentProfiler
+except ImportError:  # profile='pyinstrument' を使用しない場合は不要
+    PyinstrumentProfiler = None
+
+# ログディレクトリとファイル名を設定
+LOG_DIR = os.path.join(os.path.dirname(__file__), '..', 'logs')
+JSON_LOG_FILE = os.path.join(LOG_DIR, 'metrics.jsonl')
+
+# プロファイルの出力先
+PROFILE_DIR = os.path.join(LOG_DIR, 'profiles')
+
+PROFILERS = ['cprofile', 'pyinstrument']
+
+# クエリの実行時間を測るため、SQLite の VM 命令をこの数だけ実行するごとに時刻を記録する
+PROGRESS_OPS = 1000
+
+# JSON ログに出力する時間のかかったクエリの数
+TOP_QUERIES = 5
+
+METRIC_COLUMNS = ['run_id', 'run_name', 'stage', 'symbol', 'interval', 'started_at', 'seconds',
+                  'cpu_seconds', 'rows', 'queries', 'query_seconds', 'peak_memory_mb', 'max_rss_mb',
+                  'profile_path', 'status']
+
+logger = logging.getLogger('instrumentation')
+
+# SQL の値（文字列・数値）を ? に置き換えてクエリの種類ごとに集計する
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?(?:e[+-]?\d+)?\b", re.IGNORECASE)
+
+def _normalize_sql(sql):
+    return _LITERALS.sub('?', ' '.join(sql.split()))[:200]
+
+def max_rss_mb():
+    """
+    プロセスの最大RSS（MB）を返します（取得できない環境では None）。
+    """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux は KB、macOS はバイト単位
+    return rss / 1e6 if sys.platform == 'darwin' else rss / 1e3
+
+class QueryTracer:
+    """
+    SQLite 接続で実行された文の数と実行時間を集計します。
+
+    set_trace_callback で文の開始を、set_progress_handler で実行中の時刻を記録し、
+    開始から最後に VM 命令を実行した時刻までをその文の実行時間とします
+    （PROGRESS_OPS 命令に満たない短い文は0秒として数えます）。
+    executemany はパラメータの行ごとにトレースが呼ばれるため、同じ接続で VALUES より前が同じ
+    INSERT が続く間は1つの文として数えます（SELECT などの繰り返しは1回ずつ数えます）。
+    """
+
+    def __init__(self, progress_ops=PROGRESS_OPS):
+        self.progress_ops = progress_ops
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = {}
+        self._active = {}
+        self._lock = threading.Lock()
+
+    def attach(self, conn):
+        """
+        接続に計測用のコールバックを設定します。
+
+        Args:
+            conn (sqlite3.Connection): SQLite接続
+        """
+        key = id(conn)
+
+        def on_statement(sql):
+            now = time.perf_counter()
+            state = self._active.get(key)
+            # executemany の続きの行（VALUES より前が同じ INSERT）は同じ文として計測を続ける
+            head, values, _ = sql.partition(' VALUES')
+            if state is not None and values and state[3] == head:
+                state[2] = now
+                return
+            with self._lock:
+                self._finish(key)
+                self._active[key] = [_normalize_sql(sql), now, now, head if values else None]
+
+        def on_progress():
+            state = self._active.get(key)
+            if state is not None:
+                state[2] = time.perf_counter()
+            return 0
+
+        conn.set_trace_callback(on_statement)
+        conn.set_progress_handler(on_progress, self.progress_ops)
+
+    def detach(self, conn):
+        """
+        接続のコールバックを解除し、実行中の文の計測を終えます。
+
+        Args:
+            conn (sqlite3.Connection): SQLite接続
+        """
+        conn.set_trace_callback(None)
+        conn.set_progress_handler(None, 0)
+        with self._lock:
+            self._finish(id(conn))
+
+    def flush(self):
+        """
+        すべての接続で計測中の文を終えます（ステージの終了時に呼びます）。
+        """
+        with self._lock:
+            for key in list(self._active):
+                self._finish(key)
+
+    def _finish(self, key):
+        state = self._active.pop(key, None)
+        if state is None:
+            return
+        sql, start, last, _ = state
+        elapsed = last - start
+        self.count += 1
+        self.seconds += elapsed
+        entry = self.statements.setdefault(sql, [0, 0.0])
+        entry[0] += 1
+        entry[1] += elapsed
+
+    def snapshot(self):
+        """
+        現在の累計（文の数, 秒, 文ごとの累計のコピー）を返します。
+        """
+        with self._lock:
+            return self.count, self.seconds, {sql: tuple(v) for sql, v in self.statements.items()}
+
+class StageMetrics:
+    """
+    1つのステージの計測結果。
+    """
+
+    def __init__(self, name, symbol=None, interval=None):
+        self.name = name
+        self.symbol = symbol
+        self.interval = interval
+        self.started_at = datetime.now()
+        self.seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.rows = 0
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.top_queries = []
+        self.peak_memory_mb = None
+        self.max_rss_mb = None
+        self.profile_path = None
+        self.status = 'ok'
+        self._child_peak = 0
+
+    def add_rows(self, n):
+        """
+        ステージで処理した行数を加算します。
+
+        Args:
+            n (int): 行数
+        """
+        self.rows += int(n)
+
+    def as_dict(self):
+        return {
+            'stage': self.name,
+            'symbol': self.symbol,
+            'interval': self.interval,
+            'started_at': self.started_at.strftime(TIMESTAMP_FORMAT),
+            'seconds': self.seconds,
+            'cpu_seconds': self.cpu_seconds,
+            'rows': self.rows,
+            'queries': self.queries,
+            'query_seconds': self.query_seconds,
+            'peak_memory_mb': self.peak_memory_mb,
+            'max_rss_mb': self.max_rss_mb,
+            'profile_path': self.profile_path,
+            'status': self.status,
+            'top_queries': self.top_queries,
+        }
+
+class JsonFormatter(logging.Formatter):
+    """
+    ログを1行1レコードの JSON で出力するフォーマッタ（extra の metrics の項目を展開します）。
+    """
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created).strftime(TIMESTAMP_FORMAT),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update(getattr(record, 'metrics', {}))
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+def configure_json_logging(path=JSON_LOG_FILE):
+    """
+    instrumentation のロガーに JSON Lines 形式のファイル出力を追加します（同じパスは1回だけ）。
+
+    Args:
+        path (str): 出力先のファイル
+    """
+    path = os.path.abspath(path)
+    for handler in logger.handlers:
+        if isinstance(handler, logging.FileHandler) and handler.baseFilename == path:
+            return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    handler = logging.FileHandler(path, encoding='utf-8')
+    handler.setFormatter(JsonFormatter())
+    logger.addHandler(handler)
+    if logger.level == logging.NOTSET or logger.level > logging.INFO:
+        logger.setLevel(logging.INFO)
+
+_current = None
+
+class Instrumentation:
+    """
+    1回の実行（夜間バッチなど）のステージごとの時間・行数・クエリ・メモリを計測します。
+
+    with ブロックの中では、data_access の接続の貸し出しごとにクエリの計測を設定し、
+    モジュール関数 stage() からこのインスタンスを使います。
+    各ステージの結果は JSON ログに出力し、save() で pipeline_metrics テーブルに保存します。
+    """
+
+    def __init__(self, run_name, memory=False, profile=None, profile_dir=PROFILE_DIR,
+                 trace_sql=False, json_log=JSON_LOG_FILE):
+        """
+        Args:
+            run_name (str): 実行の名前（'pipeline_runner' など）
+            memory (bool): tracemalloc でステージごとのピークメモリを計測するか（処理は遅くなります）
+            profile (str): ステージごとのプロファイル（'cprofile' または 'pyinstrument'、省略時はなし）
+            profile_dir (str): プロファイルの出力先
+            trace_sql (bool): SQLite のクエリ数と実行時間を計測するか
+                （文ごとにコールバックが呼ばれ、一括書き込みが大幅に遅くなるため既定では無効）
+            json_log (str): JSON ログの出力先（None の場合は出力しない）
+        """
+        if profile not in (None, *PROFILERS):
+            raise ValueError(f"未対応のプロファイラです: {profile}")
+        if profile == 'pyinstrument' and PyinstrumentProfiler is None:
+            raise ImportError("pyinstrument でのプロファイルには pyinstrument パッケージが必要です"
+                              "（pip install pyinstrument）")
+        self.run_name = run_name
+        self.run_id = f"{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}"
+        self.memory = memory
+        self.profile = profile
+        self.profile_dir = profile_dir
+        self.tracer = QueryTracer() if trace_sql else None
+        self.records = []
+        self._stack = []
+        self._profiling = False
+        self._started_tracing = False
+        self._previous = None
+        if json_log:
+            configure_json_logging(json_log)
+
+    def __enter__(self):
+        global _current
+        self._previous, _current = _current, self
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        if self.tracer is not None:
+            data_access.add_connection_hook(self.tracer.attach, self.tracer.detach)
+        return self
+
+    def __exit__(self, *exc):
+        global _current
+        if self.tracer is not None:
+            data_access.remove_connection_hook(self.tracer.attach, self.tracer.detach)
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        _current = self._previous
+        return False
+
+    @contextmanager
+    def stage(self, name, symbol=None, interval=None):
+        """
+        ブロックの実行をステージとして計測します。
+
+        Args:
+            name (str): ステージ名
+            symbol (str): シンボル名（省略可）
+            interval (str): 間隔（省略可）
+
+        Yields:
+            StageMetrics: add_rows で処理した行数を記録できる計測結果
+        """
+        metrics = StageMetrics(name, symbol, interval)
+        parent = self._stack[-1] if self._stack else None
+        self._stack.append(metrics)
+
+        if self.tracer is not None:
+            self.tracer.flush()
+            queries_before, seconds_before, statements_before = self.tracer.snapshot()
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+        profiler = self._start_profiler()
+        cpu_start, start = time.process_time(), time.perf_counter()
+        try:
+            yield metrics
+        except BaseException:
+            metrics.status = 'error'
+            raise
+        finally:
+            metrics.seconds = time.perf_counter() - start
+            metrics.cpu_seconds = time.process_time() - cpu_start
+            if profiler is not None:
+                metrics.profile_path = self._stop_profiler(profiler, metrics)
+            if self.tracer is not None:
+                self.tracer.flush()
+                queries, seconds, statements = self.tracer.snapshot()
+                metrics.queries = queries - queries_before
+                metrics.query_seconds = seconds - seconds_before
+                metrics.top_queries = _top_queries(statements, statements_before)
+            if tracing:
+                peak = max(tracemalloc.get_traced_memory()[1], metrics._child_peak)
+                metrics.peak_memory_mb = peak / 1e6
+                if parent is not None:
+                    parent._child_peak = max(parent._child_peak, peak)
+            metrics.max_rss_mb = max_rss_mb()
+            self._stack.pop()
+            self._record(metrics.as_dict())
+
+    def _start_profiler(self):
+        # cProfile は同時に1つしか動かせないため、入れ子のステージは外側のプロファイルに含める
+        if self.profile is None or self._profiling:
+            return None
+        self._profiling = True
+        profiler = cProfile.Profile() if self.profile == 'cprofile' else PyinstrumentProfiler()
+        if self.profile == 'cprofile':
+            profiler.enable()
+        else:
+            profiler.start()
+        return profiler
+
+    def _stop_profiler(self, profiler, metrics):
+        self._profiling = False
+        os.makedirs(self.profile_dir, exist_ok=True)
+        label = '_'.join(str(part) for part in (metrics.name, metrics.symbol, metrics.interval) if part)
+        base = os.path.join(self.profile_dir, f"{self.run_id}_{re.sub(r'[^A-Za-z0-9_.-]', '_', label)}")
+        if self.profile == 'cprofile':
+            profiler.disable()
+            profiler.dump_stats(f'{base}.prof')
+            return f'{base}.prof'
+        profiler.stop()
+        with open(f'{base}.html', 'w', encoding='utf-8') as f:
+            f.write(profiler.output_html())
+        return f'{base}.html'
+
+    def _record(self, record):
+        record = dict(record, run_id=self.run_id, run_name=self.run_name)
+        self.records.append(record)
+        label = ' '.join(str(part) for part in (record['symbol'], record['interval']) if part)
+        logger.info(f"{self.run_name}/{record['stage']} {label}: {record['seconds']:.3f}s "
+                    f"rows={record['rows']} queries={record['queries']}", extra={'metrics': record})
+
+    def extend(self, records):
+        """
+        ワーカープロセスで計測した結果をこの実行に追加し、JSON ログに出力します。
+
+        Args:
+            records (list): 別の Instrumentation の records
+        """
+        for record in records:
+            self._record(record)
+
+    def timings(self, symbol=None):
+        """
+        ステージ名ごとの合計秒数を返します。
+
+        Args:
+            symbol (str): 指定した場合はそのシンボルのステージのみ
+
+        Returns:
+            dict: {ステージ名: 秒}
+        """
+        timings = {}
+        for record in self.records:
+            if symbol is None or record['symbol'] == symbol:
+                timings[record['stage']] = timings.get(record['stage'], 0.0) + record['seconds']
+        return timings
+
+    def summary(self):
+        """
+        計測結果をデータフレームで返します。
+
+        Returns:
+            pd.DataFrame: METRIC_COLUMNS 列
+        """
+        return pd.DataFrame(self.records, columns=METRIC_COLUMNS)
+
+    def save(self, db_path=data_access.DEFAULT_DB_PATH):
+        """
+        計測結果を pipeline_metrics テーブルに保存します。
+
+        Args:
+            db_path (str): データベースのパス
+
+        Returns:
+            int: 保存した行数
+        """
+        if not self.records:
+            return 0
+        with data_access.connection(db_path) as conn:
+            conn.execute(METRICS_DDL)
+            return bulk_write_frame(db_path, METRICS_TABLE, self.summary(), METRIC_COLUMNS, conn=conn).rows
+
+def _top_queries(statements, before):
+    # ステージ内で実行時間の長かったクエリ（種類ごと）
+    deltas = []
+    for sql, (count, seconds) in statements.items():
+        count_before, seconds_before = before.get(sql, (0, 0.0))
+        if count > count_before:
+            deltas.append({'sql': sql, 'count': count - count_before, 'seconds': seconds - seconds_before})
+    return sorted(deltas, key=lambda d: d['seconds'], reverse=True)[:TOP_QUERIES]
+
+@contextmanager
+def stage(name, symbol=None, interval=None):
+    """
+    実行中の Instrumentation があればブロックをステージとして計測します（なければ何もしません）。
+
+    Args:
+        name (str): ステージ名
+        symbol (str): シンボル名（省略可）
+        interval (str): 間隔（省略可）
+
+    Yields:
+        StageMetrics: 計測結果
+    """
+    if _current is None:
+        # 計測中でない場合も呼び出し側が add_rows を使えるよう、記録しない計測結果を返す
+        yield StageMetrics(name, symbol, interval)
+        return
+    with _current.stage(name, symbol, interval) as metrics:
+        yield metrics
+
+def current():
+    """
+    実行中の Instrumentation を返します（なければ None）。
+    """
+    return _current
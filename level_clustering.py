@@ -0,0 +1,260 @@
+# scripts/level_clustering.py
+
+import numpy as np
+from scipy.ndimage import gaussian_filter1d
+from scipy.signal import find_peaks
+
+# 動的計画法に渡す点数の上限（これを超える入力は等幅のビンの重心にまとめる）
+MAX_DP_POINTS = 2048
+
+# クラスタ数を自動で選ぶ場合の上限
+K_MAX = 10
+
+# クラスタを1つ増やしたときの誤差の減少が、1クラスタの誤差のこの割合未満なら増やさない
+AUTO_K_MIN_GAIN = 0.02
+
+# KDEのグリッドの点数
+KDE_GRID_SIZE = 2048
+
+# KDEのピークとみなす最小のプロミネンス（最大密度に対する割合）
+KDE_MIN_PROMINENCE = 0.01
+
+def _finite(values):
+    values = np.asarray(values, dtype='float64').ravel()
+    return values[np.isfinite(values)]
+
+def weighted_points(values, max_points=MAX_DP_POINTS):
+    """
+    値を重み付きの点にまとめます。
+
+    点数が max_points 以下なら重複する値をまとめるだけ（厳密）、
+    それを超える場合は等幅のビンに振り分け、各ビンの重心と個数を返します（ソート不要の O(n)）。
+
+    Args:
+        values (array-like): 1次元の値
+        max_points (int): 点数の上限
+
+    Returns:
+        tuple: (昇順の点の位置, 重み)
+    """
+    values = _finite(values)
+    if len(values) <= max_points:
+        points, counts = np.unique(values, return_counts=True)
+        return points, counts.astype('float64')
+
+    low, high = values.min(), values.max()
+    if low == high:
+        return np.array([low]), np.array([float(len(values))])
+    index = ((values - low) * (max_points / (high - low))).astype('int64')
+    np.minimum(index, max_points - 1, out=index)
+    counts = np.bincount(index, minlength=max_points).astype('float64')
+    sums = np.bincount(index, weights=values, minlength=max_points)
+    keep = counts > 0
+    return sums[keep] / counts[keep], counts[keep]
+
+def _dp_tables(points, weights, k_max):
+    # points[i:j] を1つのクラスタにしたときの二乗誤差を前計算し、クラスタ数ごとに最適な分割を求める
+    m = len(points)
+    shift = np.average(points, weights=weights)
+    x = points - shift
+    W = np.concatenate(([0.0], np.cumsum(weights)))
+    S = np.concatenate(([0.0], np.cumsum(weights * x)))
+    Q = np.concatenate(([0.0], np.cumsum(weights * x * x)))
+
+    i = np.arange(m + 1)[:, None]
+    j = np.arange(m + 1)[None, :]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cost = (Q[j] - Q[i]) - (S[j] - S[i]) ** 2 / (W[j] - W[i])
+    cost[i >= j] = np.inf
+    np.maximum(cost, 0.0, out=cost)
+
+    D = np.full((k_max + 1, m + 1), np.inf)
+    D[0, 0] = 0.0
+    B = np.zeros((k_max + 1, m + 1), dtype='int64')
+    for k in range(1, k_max + 1):
+        total = D[k - 1][:, None] + cost
+        B[k] = np.argmin(total, axis=0)
+        D[k] = total[B[k], np.arange(m + 1)]
+    return D, B, W, S, shift
+
+def _backtrack(k, B, W, S, shift, m):
+    centers = []
+    j = m
+    for kk in range(k, 0, -1):
+        i = B[kk, j]
+        centers.append((S[j] - S[i]) / (W[j] - W[i]) + shift)
+        j = i
+    return np.array(sorted(centers))
+
+def choose_k(sse, min_gain=AUTO_K_MIN_GAIN):
+    """
+    クラスタ数ごとの二乗誤差からクラスタ数を選びます（エルボー法）。
+
+    Args:
+        sse (array-like): k=1, 2, ... の二乗誤差
+        min_gain (float): 1つ増やしたときの誤差の減少の下限（k=1 の誤差に対する割合）
+
+    Returns:
+        int: クラスタ数
+    """
+    sse = np.asarray(sse, dtype='float64')
+    if len(sse) == 0 or sse[0] <= 0:
+        return 1
+    gains = -np.diff(sse) / sse[0]
+    for k, gain in enumerate(gains, start=1):
+        if gain < min_gain:
+            return k
+    return len(sse)
+
+def kmeans_1d_dp(values, k=None, init=None, k_max=K_MAX, max_points=MAX_DP_POINTS):
+    """
+    ソート済みの1次元データに対する動的計画法で、二乗誤差が最小となる k-means を求めます。
+
+    結果は初期値に依存せず決定的です。入力が max_points を超える場合はビンの重心で近似します。
+
+    Args:
+        values (array-like): 1次元の値
+        k (int): クラスタ数（省略時は init の個数、それもなければ自動で選択）
+        init (array-like): 前回のクラスタ中心（k を決めるためにのみ使用）
+        k_max (int): 自動で選ぶ場合のクラスタ数の上限
+        max_points (int): 動的計画法に渡す点数の上限
+
+    Returns:
+        np.ndarray: 昇順のクラスタ中心
+    """
+    points, weights = weighted_points(values, max_points)
+    if len(points) == 0:
+        return np.array([])
+    if k is None and init is not None and len(init):
+        k = len(init)
+    limit = min(k if k is not None else k_max, len(points))
+    D, B, W, S, shift = _dp_tables(points, weights, limit)
+    if k is None:
+        k = choose_k(D[1:, len(points)])
+    return _backtrack(min(k, limit), B, W, S, shift, len(points))
+
+def kde_peaks(values, k=None, init=None, bandwidth=None, grid_size=KDE_GRID_SIZE,
+              min_prominence=KDE_MIN_PROMINENCE):
+    """
+    ヒストグラムをガウス平滑化した密度（KDE）のピークを価格レベルとします。
+
+    Args:
+        values (array-like): 1次元の値
+        k (int): 返すピークの数（プロミネンスの大きい順、省略時はすべて）
+        init: 使用しません（他の方式と引数をそろえるため）
+        bandwidth (float): バンド幅（省略時は Silverman の規則）
+        grid_size (int): ヒストグラムのビン数
+        min_prominence (float): ピークとみなす最小のプロミネンス（最大密度に対する割合）
+
+    Returns:
+        np.ndarray: 昇順のピーク位置
+    """
+    values = _finite(values)
+    if len(values) == 0:
+        return np.array([])
+    low, high = values.min(), values.max()
+    if low == high:
+        return np.array([low])
+
+    counts, edges = np.histogram(values, bins=grid_size, range=(low, high))
+    centers = (edges[:-1] + edges[1:]) / 2
+    if bandwidth is None:
+        bandwidth = 1.06 * values.std() * len(values) ** -0.2
+    density = gaussian_filter1d(counts.astype('float64'), bandwidth / (edges[1] - edges[0]),
+                                mode='constant')
+
+    peaks, props = find_peaks(np.concatenate(([0.0], density, [0.0])),
+                              prominence=density.max() * min_prominence)
+    peaks -= 1
+    order = np.argsort(-props['prominences'])
+    if k is not None:
+        order = order[:k]
+    return np.sort(centers[peaks[order]])
+
+def _assign(values, centers):
+    # 1次元なので、隣り合う中心の中点で二分探索すれば最も近い中心が求まる
+    return np.searchsorted((centers[:-1] + centers[1:]) / 2, values)
+
+def minibatch_kmeans(values, k=None, init=None, batch_size=100000, max_iter=30, tol=1e-7, seed=0):
+    """
+    1次元のミニバッチ k-means で大量の値をクラスタリングします。
+
+    各反復で batch_size 個の値を無作為に取り出し、中点の二分探索で割り当てたうえで、
+    これまでに割り当てた個数に応じた学習率で中心を更新します。
+    前回のクラスタ中心（init）の個数が k と一致する場合は、それを初期値とします（ウォームスタート）。
+
+    Args:
+        values (array-like): 1次元の値
+        k (int): クラスタ数（省略時は init の個数、それもなければビンの重心に対する動的計画法で選択）
+        init (array-like): 前回のクラスタ中心
+        batch_size (int): ミニバッチの大きさ
+        max_iter (int): 最大反復回数
+        tol (float): 中心の移動量がこれ未満になったら終了
+        seed (int): 乱数シード
+
+    Returns:
+        np.ndarray: 昇順のクラスタ中心
+    """
+    values = _finite(values)
+    if len(values) == 0:
+        return np.array([])
+    if k is None:
+        k = len(init) if init is not None and len(init) else len(kmeans_1d_dp(values))
+    rng = np.random.default_rng(seed)
+    if init is not None and len(init) == k:
+        centers = np.sort(np.asarray(init, dtype='float64'))
+    else:
+        # 無作為に取り出した値の分位点を初期値とする
+        sample = rng.choice(values, min(len(values), batch_size))
+        centers = np.quantile(sample, (np.arange(k) + 0.5) / k)
+
+    totals = np.zeros(k)
+    for _ in range(max_iter):
+        batch = values[rng.integers(0, len(values), min(len(values), batch_size))]
+        labels = _assign(batch, centers)
+        counts = np.bincount(labels, minlength=k)
+        sums = np.bincount(labels, weights=batch, minlength=k)
+        totals += counts
+        hit = counts > 0
+        shift = (sums[hit] - counts[hit] * centers[hit]) / totals[hit]
+        centers[hit] += shift
+        centers.sort()
+        if len(shift) == 0 or np.abs(shift).max() < tol:
+            break
+    return centers
+
+CLUSTER_METHODS = {
+    'dp': kmeans_1d_dp,
+    'kde': kde_peaks,
+    'minibatch': minibatch_kmeans,
+}
+
+def cluster_levels(values, k=None, method='dp', init=None, **kwargs):
+    """
+    1次元の値をクラスタリングし、価格レベル（クラスタ中心）を返します。
+
+    Args:
+        values (array-like): 1次元の値（ピボットのサポート・レジスタンス、高値・安値など）
+        k (int): クラスタ数（省略時は自動で選択）
+        method (str): 'dp'（動的計画法）、'kde'（密度のピーク）、'minibatch'（大規模データ向け）
+        init (array-like): 前回のクラスタ中心（ウォームスタート）
+        **kwargs: 各方式の追加の引数
+
+    Returns:
+        np.ndarray: 昇順の価格レベル
+    """
+    if method not in CLUSTER_METHODS:
+        raise ValueError(f"未対応のクラスタリング方式です: {method}")
+    return CLUSTER_METHODS[method](values, k=k, init=init, **kwargs)
+
+def inertia(values, centers):
+    """
+    各値と最も近いクラスタ中心との二乗誤差の合計を返します（方式間の比較用）。
+    """
+    values = _finite(values)
+    centers = np.sort(np.asarray(centers, dtype='float64'))
+    if len(centers) == 1:
+        return float(((values - centers[0]) ** 2).sum())
+    index = np.clip(np.searchsorted(centers, values), 1, len(centers) - 1)
+    nearest = np.minimum((values - centers[index - 1]) ** 2, (values - centers[index]) ** 2)
+    return float(nearest.sum())
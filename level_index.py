@@ -0,0 +1,161 @@
+# scripts/level_index.py
+
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+
+from symbols import pip_size
+
+def merge_levels(levels, tolerance=0.0):
+    """
+    近接する価格レベルを1つにまとめます。
+
+    昇順に並べたうえで、隣との差が tolerance 以下の価格レベルを同じグループとし、
+    グループの平均を代表値とします。tolerance=0 の場合は重複を取り除くだけです。
+
+    Args:
+        levels (array-like): 価格レベル
+        tolerance (float): まとめる価格の差（価格の単位）
+
+    Returns:
+        np.ndarray: 昇順の価格レベル
+    """
+    levels = np.sort(np.asarray(levels, dtype='float64').ravel())
+    levels = levels[np.isfinite(levels)]
+    if len(levels) == 0:
+        return levels
+    starts = np.flatnonzero(np.concatenate(([True], np.diff(levels) > tolerance)))
+    if len(starts) == len(levels):
+        return levels
+    sizes = np.diff(np.append(starts, len(levels)))
+    return np.add.reduceat(levels, starts) / sizes
+
+class LevelIndex:
+    """
+    昇順に並べた価格レベルの索引。
+
+    価格の下のサポート・上のレジスタンスを二分探索で O(log n) で求めます。
+    バックテスト用に、価格の配列に対する一括の検索（numpy.searchsorted）も提供します。
+    """
+
+    def __init__(self, levels=(), tolerance=0.0):
+        """
+        Args:
+            levels (array-like): 価格レベル
+            tolerance (float): 近接する価格レベルをまとめる価格の差（価格の単位）
+        """
+        self.tolerance = tolerance
+        self.array = merge_levels(levels, tolerance)
+        self.levels = self.array.tolist()
+
+    @classmethod
+    def from_pips(cls, levels, symbol, pips):
+        """
+        まとめる距離を pips で指定して索引を作ります。
+
+        Args:
+            levels (array-like): 価格レベル
+            symbol (str): シンボル名（symbols.pip_size で1pipの値幅を求める）
+            pips (float): まとめる距離（pips）
+
+        Returns:
+            LevelIndex: 価格レベルの索引
+        """
+        return cls(levels, pips * pip_size(symbol))
+
+    def __len__(self):
+        return len(self.levels)
+
+    def __iter__(self):
+        return iter(self.levels)
+
+    def __contains__(self, price):
+        i = bisect_left(self.levels, price)
+        return i < len(self.levels) and self.levels[i] == price
+
+    def tolist(self):
+        return list(self.levels)
+
+    def merge(self, *others):
+        """
+        他の価格レベルと合わせた索引を返します（同じ tolerance でまとめ直します）。
+
+        Args:
+            *others: LevelIndex または価格レベルのリスト
+
+        Returns:
+            LevelIndex: 統合した索引
+        """
+        arrays = [self.array] + [np.asarray(other.array if isinstance(other, LevelIndex) else other,
+                                            dtype='float64') for other in others]
+        return LevelIndex(np.concatenate(arrays), self.tolerance)
+
+    def supports_below(self, price, n=None):
+        """
+        価格より下の価格レベルを返します。
+
+        Args:
+            price (float): 価格
+            n (int): 価格に近い順に返す数（省略時はすべて）
+
+        Returns:
+            list: 昇順の価格レベル
+        """
+        i = bisect_left(self.levels, price)
+        return self.levels[max(i - n, 0) if n is not None else 0:i]
+
+    def resistances_above(self, price, n=None):
+        """
+        価格より上の価格レベルを返します。
+
+        Args:
+            price (float): 価格
+            n (int): 価格に近い順に返す数（省略時はすべて）
+
+        Returns:
+            list: 昇順の価格レベル
+        """
+        i = bisect_right(self.levels, price)
+        return self.levels[i:i + n if n is not None else len(self.levels)]
+
+    def nearest(self, price):
+        """
+        価格に最も近い価格レベルを返します（索引が空の場合は None）。
+        """
+        i = bisect_left(self.levels, price)
+        candidates = self.levels[max(i - 1, 0):i + 1]
+        return min(candidates, key=lambda level: abs(level - price)) if candidates else None
+
+    def supports_below_many(self, prices, n=1):
+        """
+        価格の配列それぞれについて、下にある近い順の n 本の価格レベルを返します。
+
+        Args:
+            prices (array-like): 価格の配列
+            n (int): 価格ごとに返す数
+
+        Returns:
+            np.ndarray: (len(prices), n) の配列。列 j は j+1 番目に近いサポート（存在しない場合は NaN）
+        """
+        positions = np.searchsorted(self.array, np.asarray(prices, dtype='float64'), side='left')
+        return self._gather(positions[:, None] - 1 - np.arange(n))
+
+    def resistances_above_many(self, prices, n=1):
+        """
+        価格の配列それぞれについて、上にある近い順の n 本の価格レベルを返します。
+
+        Args:
+            prices (array-like): 価格の配列
+            n (int): 価格ごとに返す数
+
+        Returns:
+            np.ndarray: (len(prices), n) の配列。列 j は j+1 番目に近いレジスタンス（存在しない場合は NaN）
+        """
+        positions = np.searchsorted(self.array, np.asarray(prices, dtype='float64'), side='right')
+        return self._gather(positions[:, None] + np.arange(n))
+
+    def _gather(self, positions):
+        valid = (positions >= 0) & (positions < len(self.array))
+        result = np.full(positions.shape, np.nan)
+        result[valid] = self.array[positions[valid]]
+        return result
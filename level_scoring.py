@@ -0,0 +1,235 @@
+# scripts/level_scoring.py
+
+import os
+import logging
+import argparse
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import data_access
+from bulk_writer import bulk_write_frame
+from data_access import DEFAULT_DB_PATH, TIMESTAMP_FORMAT
+from extract_levels import load_previous_levels
+from symbols import get_symbols, pip_size, DEFAULT_SYMBOL
+from setup_database import LEVEL_SCORES_TABLE, LEVEL_SCORES_DDL
+
+# ログディレクトリとファイル名を設定
+LOG_DIR = os.path.join(os.path.dirname(__file__), '..', 'logs')
+LOG_FILE = os.path.join(LOG_DIR, 'level_scoring.log')
+
+# 高値・安値がこの距離（pips）以内に届いたバーも接触とみなす
+TOUCH_TOLERANCE_PIPS = 1.0
+
+SCORE_COLUMNS = ['level', 'touches', 'rejections', 'breaks', 'score']
+
+def _count_at_or_below(sorted_values, levels):
+    return np.searchsorted(sorted_values, levels, side='right')
+
+def _count_below(sorted_values, levels):
+    return np.searchsorted(sorted_values, levels, side='left')
+
+def count_hits(levels, bars, tolerance=0.0):
+    """
+    価格レベルごとに、接触・反発・ブレイクしたバーの数を数えます。
+
+    バーごと・価格レベルごとの二重ループの代わりに、安値・高値・実体の上端・下端をそれぞれ昇順に並べ、
+    価格レベルの位置を二分探索（numpy.searchsorted）して区間に含まれるバーの数を求めます。
+
+    - 接触: 安値 - tolerance <= レベル <= 高値 + tolerance
+    - ブレイク: 実体（始値と終値の間）がレベルをまたいだ
+    - 反発: 接触したがブレイクしなかった
+
+    Args:
+        levels (array-like): 価格レベル
+        bars (pd.DataFrame): open, high, low, close 列を持つ価格データ
+        tolerance (float): 接触とみなす距離（価格の単位）
+
+    Returns:
+        pd.DataFrame: level, touches, rejections, breaks, score 列（score = 反発 - ブレイク）
+    """
+    levels = np.asarray(levels, dtype='float64')
+    lows = np.sort(bars['low'].to_numpy(dtype='float64') - tolerance)
+    highs = np.sort(bars['high'].to_numpy(dtype='float64') + tolerance)
+    open_ = bars['open'].to_numpy(dtype='float64')
+    close = bars['close'].to_numpy(dtype='float64')
+    body_lows = np.sort(np.minimum(open_, close))
+    body_highs = np.sort(np.maximum(open_, close))
+    # 始値と終値が等しいバー（実体の上端と下端が同じ価格）
+    dojis = np.sort(close[open_ == close])
+
+    # 安値がレベル以下のバーのうち、高値もレベル未満のバーを除いたものが接触したバー
+    touches = _count_at_or_below(lows, levels) - _count_below(highs, levels)
+    # 実体の下端がレベル未満のバーのうち、上端もレベル以下のバーを除いたものがブレイクしたバー。
+    # 実体がちょうどレベル上にある同値のバーは前者に含まれず後者で引かれるため、その数を足し戻す
+    breaks = (_count_below(body_lows, levels) - _count_at_or_below(body_highs, levels)
+              + _count_at_or_below(dojis, levels) - _count_below(dojis, levels))
+    rejections = touches - breaks
+    return pd.DataFrame({
+        'level': levels,
+        'touches': touches,
+        'rejections': rejections,
+        'breaks': breaks,
+        'score': (rejections - breaks).astype('float64'),
+    }, columns=SCORE_COLUMNS)
+
+def level_strength(levels, scores, tolerance=0.0):
+    """
+    価格レベルごとに、最も近いスコア済みの価格レベルのスコアを返します。
+
+    Args:
+        levels (array-like): 価格レベル
+        scores (pd.DataFrame): count_hits または load_level_scores の戻り値
+        tolerance (float): この距離を超えるスコア済みの価格レベルしかない場合は NaN
+
+    Returns:
+        np.ndarray: スコア
+    """
+    levels = np.asarray(levels, dtype='float64')
+    if scores is None or scores.empty or len(levels) == 0:
+        return np.full(len(levels), np.nan)
+    scores = scores.sort_values('level')
+    scored = scores['level'].to_numpy(dtype='float64')
+    values = scores['score'].to_numpy(dtype='float64')
+    right = np.clip(np.searchsorted(scored, levels), 0, len(scored) - 1)
+    left = np.clip(right - 1, 0, len(scored) - 1)
+    nearest = np.where(np.abs(scored[left] - levels) <= np.abs(scored[right] - levels), left, right)
+    result = values[nearest]
+    result[np.abs(scored[nearest] - levels) > tolerance] = np.nan
+    return result
+
+def top_levels(levels, scores, top_n, tolerance=0.0):
+    """
+    スコアの高い順に top_n 本の価格レベルを残します（スコアのない価格レベルは最後）。
+
+    Args:
+        levels (list): 価格レベル
+        scores (pd.DataFrame): count_hits または load_level_scores の戻り値
+        top_n (int): 残す数（None の場合はすべて）
+        tolerance (float): スコアを対応付ける距離（価格の単位）
+
+    Returns:
+        list: 残した価格レベル（昇順）
+    """
+    levels = list(levels)
+    if top_n is None or len(levels) <= top_n:
+        return levels
+    strength = np.nan_to_num(level_strength(levels, scores, tolerance), nan=-np.inf)
+    keep = np.argsort(-strength, kind='stable')[:top_n]
+    return sorted(levels[i] for i in keep)
+
+def setup_level_scores_table(db_path=DEFAULT_DB_PATH):
+    """
+    level_scores テーブルを作成します。
+
+    Args:
+        db_path (str): データベースのパス
+    """
+    with data_access.connection(db_path) as conn, conn:
+        conn.execute(LEVEL_SCORES_DDL)
+
+def save_level_scores(scores, symbol, interval, bars, db_path=DEFAULT_DB_PATH):
+    """
+    スコアを level_scores テーブルに保存します。
+
+    同じシンボル・間隔の既存の行は、同じトランザクション内で最新の結果に置き換えます。
+
+    Args:
+        scores (pd.DataFrame): count_hits の戻り値
+        symbol (str): シンボル名
+        interval (str): 価格レベルの間隔（'daily' または 'weekly'）
+        bars (int): スコアの計算に使ったバーの数
+        db_path (str): データベースのパス
+    """
+    df = scores.assign(symbol=symbol, interval=interval, bars=bars,
+                       updated_at=datetime.now().strftime(TIMESTAMP_FORMAT))
+    columns = ['symbol', 'interval'] + SCORE_COLUMNS + ['bars', 'updated_at']
+    with data_access.connection(db_path) as conn:
+        conn.execute(LEVEL_SCORES_DDL)
+        conn.execute(f"DELETE FROM {LEVEL_SCORES_TABLE} WHERE symbol = ? AND interval = ?",
+                     (symbol, interval))
+        bulk_write_frame(db_path, LEVEL_SCORES_TABLE, df, columns, conn=conn)
+
+def load_level_scores(symbol, intervals=('daily', 'weekly'), db_path=DEFAULT_DB_PATH):
+    """
+    保存済みのスコアを読み込みます。同じ価格レベルが複数の間隔にある場合は高い方のスコアを使います。
+
+    Args:
+        symbol (str): シンボル名
+        intervals (tuple): 読み込む間隔
+        db_path (str): データベースのパス
+
+    Returns:
+        pd.DataFrame: level, touches, rejections, breaks, score 列（存在しない場合は空）
+    """
+    placeholders = ', '.join('?' * len(intervals))
+    query = f"""
+    SELECT level, touches, rejections, breaks, score
+    FROM {LEVEL_SCORES_TABLE}
+    WHERE symbol = ? AND interval IN ({placeholders})
+    """
+    try:
+        df = data_access.read_frame(query, (symbol, *intervals), db_path)
+    except Exception as e:
+        logging.warning(f"スコアの読み込み中にエラーが発生しました: {e}")
+        return pd.DataFrame(columns=SCORE_COLUMNS)
+    return df.sort_values('score', ascending=False).drop_duplicates('level').reset_index(drop=True)
+
+def score_levels(symbol, interval, bars_interval=None, tolerance_pips=TOUCH_TOLERANCE_PIPS,
+                 db_path=DEFAULT_DB_PATH):
+    """
+    extract_levels が保存した価格レベルを、価格データの全期間に対してスコア付けして保存します。
+
+    Args:
+        symbol (str): シンボル名
+        interval (str): 価格レベルの間隔（'daily' または 'weekly'）
+        bars_interval (str): 接触を数える価格データの間隔（省略時は interval と同じ）
+        tolerance_pips (float): 接触とみなす距離（pips）
+        db_path (str): データベースのパス
+
+    Returns:
+        pd.DataFrame: スコア（価格レベルか価格データがない場合は空）
+    """
+    levels = load_previous_levels(symbol, interval, db_path)
+    bars = data_access.load_ohlc(symbol, bars_interval or interval, db_path=db_path)
+    if not levels or bars.empty:
+        return pd.DataFrame(columns=SCORE_COLUMNS)
+    scores = count_hits(levels, bars, tolerance_pips * pip_size(symbol))
+    save_level_scores(scores, symbol, interval, len(bars), db_path)
+    return scores
+
+def main():
+    os.makedirs(LOG_DIR, exist_ok=True)
+    logging.basicConfig(
+        filename=LOG_FILE,
+        level=logging.INFO,
+        format='%(asctime)s %(levelname)s:%(message)s'
+    )
+
+    parser = argparse.ArgumentParser(description='価格レベルの接触・反発・ブレイクの回数を数えてスコアを保存します')
+    parser.add_argument('--symbol', action='append', dest='symbols')
+    parser.add_argument('--interval', action='append', dest='intervals',
+                        help="価格レベルの間隔（省略時は 'daily' と 'weekly'）")
+    parser.add_argument('--bars-interval', default=None, help='接触を数える価格データの間隔')
+    parser.add_argument('--tolerance-pips', type=float, default=TOUCH_TOLERANCE_PIPS)
+    parser.add_argument('--db-path', default=DEFAULT_DB_PATH)
+    args = parser.parse_args()
+
+    for symbol in get_symbols(args.symbols or [DEFAULT_SYMBOL]):
+        for interval in args.intervals or ['daily', 'weekly']:
+            try:
+                scores = score_levels(symbol, interval, args.bars_interval, args.tolerance_pips, args.db_path)
+            except Exception as e:
+                logging.error(f"{symbol} {interval}: スコアの計算中にエラーが発生しました: {e}")
+                print(f"{symbol} {interval}: スコアの計算中にエラーが発生しました: {e}")
+                continue
+            if scores.empty:
+                print(f"{symbol} {interval}: 価格レベルまたは価格データが存在しません")
+                continue
+            logging.info(f"{symbol} {interval}: {len(scores)}本の価格レベルのスコアを保存しました")
+            print(f"{symbol} {interval}:")
+            print(scores.sort_values('score', ascending=False).to_string(index=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+# scripts/live_service.py
+
+import os
+import time
+import asyncio
+import logging
+import argparse
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+import data_access
+from data_access import DEFAULT_DB_PATH
+from indicators import RSI
+from calculate_pivot_points import PIVOT_METHODS
+from filter_levels_with_rsi import filter_levels_with_rsi
+from level_index import LevelIndex
+from import_history import iter_csv_chunks, validate_bars
+from symbols import DEFAULT_SYMBOL
+
+try:
+    import MetaTrader5 as mt5
+except ImportError:  # MT5フィードを使用しない場合は不要
+    mt5 = None
+
+# ログディレクトリとファイル名を設定
+LOG_DIR = os.path.join(os.path.dirname(__file__), '..', 'logs')
+LOG_FILE = os.path.join(LOG_DIR, 'live_service.log')
+
+Bar = namedtuple('Bar', ['symbol', 'interval', 'timestamp', 'open', 'high', 'low', 'close', 'volume'])
+
+# 購読者に通知する価格レベルの変化
+LevelChange = namedtuple('LevelChange', ['symbol', 'timestamp', 'close', 'rsi', 'levels', 'added', 'removed'])
+
+# 購読者ごとのキューの上限（溢れた場合は古い通知から破棄する）
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+# リプレイ時にイベントループへ制御を返す間隔（バー数）
+REPLAY_YIELD_EVERY = 1000
+
+class SQLiteReplayFeed:
+    """
+    price_data に保存されたバーを順に流すフィード（オフラインでの動作確認用）。
+    """
+
+    def __init__(self, symbol, interval, db_path=DEFAULT_DB_PATH, since=None, delay=0.0):
+        self.symbol = symbol
+        self.interval = interval
+        self.db_path = db_path
+        self.since = since
+        self.delay = delay
+
+    def _frames(self):
+        yield data_access.load_ohlc(self.symbol, self.interval, since=self.since,
+                                    db_path=self.db_path, use_cache=False).reset_index()
+
+    async def bars(self):
+        count = 0
+        for df in self._frames():
+            columns = [df[c].to_numpy() for c in ['timestamp', 'open', 'high', 'low', 'close', 'volume']]
+            for timestamp, open_, high, low, close, volume in zip(*columns):
+                yield Bar(self.symbol, self.interval, pd.Timestamp(timestamp),
+                          float(open_), float(high), float(low), float(close), float(volume))
+                count += 1
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+                elif count % REPLAY_YIELD_EVERY == 0:
+                    await asyncio.sleep(0)
+
+class CSVReplayFeed(SQLiteReplayFeed):
+    """
+    CSVのヒストリーファイル（import_history と同じ形式）のバーを順に流すフィード。
+    """
+
+    def __init__(self, path, symbol, interval, delay=0.0):
+        super().__init__(symbol, interval, delay=delay)
+        self.path = path
+
+    def _frames(self):
+        for chunk in iter_csv_chunks(self.path):
+            bars, _ = validate_bars(chunk)
+            yield bars.sort_values('timestamp')
+
+class MT5Feed:
+    """
+    MetaTrader5 ターミナルから確定したバーを取得するフィード。
+
+    ポーリングのたびに確定済みのバー（位置1以降）を取得し、前回より新しいものだけを流します。
+    """
+
+    TIMEFRAMES = {
+        '1m': 'TIMEFRAME_M1',
+        '5m': 'TIMEFRAME_M5',
+        '15m': 'TIMEFRAME_M15',
+        '30m': 'TIMEFRAME_M30',
+        '1h': 'TIMEFRAME_H1',
+        '4h': 'TIMEFRAME_H4',
+        'daily': 'TIMEFRAME_D1',
+        'weekly': 'TIMEFRAME_W1',
+    }
+
+    def __init__(self, symbol, interval, poll_seconds=1.0, lookback=100):
+        if mt5 is None:
+            raise ImportError("MT5フィードには MetaTrader5 パッケージが必要です（pip install MetaTrader5）")
+        self.symbol = symbol
+        self.interval = interval
+        self.poll_seconds = poll_seconds
+        self.lookback = lookback
+
+    async def bars(self):
+        if not mt5.initialize():
+            raise RuntimeError(f"MT5の初期化に失敗しました: {mt5.last_error()}")
+        timeframe = getattr(mt5, self.TIMEFRAMES[self.interval])
+        last = None
+        try:
+            while True:
+                # ブロッキングAPIのため、イベントループを止めないよう別スレッドで呼ぶ
+                rates = await asyncio.to_thread(mt5.copy_rates_from_pos, self.symbol, timeframe,
+                                                1, self.lookback)
+                for rate in rates if rates is not None else []:
+                    timestamp = pd.Timestamp(int(rate['time']), unit='s')
+                    if last is not None and timestamp <= last:
+                        continue
+                    last = timestamp
+                    yield Bar(self.symbol, self.interval, timestamp, float(rate['open']),
+                              float(rate['high']), float(rate['low']), float(rate['close']),
+                              float(rate['tick_volume']))
+                await asyncio.sleep(self.poll_seconds)
+        finally:
+            mt5.shutdown()
+
+FEEDS = {
+    'sqlite': SQLiteReplayFeed,
+    'csv': CSVReplayFeed,
+    'mt5': MT5Feed,
+}
+
+class SymbolState:
+    """
+    1シンボル分のRSI、当日のバーの集計、ピボットから求めた価格レベルを保持します。
+    """
+
+    def __init__(self, levels, rsi_window=14, pivot_method='standard'):
+        self.base_levels = list(levels)
+        self.rsi = RSI(rsi_window)
+        self.pivot = PIVOT_METHODS[pivot_method]
+        self.session = None
+        self.high = self.low = self.close = None
+        self.pivot_levels = []
+        self.levels = LevelIndex(self.base_levels)
+        self.filtered = None
+
+    def update(self, bar):
+        """
+        バーを1本反映し、フィルタリング後の価格レベルを返します。
+
+        日付が変わった場合は、前日の高値・安値・終値からピボットの価格レベルを計算し直します。
+        """
+        session = bar.timestamp.date()
+        if session != self.session:
+            if self.session is not None:
+                self.pivot_levels = list(self.pivot(self.high, self.low, self.close))
+                self.levels = LevelIndex(self.base_levels + self.pivot_levels)
+            self.session, self.high, self.low = session, bar.high, bar.low
+        else:
+            self.high, self.low = max(self.high, bar.high), min(self.low, bar.low)
+        self.close = bar.close
+
+        self.rsi.update(bar.close)
+        return filter_levels_with_rsi(self.rsi.value, self.levels, bar.close)
+
+class LiveLevelService:
+    """
+    フィードから受け取ったバーごとにRSIとピボットを更新し、価格レベルの変化を購読者に通知します。
+    """
+
+    def __init__(self, feed, levels=None, rsi_window=14, pivot_method='standard'):
+        self.feed = feed
+        self.base_levels = levels or {}
+        self.rsi_window = rsi_window
+        self.pivot_method = pivot_method
+        self.states = {}
+        self.subscribers = []
+        self.latencies = []
+
+    def subscribe(self, maxsize=SUBSCRIBER_QUEUE_SIZE):
+        """
+        価格レベルの変化を受け取るキューを登録します。
+
+        Returns:
+            asyncio.Queue: LevelChange が届くキュー（サービス終了時は None）
+        """
+        queue = asyncio.Queue(maxsize=maxsize)
+        self.subscribers.append(queue)
+        return queue
+
+    def _publish(self, change):
+        for queue in self.subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(change)
+
+    def _state(self, symbol):
+        state = self.states.get(symbol)
+        if state is None:
+            state = self.states[symbol] = SymbolState(self.base_levels.get(symbol, []),
+                                                      self.rsi_window, self.pivot_method)
+        return state
+
+    def on_bar(self, bar, publish=True):
+        """
+        確定したバーを1本処理します。
+
+        Args:
+            bar (Bar): 確定したバー
+            publish (bool): False の場合は状態の更新のみ行う（ウォームアップ用）
+
+        Returns:
+            LevelChange: 価格レベルが変化した場合はその内容、変化がなければ None
+        """
+        start = time.perf_counter()
+        state = self._state(bar.symbol)
+        filtered = state.update(bar)
+        change = None
+        if filtered != state.filtered:
+            previous = set(state.filtered or [])
+            current = set(filtered)
+            change = LevelChange(bar.symbol, bar.timestamp, bar.close, state.rsi.value, filtered,
+                                 sorted(current - previous), sorted(previous - current))
+            state.filtered = filtered
+            if publish:
+                self._publish(change)
+        self.latencies.append(time.perf_counter() - start)
+        return change
+
+    def warm_up(self, df, symbol, interval):
+        """
+        過去のバーでRSIとピボットの状態を作ります（通知は行いません）。
+
+        Args:
+            df (pd.DataFrame): timestamp をインデックスとする価格データ
+            symbol (str): シンボル名
+            interval (str): データの間隔
+        """
+        for row in df.reset_index().itertuples(index=False):
+            self.on_bar(Bar(symbol, interval, pd.Timestamp(row.timestamp), row.open, row.high,
+                            row.low, row.close, row.volume), publish=False)
+        self.latencies.clear()
+
+    async def run(self):
+        """
+        フィードが終わるまでバーを処理します。終了時は購読者に None を送ります。
+        """
+        try:
+            async for bar in self.feed.bars():
+                self.on_bar(bar)
+        finally:
+            for queue in self.subscribers:
+                if queue.full():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+
+    def latency_stats(self):
+        """
+        1バーあたりの処理時間（マイクロ秒）の統計を返します。
+
+        Returns:
+            dict: bars, mean_us, p50_us, p99_us, max_us
+        """
+        if not self.latencies:
+            return {'bars': 0, 'mean_us': 0.0, 'p50_us': 0.0, 'p99_us': 0.0, 'max_us': 0.0}
+        us = np.array(self.latencies) * 1e6
+        return {'bars': len(us), 'mean_us': float(us.mean()), 'p50_us': float(np.percentile(us, 50)),
+                'p99_us': float(np.percentile(us, 99)), 'max_us': float(us.max())}
+
+def load_levels(symbol, db_path=DEFAULT_DB_PATH, intervals=('daily', 'weekly')):
+    """
+    extract_levels が保存したクラスタリングの価格レベルを読み込みます。
+
+    Args:
+        symbol (str): シンボル名
+        db_path (str): データベースのパス
+        intervals (tuple): 読み込む間隔
+
+    Returns:
+        list: 価格レベルのリスト
+    """
+    levels = set()
+    for interval in intervals:
+        df = data_access.load_price_levels(symbol, interval, db_path=db_path)
+        # type のない行がクラスタリングの結果（type のある行はピボット由来）
+        levels.update(df.loc[df['type'].isna(), 'level'].tolist())
+    return sorted(levels)
+
+async def _print_changes(queue):
+    while True:
+        change = await queue.get()
+        if change is None:
+            return
+        print(f"{change.timestamp} {change.symbol} close={change.close:.5f} rsi={change.rsi:.1f} "
+              f"+{change.added} -{change.removed}")
+
+async def _serve(service, quiet):
+    consumers = [] if quiet else [asyncio.create_task(_print_changes(service.subscribe()))]
+    await service.run()
+    await asyncio.gather(*consumers)
+
+def main():
+    parser = argparse.ArgumentParser(description='バーを受信するたびに価格レベルを更新して通知します')
+    parser.add_argument('--symbol', default=DEFAULT_SYMBOL)
+    parser.add_argument('--interval', default='1h')
+    parser.add_argument('--feed', choices=list(FEEDS), default='sqlite')
+    parser.add_argument('--csv', help='csv フィードで読み込むファイル')
+    parser.add_argument('--delay', type=float, default=0.0, help='リプレイ時のバーの間隔（秒）')
+    parser.add_argument('--warmup', type=int, default=0,
+                        help='開始前に price_data から読み込む過去のバー数（mt5 フィード向け）')
+    parser.add_argument('--pivot-method', choices=list(PIVOT_METHODS), default='standard')
+    parser.add_argument('--db-path', default=DEFAULT_DB_PATH)
+    parser.add_argument('--quiet', action='store_true', help='価格レベルの変化を表示しない')
+    args = parser.parse_args()
+
+    os.makedirs(LOG_DIR, exist_ok=True)
+    logging.basicConfig(
+        filename=LOG_FILE,
+        level=logging.INFO,
+        format='%(asctime)s %(levelname)s:%(message)s'
+    )
+
+    if args.feed == 'sqlite':
+        feed = SQLiteReplayFeed(args.symbol, args.interval, args.db_path, delay=args.delay)
+    elif args.feed == 'csv':
+        feed = CSVReplayFeed(args.csv, args.symbol, args.interval, delay=args.delay)
+    else:
+        feed = MT5Feed(args.symbol, args.interval)
+
+    levels = {args.symbol: load_levels(args.symbol, args.db_path)}
+    service = LiveLevelService(feed, levels, pivot_method=args.pivot_method)
+    if args.warmup:
+        history = data_access.load_ohlc(args.symbol, args.interval, db_path=args.db_path)
+        service.warm_up(history.tail(args.warmup), args.symbol, args.interval)
+
+    try:
+        asyncio.run(_serve(service, args.quiet))
+    except KeyboardInterrupt:
+        pass
+
+    stats = service.latency_stats()
+    logging.info(f"{args.symbol} {args.interval}: {stats}")
+    print(f"{stats['bars']}本を処理しました（平均 {stats['mean_us']:.1f}us, p50 {stats['p50_us']:.1f}us, "
+          f"p99 {stats['p99_us']:.1f}us, 最大 {stats['max_us']:.1f}us）")
+
+if __name__ == "__main__":
+    main()
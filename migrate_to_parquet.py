@@ -0,0 +1,51 @@
+# scripts/migrate_to_parquet.py
+
+import argparse
+
+from data_access import DEFAULT_DB_PATH
+from storage import get_backend, DEFAULT_PARQUET_ROOT
+
+def migrate_to_parquet(db_path=DEFAULT_DB_PATH, root=DEFAULT_PARQUET_ROOT, symbols=None):
+    """
+    SQLiteの price_data をParquetストアにコピーします。
+
+    シリーズごとに年単位で読み込んで書き込むため、全履歴を一度にメモリに載せません。
+
+    Args:
+        db_path (str): コピー元のデータベースのパス
+        root (str): コピー先のParquetストアのディレクトリ
+        symbols (list): 対象のシンボル（省略時はすべて）
+
+    Returns:
+        dict: (シンボル, 間隔) ごとのコピーした行数
+    """
+    source = get_backend('sqlite', db_path=db_path)
+    target = get_backend('parquet', root=root)
+
+    copied = {}
+    for symbol, interval in source.list_series():
+        if symbols and symbol not in symbols:
+            continue
+        first, last = source.time_range(symbol, interval)
+        total = 0
+        for year in range(first.year, last.year + 1) if first is not None else []:
+            part = source.load_ohlc(symbol, interval,
+                                    since=f'{year - 1}-12-31 23:59:59',
+                                    until=f'{year}-12-31 23:59:59',
+                                    use_cache=False)
+            if not part.empty:
+                total += target.write_ohlc(part, symbol, interval)
+        copied[(symbol, interval)] = total
+        print(f"{symbol} {interval}: {total}行をコピーしました")
+    return copied
+
+def main():
+    parser = argparse.ArgumentParser(description='price_data をParquetストアに移行します')
+    parser.add_argument('--db-path', default=DEFAULT_DB_PATH)
+    parser.add_argument('--root', default=DEFAULT_PARQUET_ROOT)
+    parser.add_argument('--symbol', action='append', dest='symbols')
+    args = parser.parse_args()
+    migrate_to_parquet(args.db_path, args.root, args.symbols)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+# scripts/optimize_strategy.py
+
+import os
+import json
+import uuid
+import logging
+import argparse
+import itertools
+from datetime import datetime
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+import data_access
+from bulk_writer import bulk_write_frame
+from data_access import DEFAULT_DB_PATH, TIMESTAMP_FORMAT
+from setup_database import OPTIMIZATION_RESULTS_TABLE, OPTIMIZATION_RESULTS_DDL, OPTIMIZATION_RESULTS_INDEX_DDL
+from backtest_engine import (DEFAULT_PARAMS, DEFAULT_CASH, sma, stddev, MIN_STDDEV,
+                             warmup_bars, simulate)
+
+# ログディレクトリとファイル名を設定
+LOG_DIR = os.path.join(os.path.dirname(__file__), '..', 'logs')
+LOG_FILE = os.path.join(LOG_DIR, 'optimize_strategy.log')
+
+# 探索するパラメータの候補（risk_percent は売買に使われないため探索しない）
+PARAM_SPACE = {
+    'sma_short_period': [10, 20, 30, 50, 75, 100],
+    'sma_long_period': [100, 150, 200, 250, 300],
+    'bb_period': [20, 30, 50, 75, 100],
+    'bb_dev': [1.5, 1.8, 2.1, 2.5, 3.0],
+}
+
+METHODS = ['grid', 'random', 'bayes']
+
+METRIC_COLUMNS = ['final_value', 'total_return', 'max_drawdown', 'sharpe', 'num_trades']
+
+# 小さいほど良い評価指標（それ以外は大きいほど良い）
+LOWER_IS_BETTER = {'max_drawdown'}
+
+# ワーカーごとにキャッシュするインジケーター系列の数
+INDICATOR_CACHE_SIZE = 64
+
+class IndicatorCache:
+    """
+    1つの価格系列に対するインジケーター系列のキャッシュ。
+
+    パラメータの組み合わせが違っても同じ期間のSMAやバンドは1回だけ計算します。
+    """
+
+    def __init__(self, open_, close, maxsize=INDICATOR_CACHE_SIZE):
+        self.open = open_
+        self.close = close
+        self.sma = lru_cache(maxsize=maxsize)(self._sma)
+        self._stddev = lru_cache(maxsize=maxsize)(self._compute_stddev)
+        self.bands = lru_cache(maxsize=maxsize)(self._bands)
+
+    def _sma(self, period):
+        return sma(self.close, period)
+
+    def _compute_stddev(self, period):
+        sd = stddev(self.close, period)
+        return np.where(sd == 0, MIN_STDDEV, sd)
+
+    def _bands(self, period, devfactor):
+        # 同じ期間の移動平均と標準偏差は倍率が違っても共有する
+        mid, sd = self.sma(period), self._stddev(period)
+        return mid + devfactor * sd, mid - devfactor * sd
+
+    def evaluate(self, params, start=0, stop=None, cash=DEFAULT_CASH):
+        """
+        パラメータの組み合わせを [start, stop) の範囲でバックテストし、評価指標を返します。
+
+        インジケーターは系列全体で計算したものを切り出して使うため、
+        範囲の先頭ではすでにウォームアップが済んでいます。
+
+        Args:
+            params (dict): 戦略のパラメータ
+            start (int): 範囲の先頭のバー
+            stop (int): 範囲の末尾のバー（この位置は含まない）
+            cash (float): 初期資金
+
+        Returns:
+            dict: パラメータと評価指標
+        """
+        params = {**DEFAULT_PARAMS, **params}
+        window = slice(start, stop)
+        top, bot = self.bands(params['bb_period'], params['bb_dev'])
+        result = simulate(self.open[window], self.close[window],
+                          self.sma(params['sma_short_period'])[window],
+                          self.sma(params['sma_long_period'])[window],
+                          top[window], bot[window],
+                          warmup=max(warmup_bars(params) - start, 0), cash=cash)
+        return {**params, **equity_metrics(result.equity, cash), 'num_trades': len(result.trades)}
+
+def equity_metrics(equity, cash=DEFAULT_CASH):
+    """
+    資産曲線から評価指標を計算します。
+
+    Args:
+        equity (np.ndarray): バーごとの資産
+        cash (float): 初期資金
+
+    Returns:
+        dict: final_value, total_return, max_drawdown, sharpe（バー単位、年率換算なし）
+    """
+    if len(equity) == 0:
+        return {'final_value': cash, 'total_return': 0.0, 'max_drawdown': 0.0, 'sharpe': 0.0}
+    returns = np.diff(equity) / equity[:-1]
+    std = returns.std() if len(returns) else 0.0
+    return {
+        'final_value': float(equity[-1]),
+        'total_return': float(equity[-1] / cash - 1),
+        'max_drawdown': float(np.max(1 - equity / np.maximum.accumulate(equity))),
+        'sharpe': float(returns.mean() / std * np.sqrt(len(returns))) if std > 0 else 0.0,
+    }
+
+class SharedPrices:
+    """
+    始値・終値の配列を共有メモリに置き、ワーカープロセスからコピーせずに参照させます。
+
+    with ブロックを抜けると共有メモリは解放されます。
+    """
+
+    def __init__(self, df):
+        values = df[['open', 'close']].to_numpy(dtype='float64').T
+        self.n_bars = values.shape[1]
+        self.shm = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        np.ndarray(values.shape, dtype='float64', buffer=self.shm.buf)[:] = values
+
+    @property
+    def spec(self):
+        return self.shm.name, self.n_bars
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shm.close()
+        self.shm.unlink()
+
+# ワーカープロセス内の共有メモリとインジケーターキャッシュ
+_worker_shm = None
+_worker_cache = None
+
+def init_worker(shm_name, n_bars):
+    global _worker_shm, _worker_cache
+    # 共有メモリの解放は親プロセスの SharedPrices が行う
+    _worker_shm = shared_memory.SharedMemory(name=shm_name)
+    prices = np.ndarray((2, n_bars), dtype='float64', buffer=_worker_shm.buf)
+    _worker_cache = IndicatorCache(prices[0], prices[1])
+
+def worker_cache():
+    """
+    ワーカープロセス内のインジケーターキャッシュを返します（init_worker で初期化したプール内でのみ有効）。
+    """
+    return _worker_cache
+
+def _evaluate_task(task):
+    params, start, stop = task
+    return _worker_cache.evaluate(params, start, stop)
+
+def evaluate_batch(pool, candidates, start=0, stop=None, max_workers=1):
+    """
+    パラメータの組み合わせをプロセスプールで評価します。
+
+    同じ期間を使う組み合わせが同じワーカーに渡るよう、期間の順に並べてからまとめて送ります。
+
+    Args:
+        pool (ProcessPoolExecutor): init_worker で初期化したプロセスプール
+        candidates (list): パラメータの辞書のリスト
+        start (int): 評価する範囲の先頭のバー
+        stop (int): 評価する範囲の末尾のバー
+        max_workers (int): プールのワーカープロセス数
+
+    Returns:
+        list: パラメータと評価指標の辞書のリスト
+    """
+    ordered = sorted(candidates, key=lambda p: (p.get('sma_long_period'), p.get('bb_period'),
+                                                p.get('sma_short_period'), p.get('bb_dev')))
+    chunksize = max(1, len(ordered) // (max_workers * 4))
+    return list(pool.map(_evaluate_task, [(p, start, stop) for p in ordered], chunksize=chunksize))
+
+def _is_valid(params):
+    params = {**DEFAULT_PARAMS, **params}
+    return params['sma_short_period'] < params['sma_long_period']
+
+def grid_candidates(space=PARAM_SPACE):
+    """
+    候補のすべての組み合わせを返します（短期SMA >= 長期SMA の組み合わせは除外）。
+    """
+    names = list(space)
+    combos = (dict(zip(names, values)) for values in itertools.product(*space.values()))
+    return [p for p in combos if _is_valid(p)]
+
+def random_candidates(space=PARAM_SPACE, n=50, seed=0):
+    """
+    候補からランダムに重複なく n 個の組み合わせを選びます。
+    """
+    grid = grid_candidates(space)
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(grid), size=min(n, len(grid)), replace=False)
+    return [grid[i] for i in picks]
+
+def metric_score(result, metric):
+    """
+    評価結果を、大きいほど良い値に揃えて返します（LOWER_IS_BETTER の指標は符号を反転）。
+
+    Args:
+        result (dict): 評価結果
+        metric (str): 評価指標
+
+    Returns:
+        float: 比較に使う値
+    """
+    return -result[metric] if metric in LOWER_IS_BETTER else result[metric]
+
+def _encode(candidates, space):
+    # 各パラメータを候補内の位置で [0, 1] に正規化する
+    return np.array([[space[k].index(p[k]) / max(len(space[k]) - 1, 1) for k in space]
+                     for p in candidates])
+
+def bayesian_search(evaluate, space=PARAM_SPACE, n_iter=50, n_initial=10, batch_size=4,
+                    metric='final_value', seed=0):
+    """
+    ガウス過程回帰と期待改善量（EI）でパラメータを探索します。
+
+    1回の提案で batch_size 個の組み合わせを選び、まとめて評価します。
+
+    Args:
+        evaluate (callable): パラメータの辞書のリストを受け取り評価結果のリストを返す関数
+        space (dict): パラメータの候補
+        n_iter (int): 評価する組み合わせの総数
+        n_initial (int): 最初にランダムに評価する組み合わせの数
+        batch_size (int): 1回の提案で評価する組み合わせの数
+        metric (str): 最適化する評価指標（LOWER_IS_BETTER の指標は最小化）
+        seed (int): 乱数シード
+
+    Returns:
+        list: 評価結果の辞書のリスト
+    """
+    # ベイズ最適化を使う場合のみ必要
+    from scipy.stats import norm
+    from sklearn.gaussian_process import GaussianProcessRegressor
+    from sklearn.gaussian_process.kernels import Matern, WhiteKernel
+
+    grid = grid_candidates(space)
+    n_iter = min(n_iter, len(grid))
+    results = evaluate(random_candidates(space, min(n_initial, n_iter), seed))
+    seen = {tuple(r[k] for k in space) for r in results}
+
+    while len(results) < n_iter:
+        X = _encode(results, space)
+        y = np.array([metric_score(r, metric) for r in results])
+        kernel = (Matern(nu=2.5, length_scale_bounds=(1e-2, 1e2))
+                  + WhiteKernel(noise_level_bounds=(1e-10, 1e1)))
+        gp = GaussianProcessRegressor(kernel=kernel, normalize_y=True, random_state=seed)
+        gp.fit(X, y)
+
+        remaining = [p for p in grid if tuple(p[k] for k in space) not in seen]
+        mu, sigma = gp.predict(_encode(remaining, space), return_std=True)
+        improvement = mu - y.max()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z = np.where(sigma > 0, improvement / sigma, 0.0)
+        ei = np.where(sigma > 0, improvement * norm.cdf(z) + sigma * norm.pdf(z), 0.0)
+
+        batch = [remaining[i] for i in np.argsort(-ei)[:min(batch_size, n_iter - len(results))]]
+        results += evaluate(batch)
+        seen.update(tuple(p[k] for k in space) for p in batch)
+    return results
+
+def run_sweep(df, method='grid', space=PARAM_SPACE, n_iter=50, max_workers=None,
+              metric='final_value', seed=0, start=0, stop=None):
+    """
+    パラメータのスイープを実行し、評価指標の順に並べた結果を返します。
+
+    価格データは1回だけ読み込んで共有メモリに置き、ワーカーはそれを参照します。
+
+    Args:
+        df (pd.DataFrame): open, close 列を持つ価格データ
+        method (str): 'grid', 'random', 'bayes' のいずれか
+        space (dict): パラメータの候補
+        n_iter (int): random / bayes で評価する組み合わせの数
+        max_workers (int): ワーカープロセス数（省略時はCPU数）
+        metric (str): 並べ替えに使う評価指標（良い順、LOWER_IS_BETTER の指標は小さい順）
+        seed (int): 乱数シード
+        start (int): 評価する範囲の先頭のバー
+        stop (int): 評価する範囲の末尾のバー
+
+    Returns:
+        pd.DataFrame: パラメータと評価指標
+    """
+    if method not in METHODS:
+        raise ValueError(f"未対応の探索方法です: {method}")
+    max_workers = max_workers or os.cpu_count() or 1
+
+    with SharedPrices(df) as prices, \
+            ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker,
+                                initargs=prices.spec) as pool:
+        def evaluate(candidates):
+            return evaluate_batch(pool, candidates, start, stop, max_workers)
+
+        if method == 'grid':
+            results = evaluate(grid_candidates(space))
+        elif method == 'random':
+            results = evaluate(random_candidates(space, n_iter, seed))
+        else:
+            results = bayesian_search(evaluate, space, n_iter, batch_size=max_workers,
+                                      metric=metric, seed=seed)
+
+    return pd.DataFrame(results).sort_values(metric, ascending=metric in LOWER_IS_BETTER, ignore_index=True)
+
+def save_results(results, run_id, symbol, interval, method, db_path=DEFAULT_DB_PATH):
+    """
+    スイープの結果を optimization_results テーブルに保存します。
+
+    Args:
+        results (pd.DataFrame): run_sweep の戻り値
+        run_id (str): 実行ID
+        symbol (str): シンボル名
+        interval (str): データの間隔
+        method (str): 探索方法
+        db_path (str): データベースのパス
+    """
+    columns = ['run_id', 'symbol', 'interval', 'method'] + list(DEFAULT_PARAMS) + METRIC_COLUMNS + ['created_at']
+    df = results.assign(run_id=run_id, symbol=symbol, interval=interval, method=method,
+                        created_at=datetime.now().strftime(TIMESTAMP_FORMAT))
+    with data_access.connection(db_path) as conn:
+        conn.execute(OPTIMIZATION_RESULTS_DDL)
+        bulk_write_frame(db_path, OPTIMIZATION_RESULTS_TABLE, df, columns, conn=conn)
+
+def main():
+    parser = argparse.ArgumentParser(description='EnhancedSmaCrossStrategy のパラメータを探索します')
+    parser.add_argument('--symbol', default='EURUSD')
+    parser.add_argument('--interval', default='daily')
+    parser.add_argument('--method', choices=METHODS, default='grid')
+    parser.add_argument('--iterations', type=int, default=50, help='random / bayes で評価する数')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--metric', choices=METRIC_COLUMNS[:-1], default='final_value')
+    parser.add_argument('--space', type=json.loads, default=None,
+                        help='パラメータの候補（JSON、例: \'{"sma_short_period": [20, 50]}\'）')
+    parser.add_argument('--db-path', default=DEFAULT_DB_PATH)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    os.makedirs(LOG_DIR, exist_ok=True)
+    logging.basicConfig(
+        filename=LOG_FILE,
+        level=logging.INFO,
+        format='%(asctime)s %(levelname)s:%(message)s'
+    )
+
+    # backtest_strategy は backtrader を読み込むため、コマンドとして実行した場合のみ読み込む
+    from backtest_strategy import fetch_price_data
+    df = fetch_price_data(args.symbol, args.interval, db_path=args.db_path)
+
+    space = {**PARAM_SPACE, **(args.space or {})}
+    run_id = uuid.uuid4().hex[:12]
+    results = run_sweep(df, args.method, space, args.iterations, args.workers, args.metric)
+    save_results(results, run_id, args.symbol, args.interval, args.method, args.db_path)
+    logging.info(f"{run_id}: {len(results)}件の組み合わせを評価しました（{args.method}）")
+
+    print(f"run_id={run_id}: {len(results)}件の組み合わせを評価しました")
+    print(results.head(args.top).to_string(index=False))
+
+if __name__ == "__main__":
+    main()
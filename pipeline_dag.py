@@ -0,0 +1,347 @@
+# scripts/pipeline_dag.py
+
+import os
+import hashlib
+import logging
+import argparse
+from collections import namedtuple, OrderedDict
+from contextlib import nullcontext
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import data_access
+import calculate_pivot_points
+import extract_support_resistance
+from bulk_writer import bulk_write_frame
+from data_access import DEFAULT_DB_PATH, TIMESTAMP_FORMAT
+from watermark import get_watermark, set_watermark
+from symbols import get_symbols, pip_size, DEFAULT_SYMBOL
+from extract_levels import extract_levels, save_levels_to_db
+from filter_levels_with_rsi import calculate_rsi, filter_levels_with_rsi, save_filtered_levels
+from combine_levels import save_combined_levels
+from confluence import build_zones, levels_frame, save_zones
+from level_scoring import TOUCH_TOLERANCE_PIPS, count_hits, save_level_scores
+from setup_database import setup_database
+from instrumentation import Instrumentation, PROFILERS, current as current_instrumentation
+
+# ログディレクトリとファイル名を設定
+LOG_DIR = os.path.join(os.path.dirname(__file__), '..', 'logs')
+LOG_FILE = os.path.join(LOG_DIR, 'pipeline_dag.log')
+
+os.makedirs(LOG_DIR, exist_ok=True)
+
+logging.basicConfig(
+    filename=LOG_FILE,
+    level=logging.INFO,
+    format='%(asctime)s %(levelname)s:%(message)s'
+)
+
+# ステージの定義
+# func(inputs) は依存ステージの出力を名前で引ける辞書を受け取り、出力を返します。
+# persist(output) は出力をSQLiteに保存します（保存しないステージは None）。
+Stage = namedtuple('Stage', ['name', 'func', 'deps', 'persist'])
+
+StageReport = namedtuple('StageReport', ['stage', 'status', 'seconds', 'peak_mb'])
+
+def fingerprint(value):
+    """
+    ステージの出力の内容からフィンガープリント（ハッシュ値）を計算します。
+
+    Args:
+        value: データフレーム、配列、リスト、辞書など
+
+    Returns:
+        str: SHA-1 の16進文字列
+    """
+    digest = hashlib.sha1()
+
+    def update(v):
+        if isinstance(v, (pd.DataFrame, pd.Series)):
+            digest.update(pd.util.hash_pandas_object(v, index=True).to_numpy().tobytes())
+            digest.update(repr(list(v.columns) if isinstance(v, pd.DataFrame) else v.name).encode())
+        elif isinstance(v, np.ndarray):
+            digest.update(np.ascontiguousarray(v).tobytes())
+        elif isinstance(v, dict):
+            for key in sorted(v):
+                digest.update(repr(key).encode())
+                update(v[key])
+        elif isinstance(v, (list, tuple)):
+            digest.update(f'{type(v).__name__}{len(v)}'.encode())
+            for item in v:
+                update(item)
+        else:
+            digest.update(repr(v).encode())
+
+    update(value)
+    return digest.hexdigest()
+
+class PipelineDAG:
+    """
+    依存関係を持つステージをトポロジカル順に実行し、出力をメモリ上で受け渡すランナー。
+
+    依存ステージの出力が前回の実行と同じステージは実行をスキップします。
+    依存を持たないステージ（データの読み込み）は毎回実行し、その出力で変更を判定します。
+    """
+
+    def __init__(self, name, db_path=DEFAULT_DB_PATH):
+        self.name = name
+        self.db_path = db_path
+        self.stages = OrderedDict()
+
+    def add_stage(self, name, func, deps=(), persist=None):
+        """
+        ステージを追加します。
+
+        Args:
+            name (str): ステージ名
+            func (callable): 依存ステージの出力の辞書を受け取り、出力を返す関数
+            deps (tuple): 依存するステージ名
+            persist (callable): 出力をSQLiteに保存する関数（省略可）
+        """
+        if name in self.stages:
+            raise ValueError(f"ステージ名が重複しています: {name}")
+        self.stages[name] = Stage(name, func, tuple(deps), persist)
+
+    def order(self):
+        """
+        ステージをトポロジカル順に並べて返します。
+
+        Returns:
+            list: ステージ名のリスト
+        """
+        ordered, visiting, visited = [], set(), set()
+
+        def visit(name):
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError(f"ステージの依存関係が循環しています: {name}")
+            if name not in self.stages:
+                raise ValueError(f"未定義のステージです: {name}")
+            visiting.add(name)
+            for dep in self.stages[name].deps:
+                visit(dep)
+            visiting.remove(name)
+            visited.add(name)
+            ordered.append(name)
+
+        for name in self.stages:
+            visit(name)
+        return ordered
+
+    def _load_state(self):
+        with data_access.connection(self.db_path) as conn:
+            rows = conn.execute(
+                "SELECT stage, input_fingerprint, output_fingerprint, persisted "
+                "FROM pipeline_stage_state WHERE pipeline = ?",
+                (self.name,)
+            ).fetchall()
+        return {stage: (inp, out, bool(persisted)) for stage, inp, out, persisted in rows}
+
+    def _save_state(self, stage, input_fp, output_fp, persisted):
+        with data_access.connection(self.db_path) as conn, conn:
+            conn.execute('''
+                INSERT INTO pipeline_stage_state
+                (pipeline, stage, input_fingerprint, output_fingerprint, persisted, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (pipeline, stage) DO UPDATE SET
+                    input_fingerprint = excluded.input_fingerprint,
+                    output_fingerprint = excluded.output_fingerprint,
+                    persisted = excluded.persisted,
+                    updated_at = excluded.updated_at
+            ''', (self.name, stage, input_fp, output_fp, int(persisted),
+                  datetime.now().strftime(TIMESTAMP_FORMAT)))
+
+    def run(self, persist=None, force=False, trace_memory=True):
+        """
+        すべてのステージを依存関係の順に実行します。
+
+        Args:
+            persist: 出力を保存するステージ名の集合（True の場合は保存関数を持つすべて）
+            force (bool): True の場合は入力が変わっていないステージも実行
+            trace_memory (bool): ステージごとのピークメモリを計測するか
+                （実行中の Instrumentation がある場合はその設定に従います）
+
+        Returns:
+            tuple: (ステージ名ごとの出力の辞書, StageReport のリスト)
+        """
+        order = self.order()
+        if persist is True:
+            persist = {name for name, stage in self.stages.items() if stage.persist is not None}
+        persist = set(persist or ())
+
+        state = self._load_state()
+        outputs, output_fps, reports = {}, {}, []
+        skipped = set()
+
+        # スキップしたステージの出力が後段で必要になった場合は、その時点で計算する
+        def materialize(name):
+            if name in outputs:
+                return outputs[name]
+            stage = self.stages[name]
+            outputs[name] = stage.func({dep: materialize(dep) for dep in stage.deps})
+            return outputs[name]
+
+        # 実行中の計測があればそのステージとして記録する（クエリの計測は接続ごとに1つまで）
+        run = current_instrumentation()
+        with nullcontext(run) if run is not None else \
+                Instrumentation(self.name, memory=trace_memory, json_log=None) as run:
+            for name in order:
+                stage = self.stages[name]
+                wants_persist = name in persist and stage.persist is not None
+                input_fp = fingerprint([output_fps[dep] for dep in stage.deps]) if stage.deps else None
+                previous = state.get(name)
+
+                if (not force and stage.deps and previous is not None
+                        and previous[0] == input_fp and (previous[2] or not wants_persist)):
+                    output_fps[name] = previous[1]
+                    skipped.add(name)
+                    reports.append(StageReport(name, 'skipped', 0.0, 0.0))
+                    continue
+
+                with run.stage(f'{self.name}/{name}') as metrics:
+                    output = stage.func({dep: materialize(dep) for dep in stage.deps})
+                    outputs[name] = output
+                    output_fps[name] = fingerprint(output)
+                    if wants_persist:
+                        stage.persist(output)
+                    if isinstance(output, pd.DataFrame):
+                        metrics.add_rows(len(output))
+                elapsed, peak = metrics.seconds, metrics.peak_memory_mb or 0.0
+
+                if stage.deps:
+                    self._save_state(name, input_fp, output_fps[name], wants_persist)
+                reports.append(StageReport(name, 'ran', elapsed, peak))
+                logging.info(f"{self.name}/{name}: {elapsed:.3f}s, peak {peak:.1f}MB, "
+                             f"{metrics.queries} queries")
+
+        return outputs, reports
+
+LEVEL_INTERVALS = ['daily', 'weekly']
+RSI_INTERVAL = '1h'
+NUM_CLUSTERS = 5
+
+def _persist_new_rows(db_path, symbol, stage, frames, write):
+    # ウォーターマーク以降の行だけを書き込み、ウォーターマークを進める
+    # （ウォーターマークの位置のバーは集計中の最後のバーとして作り直されている場合があるため、書き直す）
+    for interval, df in frames.items():
+        since = get_watermark(db_path, symbol, interval, stage)
+        new = df if since is None else df[df['timestamp'] >= pd.Timestamp(since)]
+        if new.empty:
+            continue
+        write(new, interval)
+        set_watermark(db_path, symbol, interval, stage, new['timestamp'].max())
+
+def build_level_pipeline(symbol, db_path=DEFAULT_DB_PATH):
+    """
+    prices → pivots → support_resistance / levels → scores / filtered → combined（ゾーン）のパイプラインを構築します。
+
+    Args:
+        symbol (str): シンボル名
+        db_path (str): データベースのパス
+
+    Returns:
+        PipelineDAG: パイプライン
+    """
+    dag = PipelineDAG(f'levels:{symbol}', db_path)
+
+    def prices(inputs):
+        return {interval: data_access.load_ohlc(symbol, interval, db_path=db_path)
+                for interval in LEVEL_INTERVALS + [RSI_INTERVAL]}
+
+    def pivots(inputs):
+        return {interval: calculate_pivot_points.calculate_pivot_points(df.reset_index())
+                for interval, df in inputs['prices'].items()
+                if interval in LEVEL_INTERVALS and not df.empty}
+
+    def persist_pivots(output):
+        _persist_new_rows(db_path, symbol, calculate_pivot_points.STAGE, output,
+                          lambda df, interval: bulk_write_frame(
+                              db_path, 'pivot_points', df.assign(symbol=symbol, interval=interval),
+                              ['timestamp'] + calculate_pivot_points.PIVOT_COLUMNS + ['symbol', 'interval'],
+                              mode='replace'))
+
+    def support_resistance(inputs):
+        return {interval: extract_support_resistance.support_resistance_rows(df, interval, symbol)
+                for interval, df in inputs['pivots'].items()}
+
+    def persist_support_resistance(output):
+        _persist_new_rows(db_path, symbol, extract_support_resistance.STAGE, output,
+                          lambda df, interval: extract_support_resistance.write_support_resistance_rows(
+                              db_path, df, symbol, interval))
+
+    def levels(inputs):
+        return {interval: extract_levels(df, num_clusters=NUM_CLUSTERS)
+                for interval, df in inputs['pivots'].items() if len(df) >= NUM_CLUSTERS}
+
+    def persist_levels(output):
+        for interval, interval_levels in output.items():
+            save_levels_to_db(interval_levels, symbol, interval, db_path)
+
+    def scores(inputs):
+        tolerance = TOUCH_TOLERANCE_PIPS * pip_size(symbol)
+        return {interval: (count_hits(interval_levels, inputs['prices'][interval], tolerance),
+                           len(inputs['prices'][interval]))
+                for interval, interval_levels in inputs['levels'].items()}
+
+    def persist_scores(output):
+        for interval, (interval_scores, bars) in output.items():
+            save_level_scores(interval_scores, symbol, interval, bars, db_path)
+
+    def filtered(inputs):
+        rsi_bars = inputs['prices'][RSI_INTERVAL]
+        if rsi_bars.empty:
+            return dict(inputs['levels'])
+        rsi = calculate_rsi(rsi_bars, window=14)
+        current_price = rsi_bars['close'].iloc[-1]
+        return {interval: filter_levels_with_rsi(rsi, interval_levels, current_price)
+                for interval, interval_levels in inputs['levels'].items()}
+
+    def persist_filtered(output):
+        for interval, interval_levels in output.items():
+            save_filtered_levels(interval_levels, symbol, interval, db_path)
+
+    def combined(inputs):
+        scores = {interval: interval_scores for interval, (interval_scores, _) in inputs['scores'].items()}
+        return build_zones(levels_frame(inputs['filtered'], symbol, scores))
+
+    def persist_combined(output):
+        save_combined_levels(output['level'].tolist(), symbol, db_path)
+        save_zones(output, db_path, symbols=[symbol])
+
+    dag.add_stage('prices', prices)
+    dag.add_stage('pivots', pivots, deps=['prices'], persist=persist_pivots)
+    dag.add_stage('support_resistance', support_resistance, deps=['pivots'], persist=persist_support_resistance)
+    dag.add_stage('levels', levels, deps=['pivots'], persist=persist_levels)
+    dag.add_stage('scores', scores, deps=['prices', 'levels'], persist=persist_scores)
+    dag.add_stage('filtered', filtered, deps=['prices', 'levels'], persist=persist_filtered)
+    dag.add_stage('combined', combined, deps=['filtered', 'scores'], persist=persist_combined)
+    return dag
+
+def main():
+    parser = argparse.ArgumentParser(description='レベル抽出パイプラインをDAGとして実行します')
+    parser.add_argument('--symbol', action='append', dest='symbols')
+    parser.add_argument('--db-path', default=DEFAULT_DB_PATH)
+    parser.add_argument('--persist', action='append',
+                        help='出力を保存するステージ（省略時は保存関数を持つすべて）')
+    parser.add_argument('--force', action='store_true', help='入力が変わっていないステージも実行する')
+    parser.add_argument('--profile', choices=PROFILERS, default=None,
+                        help='ステージごとのプロファイルを logs/profiles に出力する')
+    parser.add_argument('--trace-sql', action='store_true',
+                        help='SQLite のクエリ数と実行時間を計測する（書き込みが遅くなります）')
+    args = parser.parse_args()
+
+    setup_database(args.db_path)
+    with Instrumentation('pipeline_dag', memory=True, profile=args.profile, trace_sql=args.trace_sql) as run:
+        for symbol in get_symbols(args.symbols or [DEFAULT_SYMBOL]):
+            dag = build_level_pipeline(symbol, args.db_path)
+            _, reports = dag.run(persist=args.persist or True, force=args.force)
+            for report in reports:
+                print(f"{symbol} {report.stage:<20} {report.status:<8} "
+                      f"{report.seconds:8.3f}s {report.peak_mb:8.1f}MB")
+    run.save(args.db_path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+# scripts/pipeline_runner.py
+
+import os
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import pandas as pd
+
+import data_access
+import calculate_pivot_points
+import extract_support_resistance
+from bulk_writer import bulk_write_frame
+from data_access import DEFAULT_DB_PATH
+from watermark import get_watermark, set_watermark
+from symbols import get_symbols, pip_size
+from fetch_historical_data import fetch_data, PRICE_COLUMNS
+from resample import BASE_INTERVAL, base_since, derive_new_bars, stage_name as resample_stage
+from extract_levels import extract_levels
+from filter_levels_with_rsi import calculate_rsi, filter_levels_with_rsi
+from confluence import LEVEL_ZONES_TABLE, ZONE_COLUMNS, build_zones, levels_frame
+from level_scoring import TOUCH_TOLERANCE_PIPS, count_hits
+from setup_database import setup_database
+from instrumentation import Instrumentation, PROFILERS
+
+# ログディレクトリとファイル名を設定
+LOG_DIR = os.path.join(os.path.dirname(__file__), '..', 'logs')
+LOG_FILE = os.path.join(LOG_DIR, 'pipeline_runner.log')
+
+os.makedirs(LOG_DIR, exist_ok=True)
+
+logging.basicConfig(
+    filename=LOG_FILE,
+    level=logging.INFO,
+    format='%(asctime)s %(levelname)s:%(message)s'
+)
+
+LEVEL_INTERVALS = ['daily', 'weekly']
+RSI_INTERVAL = '1h'
+NUM_CLUSTERS = 5
+
+PIVOT_WRITE_COLUMNS = ['timestamp'] + calculate_pivot_points.PIVOT_COLUMNS + ['symbol', 'interval']
+
+def _merge_bars(stored, fetched):
+    # 取得したバーのうち、保存済みでないものだけを追加する（INSERT OR IGNORE と同じ扱い）
+    if fetched is None or fetched.empty:
+        return stored
+    fetched = fetched.set_index('timestamp')[data_access.OHLC_COLUMNS]
+    merged = pd.concat([stored, fetched])
+    return merged[~merged.index.duplicated(keep='first')].sort_index()
+
+def _since(bars, watermark):
+    # ウォーターマークの位置のバーは集計中の最後のバーとして作り直されている場合があるため、含めて再計算する
+    if watermark is None:
+        return bars
+    return bars[bars.index >= pd.Timestamp(watermark)]
+
+def run_symbol_pipeline(symbol, db_path=DEFAULT_DB_PATH, fetch=True, instrument=None):
+    """
+    1シンボル分の fetch → resample → pivots → levels → filter → combine をメモリ上で実行します。
+
+    取得するのは基準の間隔（BASE_INTERVAL）のみで、上位の間隔はそこから生成します。
+
+    ワーカープロセスで実行されるため、データベースへの書き込みは行わず、
+    書き込む内容を結果として返します（書き込みは親プロセスの単一ライターが行います）。
+
+    Args:
+        symbol (str): シンボル名
+        db_path (str): データベースのパス
+        fetch (bool): ヒストリカルデータを取得するか
+        instrument (dict): ステージの計測の設定（Instrumentation の memory, profile, trace_sql）
+
+    Returns:
+        dict: symbol, writes, watermarks, timings, metrics, error を持つ辞書
+    """
+    writes, watermarks = [], []
+    result = {'symbol': symbol, 'writes': writes, 'watermarks': watermarks,
+              'timings': {}, 'metrics': [], 'error': None}
+    # 計測結果は親プロセスに返して JSON ログとテーブルに書き込む
+    with Instrumentation('pipeline_runner', json_log=None, **(instrument or {})) as run:
+        try:
+            _run_stages(run, symbol, db_path, fetch, writes, watermarks)
+        except Exception as e:
+            logging.exception(f"{symbol}: パイプラインの実行中にエラーが発生しました")
+            result['error'] = repr(e)
+    result['metrics'] = run.records
+    result['timings'] = run.timings()
+    return result
+
+def _run_stages(run, symbol, db_path, fetch, writes, watermarks):
+    with run.stage('fetch', symbol, BASE_INTERVAL) as metrics:
+        fetched = None
+        if fetch:
+            fetched = fetch_data(BASE_INTERVAL, symbol)
+            writes.append(('price_data', fetched, PRICE_COLUMNS, 'ignore'))
+            metrics.add_rows(len(fetched))
+
+    with run.stage('resample', symbol) as metrics:
+        marks = {interval: get_watermark(db_path, symbol, interval, resample_stage(interval))
+                 for interval in set(LEVEL_INTERVALS + [RSI_INTERVAL])}
+        starts = [base_since(mark) for mark in marks.values()]
+        since = None if None in starts else min(starts)
+        base = _merge_bars(data_access.load_ohlc(symbol, BASE_INTERVAL, since=since, db_path=db_path),
+                           fetched)
+
+        prices = {}
+        for interval, mark in marks.items():
+            new_bars = derive_new_bars(base, interval, mark)
+            stored = data_access.load_ohlc(symbol, interval, db_path=db_path)
+            if not new_bars.empty:
+                writes.append(('price_data',
+                               new_bars.reset_index().assign(symbol=symbol, interval=interval),
+                               PRICE_COLUMNS, 'replace'))
+                watermarks.append((interval, resample_stage(interval), new_bars.index[-1]))
+            merged = pd.concat([stored, new_bars])
+            prices[interval] = merged[~merged.index.duplicated(keep='last')].sort_index()
+            metrics.add_rows(len(new_bars))
+
+    levels = {}
+    for interval in LEVEL_INTERVALS:
+        bars = prices[interval]
+        if bars.empty:
+            continue
+
+        with run.stage('pivots', symbol, interval) as metrics:
+            since = get_watermark(db_path, symbol, interval, calculate_pivot_points.STAGE)
+            new_bars = _since(bars, since)
+            new_pivots = calculate_pivot_points.calculate_pivot_points(new_bars.reset_index())
+            if not new_pivots.empty:
+                writes.append(('pivot_points',
+                               new_pivots.assign(symbol=symbol, interval=interval),
+                               PIVOT_WRITE_COLUMNS, 'replace'))
+                sr_rows = extract_support_resistance.support_resistance_rows(new_pivots, interval, symbol)
+                writes.append(('price_levels', sr_rows, extract_support_resistance.LEVEL_COLUMNS, 'refresh',
+                               extract_support_resistance.refresh_scope(sr_rows, interval)))
+                last = new_bars.index[-1]
+                watermarks.append((interval, calculate_pivot_points.STAGE, last))
+                watermarks.append((interval, extract_support_resistance.STAGE, last))
+
+            stored = data_access.load_pivot_points(symbol, interval, db_path=db_path)
+            pivots = pd.concat([stored, new_pivots.set_index('timestamp')])
+            pivots = pivots[~pivots.index.duplicated(keep='last')]
+            metrics.add_rows(len(new_pivots))
+
+        with run.stage('levels', symbol, interval) as metrics:
+            if len(pivots) >= NUM_CLUSTERS:
+                levels[interval] = extract_levels(pivots, num_clusters=NUM_CLUSTERS)
+                # 前回のクラスタリング結果（type が NULL の行）は同じトランザクションで置き換える
+                writes.append(('price_levels',
+                               pd.DataFrame({'symbol': symbol, 'interval': interval,
+                                             'level': levels[interval]}),
+                               ['symbol', 'interval', 'level'], 'refresh',
+                               ("interval = ? AND type IS NULL", (interval,))))
+                metrics.add_rows(len(levels[interval]))
+
+    with run.stage('filter', symbol, RSI_INTERVAL) as metrics:
+        rsi_bars = prices[RSI_INTERVAL]
+        if rsi_bars.empty:
+            filtered = levels
+        else:
+            rsi = calculate_rsi(rsi_bars, window=14)
+            current_price = rsi_bars['close'].iloc[-1]
+            filtered = {interval: filter_levels_with_rsi(rsi, interval_levels, current_price)
+                        for interval, interval_levels in levels.items()}
+        metrics.add_rows(sum(len(interval_levels) for interval_levels in filtered.values()))
+
+    with run.stage('combine', symbol) as metrics:
+        tolerance = TOUCH_TOLERANCE_PIPS * pip_size(symbol)
+        scores = {interval: count_hits(interval_levels, prices[interval], tolerance)
+                  for interval, interval_levels in levels.items()}
+        zones = build_zones(levels_frame(filtered, symbol, scores))
+        writes.append(('combined_price_levels', zones, ['symbol', 'level'], 'refresh'))
+        writes.append((LEVEL_ZONES_TABLE, zones, ZONE_COLUMNS, 'refresh'))
+        metrics.add_rows(len(zones))
+
+def write_results(result, db_path=DEFAULT_DB_PATH):
+    """
+    ワーカーの結果をデータベースに書き込みます（親プロセスでのみ呼び出します）。
+
+    ウォーターマークはすべての書き込みが成功した後に更新します。
+    mode が 'refresh' の書き込みは、そのシンボルの既存の行を同じトランザクション内で削除してから書き込みます
+    （5番目の要素に (条件, パラメータ) がある場合は、その条件にも一致する行だけを削除します）。
+
+    Args:
+        result (dict): run_symbol_pipeline の戻り値
+        db_path (str): データベースのパス
+
+    Returns:
+        int: 書き込んだ行数
+    """
+    rows = 0
+    for table, df, columns, mode, *scope in result['writes']:
+        if mode == 'refresh':
+            where, params = scope[0] if scope else ('', ())
+            with data_access.connection(db_path) as conn:
+                conn.execute(f"DELETE FROM {table} WHERE symbol = ?" + (f" AND {where}" if where else ''),
+                             (result['symbol'], *params))
+                rows += bulk_write_frame(db_path, table, df, columns, conn=conn).rows
+        elif not df.empty:
+            rows += bulk_write_frame(db_path, table, df, columns, mode=mode).rows
+    for interval, stage, last_timestamp in result['watermarks']:
+        set_watermark(db_path, result['symbol'], interval, stage, last_timestamp)
+    return rows
+
+def run_pipeline(symbols=None, db_path=DEFAULT_DB_PATH, max_workers=None, fetch=True,
+                 profile=None, trace_memory=False, trace_sql=False):
+    """
+    シンボルごとのパイプラインをプロセスプールで並列に実行します。
+
+    同時に実行中のタスク数は max_workers の2倍までに制限し、
+    書き込みは親プロセスがタスクの完了順に1つずつ行います。
+
+    Args:
+        symbols (list): 対象のシンボル（省略時は登録済みのすべて）
+        db_path (str): データベースのパス
+        max_workers (int): ワーカープロセス数（省略時はCPU数）
+        fetch (bool): ヒストリカルデータを取得するか
+        profile (str): ステージごとのプロファイル（'cprofile' または 'pyinstrument'）
+        trace_memory (bool): ステージごとのピークメモリを計測するか
+        trace_sql (bool): ステージごとの SQLite のクエリ数と実行時間を計測するか
+
+    Returns:
+        list: シンボルごとの symbol, rows, timings, error を持つ辞書のリスト
+    """
+    setup_database(db_path)
+    max_workers = max_workers or os.cpu_count() or 1
+    queue = iter(get_symbols(symbols))
+    instrument = {'memory': trace_memory, 'profile': profile, 'trace_sql': trace_sql}
+    summaries = []
+
+    with Instrumentation('pipeline_runner', **instrument) as run, \
+            ProcessPoolExecutor(max_workers=max_workers) as pool:
+        pending = set()
+
+        def submit_next():
+            symbol = next(queue, None)
+            if symbol is not None:
+                pending.add(pool.submit(run_symbol_pipeline, symbol, db_path, fetch, instrument))
+
+        for _ in range(max_workers * 2):
+            submit_next()
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.remove(future)
+                submit_next()
+                result = future.result()
+                run.extend(result['metrics'])
+                rows = 0
+                if result['error'] is None:
+                    with run.stage('write', result['symbol']) as metrics:
+                        rows = write_results(result, db_path)
+                        metrics.add_rows(rows)
+                timings = run.timings(result['symbol'])
+                summary = {'symbol': result['symbol'], 'rows': rows,
+                           'timings': timings, 'error': result['error']}
+                summaries.append(summary)
+                stages = ', '.join(f"{k}={v:.3f}s" for k, v in timings.items())
+                logging.info(f"{result['symbol']}: {rows}行 {stages} error={result['error']}")
+    run.save(db_path)
+    return summaries
+
+def main():
+    parser = argparse.ArgumentParser(description='シンボルごとのパイプラインを並列に実行します')
+    parser.add_argument('--symbol', action='append', dest='symbols',
+                        help='対象のシンボル（複数指定可、省略時は登録済みのすべて）')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--db-path', default=DEFAULT_DB_PATH)
+    parser.add_argument('--no-fetch', action='store_true', help='ヒストリカルデータを取得しない')
+    parser.add_argument('--profile', choices=PROFILERS, default=None,
+                        help='ステージごとのプロファイルを logs/profiles に出力する')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='tracemalloc でステージごとのピークメモリを計測する')
+    parser.add_argument('--trace-sql', action='store_true',
+                        help='SQLite のクエリ数と実行時間を計測する（書き込みが遅くなります）')
+    args = parser.parse_args()
+
+    summaries = run_pipeline(args.symbols, args.db_path, args.workers, fetch=not args.no_fetch,
+                             profile=args.profile, trace_memory=args.trace_memory, trace_sql=args.trace_sql)
+    for summary in summaries:
+        total = sum(summary['timings'].values())
+        status = 'OK' if summary['error'] is None else f"NG ({summary['error']})"
+        print(f"{summary['symbol']}: {status} {summary['rows']}行 {total:.2f}s")
+
+if __name__ == "__main__":
+    main()
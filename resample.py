@@ -0,0 +1,203 @@
+# scripts/resample.py
+
+import argparse
+
+import pandas as pd
+
+import data_access
+from bulk_writer import bulk_write_frame
+from data_access import DEFAULT_DB_PATH, OHLC_COLUMNS
+from watermark import get_watermark, set_watermark
+from symbols import get_symbols, DEFAULT_SYMBOL
+
+# 保存する基準の間隔（これより上位の間隔はこの系列から生成する）
+BASE_INTERVAL = '15m'
+
+# 間隔名と pandas のリサンプリング規則（短い順）
+# 週足は日曜始まり（MT5の週足と同じ）、各バーのラベルは期間の開始時刻とする
+RESAMPLE_RULES = {
+    '1m': '1min',
+    '5m': '5min',
+    '15m': '15min',
+    '30m': '30min',
+    '1h': '1h',
+    '4h': '4h',
+    'daily': '1D',
+    'weekly': 'W-SUN',
+    'monthly': 'MS',
+}
+
+# 基準の系列から生成する間隔
+DERIVED_INTERVALS = ['1h', 'daily', 'weekly']
+
+STAGE_PREFIX = 'resample'
+
+_AGGREGATIONS = {'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'}
+
+def resample_bars(bars, interval):
+    """
+    OHLCVのバーを上位の間隔に集計します。
+
+    Args:
+        bars (pd.DataFrame): timestamp をインデックスとする価格データ
+        interval (str): 集計後の間隔（RESAMPLE_RULES のキー）
+
+    Returns:
+        pd.DataFrame: timestamp（期間の開始時刻）をインデックスとする価格データ
+    """
+    if interval not in RESAMPLE_RULES:
+        raise ValueError(f"未対応の間隔です: {interval}")
+    if bars.empty:
+        return bars[OHLC_COLUMNS].copy()
+
+    resampled = (bars[OHLC_COLUMNS]
+                 .resample(RESAMPLE_RULES[interval], closed='left', label='left')
+                 .agg(_AGGREGATIONS))
+    # バーが存在しない期間（週末など）は除外する
+    resampled = resampled[resampled['open'].notna()]
+    resampled.index.name = 'timestamp'
+    return resampled
+
+def resample_ticks(ticks, interval, price_column='bid'):
+    """
+    ティックデータからOHLCVのバーを作成します。
+
+    Args:
+        ticks (pd.DataFrame): timestamp をインデックスとするティックデータ
+        interval (str): バーの間隔（RESAMPLE_RULES のキー）
+        price_column (str): 価格として使う列
+            （volume 列がない場合はティック数を出来高とする）
+
+    Returns:
+        pd.DataFrame: timestamp をインデックスとする価格データ
+    """
+    rule = RESAMPLE_RULES[interval]
+    grouped = ticks.resample(rule, closed='left', label='left')
+    bars = grouped[price_column].ohlc()
+    bars['volume'] = (grouped['volume'].sum() if 'volume' in ticks.columns
+                      else grouped[price_column].count()).astype('float64')
+    bars = bars[bars['open'].notna()]
+    bars.index.name = 'timestamp'
+    return bars
+
+def stage_name(interval):
+    """
+    リサンプリング結果のウォーターマークに使う処理段階名を返します。
+    """
+    return f'{STAGE_PREFIX}:{interval}'
+
+def base_since(watermark):
+    """
+    前回の最後の（未確定の可能性がある）バーを再集計するために必要な基準バーの開始位置を返します。
+
+    load_ohlc の since は排他的なため、ウォーターマークの直前を返します。
+
+    Args:
+        watermark: 前回生成した最後のバーの開始時刻（未生成の場合は None）
+
+    Returns:
+        pd.Timestamp: load_ohlc に渡す since（未生成の場合は None）
+    """
+    if watermark is None:
+        return None
+    return pd.Timestamp(watermark) - pd.Timedelta(seconds=1)
+
+def derive_new_bars(base_bars, interval, watermark=None):
+    """
+    基準のバーのうちウォーターマーク以降の部分から上位の間隔のバーを作成します。
+
+    前回の最後のバーは、その後に追加された基準のバーを含めて作り直されます。
+
+    Args:
+        base_bars (pd.DataFrame): timestamp をインデックスとする基準の価格データ
+        interval (str): 作成する間隔
+        watermark: 前回生成した最後のバーの開始時刻
+
+    Returns:
+        pd.DataFrame: 新規または更新されたバー
+    """
+    if watermark is not None:
+        base_bars = base_bars[base_bars.index >= pd.Timestamp(watermark)]
+    return resample_bars(base_bars, interval)
+
+def find_base_interval(symbol, db_path=DEFAULT_DB_PATH):
+    """
+    シンボルの保存済みの間隔のうち、最も短いものを返します。
+
+    Args:
+        symbol (str): シンボル名
+        db_path (str): データベースのパス
+
+    Returns:
+        str: 間隔名（保存済みのデータがない場合は None）
+    """
+    with data_access.connection(db_path) as conn:
+        stored = {row[0] for row in conn.execute(
+            "SELECT DISTINCT interval FROM price_data WHERE symbol = ?", (symbol,))}
+    for interval in RESAMPLE_RULES:
+        if interval in stored:
+            return interval
+    return None
+
+def update_derived_bars(symbol, intervals=DERIVED_INTERVALS, base_interval=None,
+                        db_path=DEFAULT_DB_PATH, full_refresh=False):
+    """
+    基準の系列から上位の間隔のバーを作成し、price_data に保存します。
+
+    生成済みの位置をウォーターマークで管理し、前回の最後のバー以降だけを集計し直します。
+
+    Args:
+        symbol (str): シンボル名
+        intervals (list): 作成する間隔
+        base_interval (str): 基準の間隔（省略時は保存済みの最も短い間隔）
+        db_path (str): データベースのパス
+        full_refresh (bool): True の場合はウォーターマークを無視して全期間を集計
+
+    Returns:
+        dict: 間隔ごとの書き込んだ行数
+    """
+    base_interval = base_interval or find_base_interval(symbol, db_path)
+    if base_interval is None:
+        print(f"{symbol}: 価格データが存在しません")
+        return {}
+
+    base_rank = list(RESAMPLE_RULES).index(base_interval)
+    targets = [i for i in intervals if list(RESAMPLE_RULES).index(i) > base_rank]
+    watermarks = {i: None if full_refresh else get_watermark(db_path, symbol, i, stage_name(i))
+                  for i in targets}
+
+    # すべての間隔で必要になる最も古い位置から、基準のバーを1回だけ読み込む
+    starts = [base_since(w) for w in watermarks.values()]
+    since = None if not starts or None in starts else min(starts)
+    base_bars = data_access.load_ohlc(symbol, base_interval, since=since, db_path=db_path)
+
+    written = {}
+    for interval in targets:
+        bars = derive_new_bars(base_bars, interval, watermarks[interval])
+        if bars.empty:
+            written[interval] = 0
+            continue
+        df = bars.reset_index().assign(symbol=symbol, interval=interval)
+        result = bulk_write_frame(db_path, 'price_data', df,
+                                  ['timestamp'] + OHLC_COLUMNS + ['symbol', 'interval'], mode='replace')
+        set_watermark(db_path, symbol, interval, stage_name(interval), bars.index[-1])
+        written[interval] = result.rows
+        print(f"{symbol} {interval}: {base_interval}から{result.rows}本のバーを生成しました")
+    return written
+
+def main():
+    parser = argparse.ArgumentParser(description='基準の系列から上位の間隔のバーを生成します')
+    parser.add_argument('--symbol', action='append', dest='symbols')
+    parser.add_argument('--interval', action='append', dest='intervals',
+                        help=f"生成する間隔（省略時は {', '.join(DERIVED_INTERVALS)}）")
+    parser.add_argument('--base-interval', default=None)
+    parser.add_argument('--db-path', default=DEFAULT_DB_PATH)
+    parser.add_argument('--full-refresh', action='store_true')
+    args = parser.parse_args()
+
+    for symbol in get_symbols(args.symbols or [DEFAULT_SYMBOL]):
+        update_derived_bars(symbol, args.intervals or DERIVED_INTERVALS, args.base_interval,
+                            args.db_path, full_refresh=args.full_refresh)
+
+if __name__ == "__main__":
+    main()
@@ -1,80 +1,503 @@
-# scripts/setup_database.py
-
-import sqlite3
-import os
-
-def setup_database(db_path='data/eurusd_trading.db'):
-    """
-    SQLiteデータベースと必要なテーブルを作成します。
-    
-    Args:
-        db_path (str): データベースのパス
-    """
-    os.makedirs(os.path.dirname(db_path), exist_ok=True)
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    # 既存のテーブルを削除（スキーマ変更のため）
-    cursor.execute('DROP TABLE IF EXISTS price_data')
-    cursor.execute('DROP TABLE IF EXISTS pivot_points')
-    cursor.execute('DROP TABLE IF EXISTS price_levels')
-    cursor.execute('DROP TABLE IF EXISTS combined_price_levels')
-    
-    # price_dataテーブルの作成（複合主キー）
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS price_data (
-        timestamp TEXT,
-        symbol TEXT,
-        open REAL,
-        high REAL,
-        low REAL,
-        close REAL,
-        volume REAL,
-        interval TEXT,
-        PRIMARY KEY (timestamp, interval)
-    )
-    ''')
-    
-    # pivot_pointsテーブルの作成
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS pivot_points (
-        timestamp TEXT,
-        Pivot REAL,
-        Support1 REAL,
-        Resistance1 REAL,
-        Support2 REAL,
-        Resistance2 REAL,
-        symbol TEXT,
-        interval TEXT,
-        PRIMARY KEY (timestamp, interval)
-    )
-    ''')
-    
-    # price_levelsテーブルの作成
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS price_levels (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        timestamp TEXT,
-        symbol TEXT,
-        interval TEXT,
-        level REAL,
-        type TEXT,
-        UNIQUE(timestamp, symbol, interval, level, type)
-    )
-    ''')
-    
-    # combined_price_levelsテーブルの作成
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS combined_price_levels (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        symbol TEXT,
-        level REAL
-    )
-    ''')
-    
-    conn.commit()
-    conn.close()
-    print(f"Database setup completed: {db_path}")
-
-if __name__ == "__main__":
-    setup_database()
+# scripts/setup_database.py
+
+import sqlite3
+import os
+import argparse
+
+from data_access import timestamp_storage
+
+# 各モジュールのテーブル定義（マイグレーションと、各モジュールでテーブルがない場合の作成に使う）
+WATERMARK_TABLE = 'pipeline_watermarks'
+
+WATERMARK_DDL = f'''
+CREATE TABLE IF NOT EXISTS {WATERMARK_TABLE} (
+    symbol TEXT NOT NULL,
+    interval TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    last_timestamp TEXT,
+    updated_at TEXT,
+    PRIMARY KEY (symbol, interval, stage)
+)
+'''
+
+IMPORT_PROGRESS_TABLE = 'import_progress'
+
+IMPORT_PROGRESS_DDL = f'''
+CREATE TABLE IF NOT EXISTS {IMPORT_PROGRESS_TABLE} (
+    path TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    interval TEXT NOT NULL,
+    file_size INTEGER,
+    head_hash TEXT,
+    rows_read INTEGER NOT NULL DEFAULT 0,
+    rows_inserted INTEGER NOT NULL DEFAULT 0,
+    completed INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT,
+    PRIMARY KEY (path, symbol, interval)
+)
+'''
+
+OPTIMIZATION_RESULTS_TABLE = 'optimization_results'
+
+OPTIMIZATION_RESULTS_DDL = f'''
+CREATE TABLE IF NOT EXISTS {OPTIMIZATION_RESULTS_TABLE} (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT NOT NULL,
+    symbol TEXT,
+    interval TEXT,
+    method TEXT,
+    sma_short_period INTEGER,
+    sma_long_period INTEGER,
+    atr_period INTEGER,
+    bb_period INTEGER,
+    bb_dev REAL,
+    risk_percent REAL,
+    final_value REAL,
+    total_return REAL,
+    max_drawdown REAL,
+    sharpe REAL,
+    num_trades INTEGER,
+    created_at TEXT
+)
+'''
+
+OPTIMIZATION_RESULTS_INDEX_DDL = f'''
+CREATE INDEX IF NOT EXISTS idx_optimization_results_run
+ON {OPTIMIZATION_RESULTS_TABLE} (run_id, final_value)
+'''
+
+LEVEL_SCORES_TABLE = 'level_scores'
+
+LEVEL_SCORES_DDL = f'''
+CREATE TABLE IF NOT EXISTS {LEVEL_SCORES_TABLE} (
+    symbol TEXT NOT NULL,
+    interval TEXT NOT NULL,
+    level REAL NOT NULL,
+    touches INTEGER,
+    rejections INTEGER,
+    breaks INTEGER,
+    score REAL,
+    bars INTEGER,
+    updated_at TEXT,
+    PRIMARY KEY (symbol, interval, level)
+)
+'''
+
+LEVEL_ZONES_TABLE = 'level_zones'
+
+LEVEL_ZONES_DDL = f'''
+CREATE TABLE IF NOT EXISTS {LEVEL_ZONES_TABLE} (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    symbol TEXT NOT NULL,
+    level REAL NOT NULL,
+    lower REAL,
+    upper REAL,
+    weight REAL,
+    count INTEGER,
+    intervals INTEGER,
+    updated_at TEXT
+)
+'''
+
+LEVEL_ZONES_INDEX_DDL = f'''
+CREATE INDEX IF NOT EXISTS idx_level_zones_symbol_level
+ON {LEVEL_ZONES_TABLE} (symbol, level)
+'''
+
+METRICS_TABLE = 'pipeline_metrics'
+
+METRICS_DDL = f'''
+CREATE TABLE IF NOT EXISTS {METRICS_TABLE} (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT NOT NULL,
+    run_name TEXT,
+    stage TEXT NOT NULL,
+    symbol TEXT,
+    interval TEXT,
+    started_at TEXT,
+    seconds REAL,
+    cpu_seconds REAL,
+    rows INTEGER,
+    queries INTEGER,
+    query_seconds REAL,
+    peak_memory_mb REAL,
+    max_rss_mb REAL,
+    profile_path TEXT,
+    status TEXT
+)
+'''
+
+METRICS_INDEX_DDL = f'''
+CREATE INDEX IF NOT EXISTS idx_pipeline_metrics_stage
+ON {METRICS_TABLE} (stage, started_at)
+'''
+
+# スキーマのマイグレーション（バージョン, 説明, SQL文のリスト）
+# 既存のデータを保持したまま、未適用のものだけを順番に適用します。
+MIGRATIONS = [
+    (1, '初期スキーマ', [
+        '''
+        CREATE TABLE IF NOT EXISTS price_data (
+            timestamp TEXT,
+            symbol TEXT,
+            open REAL,
+            high REAL,
+            low REAL,
+            close REAL,
+            volume REAL,
+            interval TEXT,
+            PRIMARY KEY (timestamp, interval)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS pivot_points (
+            timestamp TEXT,
+            Pivot REAL,
+            Support1 REAL,
+            Resistance1 REAL,
+            Support2 REAL,
+            Resistance2 REAL,
+            symbol TEXT,
+            interval TEXT,
+            PRIMARY KEY (timestamp, interval)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS price_levels (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT,
+            symbol TEXT,
+            interval TEXT,
+            level REAL,
+            type TEXT,
+            UNIQUE(timestamp, symbol, interval, level, type)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS combined_price_levels (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            symbol TEXT,
+            level REAL
+        )
+        ''',
+    ]),
+    # (symbol, interval, timestamp) を主キーとする WITHOUT ROWID テーブルに変換し、
+    # 主キーそのものがローダーのクエリ（絞り込み + timestamp 順）を満たすようにする
+    (2, 'price_data と pivot_points を (symbol, interval, timestamp) 主キーの WITHOUT ROWID テーブルに変換', [
+        '''
+        CREATE TABLE price_data_new (
+            timestamp TEXT NOT NULL,
+            symbol TEXT NOT NULL,
+            open REAL,
+            high REAL,
+            low REAL,
+            close REAL,
+            volume REAL,
+            interval TEXT NOT NULL,
+            PRIMARY KEY (symbol, interval, timestamp)
+        ) WITHOUT ROWID
+        ''',
+        '''
+        INSERT OR IGNORE INTO price_data_new
+        SELECT timestamp, COALESCE(symbol, 'EURUSD'), open, high, low, close, volume, interval
+        FROM price_data
+        WHERE timestamp IS NOT NULL AND interval IS NOT NULL
+        ''',
+        'DROP TABLE price_data',
+        'ALTER TABLE price_data_new RENAME TO price_data',
+        '''
+        CREATE TABLE pivot_points_new (
+            timestamp TEXT NOT NULL,
+            Pivot REAL,
+            Support1 REAL,
+            Resistance1 REAL,
+            Support2 REAL,
+            Resistance2 REAL,
+            symbol TEXT NOT NULL,
+            interval TEXT NOT NULL,
+            PRIMARY KEY (symbol, interval, timestamp)
+        ) WITHOUT ROWID
+        ''',
+        '''
+        INSERT OR IGNORE INTO pivot_points_new
+        SELECT timestamp, Pivot, Support1, Resistance1, Support2, Resistance2,
+               COALESCE(symbol, 'EURUSD'), interval
+        FROM pivot_points
+        WHERE timestamp IS NOT NULL AND interval IS NOT NULL
+        ''',
+        'DROP TABLE pivot_points',
+        'ALTER TABLE pivot_points_new RENAME TO pivot_points',
+    ]),
+    (3, 'カバリングインデックスとウォーターマークテーブルを追加', [
+        '''
+        CREATE INDEX IF NOT EXISTS idx_price_levels_symbol_interval_timestamp
+        ON price_levels (symbol, interval, timestamp, level, type)
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_combined_price_levels_symbol
+        ON combined_price_levels (symbol, level)
+        ''',
+        WATERMARK_DDL,
+    ]),
+    (4, 'filtered_price_levels とパイプラインのステージ状態テーブルを追加', [
+        '''
+        CREATE TABLE IF NOT EXISTS filtered_price_levels (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            symbol TEXT,
+            interval TEXT,
+            level REAL
+        )
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_filtered_price_levels_symbol_interval
+        ON filtered_price_levels (symbol, interval, level)
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS pipeline_stage_state (
+            pipeline TEXT NOT NULL,
+            stage TEXT NOT NULL,
+            input_fingerprint TEXT,
+            output_fingerprint TEXT,
+            persisted INTEGER NOT NULL DEFAULT 0,
+            updated_at TEXT,
+            PRIMARY KEY (pipeline, stage)
+        )
+        ''',
+    ]),
+    (5, 'ヒストリーファイルのインポート進捗テーブルを追加', [
+        IMPORT_PROGRESS_DDL,
+    ]),
+    (6, 'パラメータ探索の結果テーブルを追加', [
+        OPTIMIZATION_RESULTS_DDL,
+        OPTIMIZATION_RESULTS_INDEX_DDL,
+    ]),
+    (7, '価格レベルのスコアテーブルを追加', [
+        LEVEL_SCORES_DDL,
+    ]),
+    (8, '複数の時間足を統合した価格帯（ゾーン）テーブルを追加', [
+        LEVEL_ZONES_DDL,
+        LEVEL_ZONES_INDEX_DDL,
+    ]),
+    (9, 'ステージごとの計測結果テーブルを追加', [
+        METRICS_DDL,
+        METRICS_INDEX_DDL,
+    ]),
+]
+
+# timestamp を INTEGER（エポックミリ秒）で保存する場合のテーブル定義
+EPOCH_TIMESTAMP_TABLES = {
+    'price_data': (
+        '''
+        CREATE TABLE price_data_new (
+            timestamp INTEGER NOT NULL,
+            symbol TEXT NOT NULL,
+            open REAL,
+            high REAL,
+            low REAL,
+            close REAL,
+            volume REAL,
+            interval TEXT NOT NULL,
+            PRIMARY KEY (symbol, interval, timestamp)
+        ) WITHOUT ROWID
+        ''',
+        ['timestamp', 'symbol', 'open', 'high', 'low', 'close', 'volume', 'interval'],
+    ),
+    'pivot_points': (
+        '''
+        CREATE TABLE pivot_points_new (
+            timestamp INTEGER NOT NULL,
+            Pivot REAL,
+            Support1 REAL,
+            Resistance1 REAL,
+            Support2 REAL,
+            Resistance2 REAL,
+            symbol TEXT NOT NULL,
+            interval TEXT NOT NULL,
+            PRIMARY KEY (symbol, interval, timestamp)
+        ) WITHOUT ROWID
+        ''',
+        ['timestamp', 'Pivot', 'Support1', 'Resistance1', 'Support2', 'Resistance2', 'symbol', 'interval'],
+    ),
+}
+
+# 主要なローダーが発行するクエリ（実行計画の確認用）
+HOT_QUERIES = {
+    'price_data by series': (
+        '''
+        SELECT timestamp, open, high, low, close, volume
+        FROM price_data
+        WHERE symbol = ? AND interval = ?
+        ORDER BY timestamp ASC
+        ''',
+        ('EURUSD', 'daily'),
+    ),
+    'price_data since watermark': (
+        '''
+        SELECT timestamp, open, high, low, close
+        FROM price_data
+        WHERE symbol = ? AND interval = ? AND timestamp > ?
+        ORDER BY timestamp ASC
+        ''',
+        ('EURUSD', 'daily', ''),
+    ),
+    'pivot_points by series': (
+        '''
+        SELECT timestamp, Pivot, Support1, Resistance1, Support2, Resistance2
+        FROM pivot_points
+        WHERE symbol = ? AND interval = ? AND timestamp > ?
+        ORDER BY timestamp ASC
+        ''',
+        ('EURUSD', 'daily', ''),
+    ),
+    'price_levels by series': (
+        '''
+        SELECT timestamp, level, type
+        FROM price_levels
+        WHERE symbol = ? AND interval = ?
+        ORDER BY timestamp ASC
+        ''',
+        ('EURUSD', 'daily'),
+    ),
+}
+
+def get_schema_version(conn):
+    """
+    適用済みのスキーマバージョンを取得します。
+
+    Args:
+        conn (sqlite3.Connection): SQLite接続
+
+    Returns:
+        int: スキーマバージョン
+    """
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def apply_migrations(conn):
+    """
+    未適用のマイグレーションを順番に適用し、統計情報を更新します。
+
+    各マイグレーションは1つのトランザクション内で適用されます。
+
+    Args:
+        conn (sqlite3.Connection): SQLite接続（isolation_level=None）
+
+    Returns:
+        list: 適用したマイグレーションのバージョン
+    """
+    current = get_schema_version(conn)
+    applied = []
+    for version, description, statements in MIGRATIONS:
+        if version <= current:
+            continue
+        conn.execute('BEGIN')
+        try:
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f'PRAGMA user_version = {version}')
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        print(f"マイグレーション {version} を適用しました: {description}")
+        applied.append(version)
+
+    if applied:
+        conn.execute('ANALYZE')
+    conn.execute('PRAGMA optimize')
+    return applied
+
+def convert_timestamps_to_epoch(conn):
+    """
+    price_data と pivot_points の timestamp 列を TEXT から INTEGER（エポックミリ秒）に変換します。
+
+    既に変換済みのテーブルはそのままにします。既存の行はすべて1つのトランザクション内で移行されます。
+
+    Args:
+        conn (sqlite3.Connection): SQLite接続（isolation_level=None）
+
+    Returns:
+        list: 変換したテーブル名
+    """
+    converted = []
+    conn.execute('BEGIN')
+    try:
+        for table, (ddl, columns) in EPOCH_TIMESTAMP_TABLES.items():
+            if timestamp_storage(conn, table) == 'epoch_ms':
+                continue
+            select = ', '.join(
+                "CAST(strftime('%s', timestamp) AS INTEGER) * 1000" if c == 'timestamp' else c
+                for c in columns
+            )
+            conn.execute(ddl)
+            conn.execute(f"INSERT OR IGNORE INTO {table}_new ({', '.join(columns)}) "
+                         f"SELECT {select} FROM {table} WHERE timestamp IS NOT NULL")
+            conn.execute(f'DROP TABLE {table}')
+            conn.execute(f'ALTER TABLE {table}_new RENAME TO {table}')
+            converted.append(table)
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+
+    if converted:
+        conn.execute('ANALYZE')
+        print(f"timestamp をエポックミリ秒に変換しました: {', '.join(converted)}")
+    return converted
+
+def check_query_plans(db_path='data/eurusd_trading.db'):
+    """
+    主要なローダーのクエリ実行計画を確認し、全表スキャンや一時ソートを検出します。
+
+    Args:
+        db_path (str): データベースのパス
+
+    Returns:
+        dict: クエリ名ごとの問題のある実行計画（問題がなければ空のリスト）
+    """
+    conn = sqlite3.connect(db_path)
+    problems = {}
+    for name, (query, params) in HOT_QUERIES.items():
+        plan = conn.execute(f'EXPLAIN QUERY PLAN {query}', params).fetchall()
+        details = [row[-1] for row in plan]
+        problems[name] = [d for d in details if d.startswith('SCAN') or 'TEMP B-TREE' in d]
+    conn.close()
+    return problems
+
+def setup_database(db_path='data/eurusd_trading.db', epoch_timestamps=False):
+    """
+    SQLiteデータベースと必要なテーブルを作成し、スキーマを最新の状態に移行します。
+
+    既存のテーブルは削除せず、未適用のマイグレーションのみを適用します。
+
+    Args:
+        db_path (str): データベースのパス
+        epoch_timestamps (bool): True の場合は price_data と pivot_points の timestamp を
+            INTEGER（エポックミリ秒）で保存する（既存のデータも変換）
+    """
+    os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    apply_migrations(conn)
+    if epoch_timestamps:
+        convert_timestamps_to_epoch(conn)
+    version = get_schema_version(conn)
+    conn.close()
+    print(f"Database setup completed: {db_path} (schema version {version})")
+
+def main():
+    parser = argparse.ArgumentParser(description='データベースのセットアップとマイグレーション')
+    parser.add_argument('--db-path', default='data/eurusd_trading.db')
+    parser.add_argument('--epoch-timestamps', action='store_true',
+                        help='timestamp を INTEGER（エポックミリ秒）で保存する')
+    args = parser.parse_args()
+
+    db_path = args.db_path
+    setup_database(db_path, epoch_timestamps=args.epoch_timestamps)
+
+    for name, problems in check_query_plans(db_path).items():
+        if problems:
+            print(f"[NG] {name}: {'; '.join(problems)}")
+        else:
+            print(f"[OK] {name}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+# scripts/storage.py
+
+import os
+import glob
+
+import pandas as pd
+
+import data_access
+from bulk_writer import bulk_write_frame
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquetバックエンドを使用しない場合は不要
+    pa = None
+    pq = None
+
+# Parquetファイルの保存先
+DEFAULT_PARQUET_ROOT = os.path.join('data', 'parquet')
+
+PRICE_COLUMNS = ['timestamp'] + data_access.OHLC_COLUMNS
+
+class SQLiteBackend:
+    """
+    SQLiteの price_data テーブルを使う価格データの保存先。
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, db_path=data_access.DEFAULT_DB_PATH):
+        self.db_path = db_path
+
+    def load_ohlc(self, symbol, interval, since=None, until=None, use_cache=True):
+        """
+        価格データを読み込みます（data_access.load_ohlc と同じ形式）。
+        """
+        return data_access.load_ohlc(symbol, interval, since=since, until=until,
+                                     db_path=self.db_path, use_cache=use_cache)
+
+    def time_range(self, symbol, interval):
+        """
+        シリーズの最初と最後のタイムスタンプを返します。
+        """
+        with data_access.connection(self.db_path) as conn:
+            first, last = conn.execute(
+                "SELECT MIN(timestamp), MAX(timestamp) FROM price_data WHERE symbol = ? AND interval = ?",
+                (symbol, interval)
+            ).fetchone()
+        if first is None:
+            return None, None
+        return data_access.parse_timestamps([first, last])
+
+    def write_ohlc(self, df, symbol, interval):
+        """
+        timestamp をインデックスとする価格データを書き込みます。既存のバーは上書きします。
+
+        Returns:
+            int: 書き込んだ行数
+        """
+        df = df.reset_index().assign(symbol=symbol, interval=interval)
+        result = bulk_write_frame(self.db_path, 'price_data', df,
+                                  PRICE_COLUMNS + ['symbol', 'interval'], mode='replace')
+        return result.rows
+
+    def list_series(self):
+        """
+        保存されている (シンボル, 間隔) の一覧を返します。
+        """
+        with data_access.connection(self.db_path) as conn:
+            return conn.execute(
+                "SELECT DISTINCT symbol, interval FROM price_data ORDER BY symbol, interval"
+            ).fetchall()
+
+class ParquetBackend:
+    """
+    シンボル/間隔/年ごとに分割したParquetファイルを使う価格データの保存先。
+
+    ファイルは root/symbol=<シンボル>/interval=<間隔>/year=<年>/data.parquet に配置され、
+    読み込み時はメモリマップしたArrowテーブルから直接データフレームを作ります。
+    """
+
+    name = 'parquet'
+
+    def __init__(self, root=DEFAULT_PARQUET_ROOT):
+        if pq is None:
+            raise ImportError("Parquetバックエンドには pyarrow が必要です（pip install pyarrow）")
+        self.root = root
+
+    def _series_dir(self, symbol, interval):
+        return os.path.join(self.root, f'symbol={symbol}', f'interval={interval}')
+
+    def _year_path(self, symbol, interval, year):
+        return os.path.join(self._series_dir(symbol, interval), f'year={year}', 'data.parquet')
+
+    def _years(self, symbol, interval):
+        pattern = os.path.join(self._series_dir(symbol, interval), 'year=*', 'data.parquet')
+        years = [int(os.path.basename(os.path.dirname(p)).split('=')[1]) for p in glob.glob(pattern)]
+        return sorted(years)
+
+    def _read_year(self, symbol, interval, year):
+        table = pq.read_table(self._year_path(symbol, interval, year), memory_map=True)
+        return table.to_pandas().set_index('timestamp')
+
+    def load_ohlc(self, symbol, interval, since=None, until=None, use_cache=True):
+        """
+        価格データを読み込みます（data_access.load_ohlc と同じ形式）。
+
+        since/until の範囲外の年のファイルは読み込みません。
+        ファイルはメモリマップで読むため use_cache は使用しません。
+        """
+        since = pd.Timestamp(since) if since is not None else None
+        until = pd.Timestamp(until) if until is not None else None
+        years = [y for y in self._years(symbol, interval)
+                 if (since is None or y >= since.year) and (until is None or y <= until.year)]
+        if not years:
+            return pd.DataFrame(columns=data_access.OHLC_COLUMNS,
+                                index=pd.DatetimeIndex([], name='timestamp'))
+
+        df = pd.concat([self._read_year(symbol, interval, y) for y in years])
+        if since is not None:
+            df = df[df.index > since]
+        if until is not None:
+            df = df[df.index <= until]
+        return df
+
+    def write_ohlc(self, df, symbol, interval):
+        """
+        timestamp をインデックスとする価格データを年ごとのファイルに書き込みます。
+
+        既存の年ファイルとは timestamp で突き合わせ、新しい値で上書きします。
+
+        Returns:
+            int: 書き込んだ行数
+        """
+        df = df[data_access.OHLC_COLUMNS].astype('float64')
+        df.index = pd.DatetimeIndex(df.index, name='timestamp')
+        existing_years = set(self._years(symbol, interval))
+
+        for year, part in df.groupby(df.index.year):
+            if year in existing_years:
+                part = pd.concat([self._read_year(symbol, interval, year), part])
+                part = part[~part.index.duplicated(keep='last')]
+            part = part.sort_index()
+
+            path = self._year_path(symbol, interval, year)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            table = pa.Table.from_pandas(part.reset_index(), preserve_index=False)
+            # 書き込み途中のファイルを読ませないよう、一時ファイル経由で置き換える
+            tmp_path = path + '.tmp'
+            pq.write_table(table, tmp_path)
+            os.replace(tmp_path, path)
+        return len(df)
+
+    def list_series(self):
+        """
+        保存されている (シンボル, 間隔) の一覧を返します。
+        """
+        series = []
+        for path in glob.glob(os.path.join(self.root, 'symbol=*', 'interval=*')):
+            interval = os.path.basename(path).split('=', 1)[1]
+            symbol = os.path.basename(os.path.dirname(path)).split('=', 1)[1]
+            series.append((symbol, interval))
+        return sorted(series)
+
+BACKENDS = {
+    SQLiteBackend.name: SQLiteBackend,
+    ParquetBackend.name: ParquetBackend,
+}
+
+def get_backend(kind='sqlite', **kwargs):
+    """
+    価格データの保存先を取得します。
+
+    Args:
+        kind (str): 'sqlite' または 'parquet'
+        **kwargs: バックエンドのコンストラクタ引数（db_path, root など）
+
+    Returns:
+        SQLiteBackend | ParquetBackend: 保存先
+    """
+    if kind not in BACKENDS:
+        raise ValueError(f"未対応のストレージバックエンドです: {kind}")
+    return BACKENDS[kind](**kwargs)
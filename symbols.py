@@ -0,0 +1,96 @@
+# scripts/symbols.py
+
+# 取引対象のシンボルと1pipの値幅
+SYMBOLS = {
+    # メジャー
+    'EURUSD': {'pip_size': 0.0001},
+    'GBPUSD': {'pip_size': 0.0001},
+    'USDJPY': {'pip_size': 0.01},
+    'USDCHF': {'pip_size': 0.0001},
+    'USDCAD': {'pip_size': 0.0001},
+    'AUDUSD': {'pip_size': 0.0001},
+    'NZDUSD': {'pip_size': 0.0001},
+    # ユーロクロス
+    'EURGBP': {'pip_size': 0.0001},
+    'EURJPY': {'pip_size': 0.01},
+    'EURCHF': {'pip_size': 0.0001},
+    'EURCAD': {'pip_size': 0.0001},
+    'EURAUD': {'pip_size': 0.0001},
+    'EURNZD': {'pip_size': 0.0001},
+    # ポンドクロス
+    'GBPJPY': {'pip_size': 0.01},
+    'GBPCHF': {'pip_size': 0.0001},
+    'GBPCAD': {'pip_size': 0.0001},
+    'GBPAUD': {'pip_size': 0.0001},
+    'GBPNZD': {'pip_size': 0.0001},
+    # 円クロス
+    'AUDJPY': {'pip_size': 0.01},
+    'NZDJPY': {'pip_size': 0.01},
+    'CADJPY': {'pip_size': 0.01},
+    'CHFJPY': {'pip_size': 0.01},
+    # その他のクロス
+    'AUDCAD': {'pip_size': 0.0001},
+    'AUDCHF': {'pip_size': 0.0001},
+    'AUDNZD': {'pip_size': 0.0001},
+    'CADCHF': {'pip_size': 0.0001},
+    'NZDCAD': {'pip_size': 0.0001},
+    'NZDCHF': {'pip_size': 0.0001},
+    # エキゾチック
+    'USDSGD': {'pip_size': 0.0001},
+    'USDHKD': {'pip_size': 0.0001},
+    'USDNOK': {'pip_size': 0.0001},
+    'USDSEK': {'pip_size': 0.0001},
+    'USDDKK': {'pip_size': 0.0001},
+    'USDPLN': {'pip_size': 0.0001},
+    'USDMXN': {'pip_size': 0.0001},
+    'USDZAR': {'pip_size': 0.0001},
+    'USDTRY': {'pip_size': 0.0001},
+    'USDCNH': {'pip_size': 0.0001},
+    'EURNOK': {'pip_size': 0.0001},
+    'EURSEK': {'pip_size': 0.0001},
+    'EURPLN': {'pip_size': 0.0001},
+    # 貴金属
+    'XAUUSD': {'pip_size': 0.1},
+    'XAGUSD': {'pip_size': 0.01},
+}
+
+DEFAULT_SYMBOL = 'EURUSD'
+
+def get_symbols(symbols=None):
+    """
+    処理対象のシンボルのリストを返します。
+
+    Args:
+        symbols (list): 対象を絞り込むシンボルのリスト（省略時は登録済みのすべて）
+
+    Returns:
+        list: シンボルのリスト
+    """
+    if symbols is None:
+        return list(SYMBOLS)
+    unknown = [s for s in symbols if s not in SYMBOLS]
+    if unknown:
+        raise ValueError(f"未登録のシンボルです: {', '.join(unknown)}")
+    return list(symbols)
+
+def pip_size(symbol):
+    """
+    シンボルの1pipの値幅を返します。
+
+    Args:
+        symbol (str): シンボル名
+
+    Returns:
+        float: 1pipの値幅
+    """
+    return SYMBOLS[symbol]['pip_size']
+
+def register_symbol(symbol, pip_size):
+    """
+    シンボルを登録します。
+
+    Args:
+        symbol (str): シンボル名
+        pip_size (float): 1pipの値幅
+    """
+    SYMBOLS[symbol] = {'pip_size': pip_size}
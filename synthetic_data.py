@@ -0,0 +1,109 @@
+# scripts/synthetic_data.py
+
+import zlib
+import numpy as np
+import pandas as pd
+from data_coverage import trading_calendar
+from data_quality import interval_step
+from symbols import pip_size
+
+# 生成するバーの既定の開始時刻
+DEFAULT_START = '2000-01-03'
+
+# 1分足1本あたりの値動きの標準偏差（pips）。長い間隔は時間の平方根に比例して大きくする
+MINUTE_VOLATILITY_PIPS = 1.0
+
+# 月足の1本あたりの長さ（値動きの大きさの計算にのみ使用）
+MONTH = pd.Timedelta(days=30)
+
+def series_seed(seed, symbol, interval):
+    """
+    シンボルと間隔ごとに異なり、実行ごとには変わらない乱数シードを返します。
+
+    Args:
+        seed (int): 基準の乱数シード
+        symbol (str): シンボル名
+        interval (str): データの間隔
+
+    Returns:
+        list: numpy.random.default_rng に渡すシード
+    """
+    # hash() はプロセスごとに変わるため crc32 を使う
+    return [seed, zlib.crc32(f'{symbol}:{interval}'.encode())]
+
+def bar_timestamps(n_bars, interval, start=DEFAULT_START):
+    """
+    start 以降の取引カレンダー上のバーの開始時刻を n_bars 本分返します（週末を除く）。
+
+    Args:
+        n_bars (int): バーの本数
+        interval (str): データの間隔
+        start: 最初のバーの開始時刻
+
+    Returns:
+        pd.DatetimeIndex: バーの開始時刻（昇順）
+    """
+    step = interval_step(interval) or MONTH
+    # 週末を除く分と月の長さの違いを見込んで多めに作ってから先頭を切り出す
+    end = pd.Timestamp(start) + step * (n_bars * 7 // 5 + 7)
+    return trading_calendar(start, end, interval)[:n_bars]
+
+def random_walk_ohlcv(n_bars, symbol='EURUSD', interval='1m', start=DEFAULT_START, seed=0):
+    """
+    ランダムウォークのOHLCVデータを生成します。
+
+    同じ引数には常に同じデータを返します。値動きの大きさはシンボルの pip の値幅と
+    間隔の長さに合わせ、終値は対数ランダムウォークとするため長い系列でも負になりません。
+
+    Args:
+        n_bars (int): バーの本数
+        symbol (str): シンボル名（symbols に登録済みのもの）
+        interval (str): データの間隔
+        start: 最初のバーの開始時刻
+        seed (int): 乱数シード
+
+    Returns:
+        pd.DataFrame: timestamp, open, high, low, close, volume 列を持つデータフレーム
+    """
+    timestamps = bar_timestamps(n_bars, interval, start)
+    n_bars = len(timestamps)
+    rng = np.random.default_rng(series_seed(seed, symbol, interval))
+
+    pip = pip_size(symbol)
+    base = 12000 * pip
+    minutes = (interval_step(interval) or MONTH) / pd.Timedelta(minutes=1)
+    sigma = MINUTE_VOLATILITY_PIPS * pip * np.sqrt(minutes) / base
+
+    close = base * np.exp(np.cumsum(rng.normal(0, sigma, n_bars)))
+    # 始値は前の終値からわずかに離す（窓開け）
+    open_ = np.empty(n_bars)
+    open_[:1] = base
+    open_[1:] = close[:-1]
+    open_ *= 1 + rng.normal(0, sigma / 10, n_bars)
+    wick = np.abs(rng.normal(0, sigma / 2, (2, n_bars))) * base
+    return pd.DataFrame({
+        'timestamp': timestamps,
+        'open': open_,
+        'high': np.maximum(open_, close) + wick[0],
+        'low': np.minimum(open_, close) - wick[1],
+        'close': close,
+        'volume': rng.integers(100, 10000, n_bars).astype('float64'),
+    })
+
+def make_dataset(n_bars, symbols=('EURUSD',), intervals=('1m',), start=DEFAULT_START, seed=0):
+    """
+    シンボルと間隔の組み合わせごとに random_walk_ohlcv で生成したデータを price_data の形式で返します。
+
+    Args:
+        n_bars (int): 1系列あたりのバーの本数
+        symbols (list): シンボル名のリスト
+        intervals (list): 間隔のリスト
+        start: 最初のバーの開始時刻
+        seed (int): 乱数シード
+
+    Returns:
+        pd.DataFrame: timestamp, open, high, low, close, volume, symbol, interval 列
+    """
+    frames = [random_walk_ohlcv(n_bars, symbol, interval, start, seed).assign(symbol=symbol, interval=interval)
+              for symbol in symbols for interval in intervals]
+    return pd.concat(frames, ignore_index=True)
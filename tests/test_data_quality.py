@@ -0,0 +1,49 @@
+# tests/test_data_quality.py
+
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from data_quality import clean_price_data
+from synthetic_data import random_walk_ohlcv
+
+def resend(df, position, delta=1e-4):
+    """
+    position のバーを終値だけ変えて直後にもう一度送った（再送された）データを返します。
+    """
+    copy = df.iloc[[position]].copy()
+    copy[['high', 'close']] += delta
+    return pd.concat([df.iloc[:position + 1], copy, df.iloc[position + 1:]], ignore_index=True)
+
+@pytest.mark.parametrize('keep', ['first', 'last'])
+@pytest.mark.parametrize('chunk_size', [1, 2, 151])
+def test_duplicate_across_chunk_boundary(keep, chunk_size):
+    # 再送されたバーの2行がチャンクの区切り（151行目と152行目）をまたぐ
+    df = resend(random_walk_ohlcv(300, interval='15m', seed=3), 150)
+
+    expected, expected_report = clean_price_data(df, '15m', keep=keep)
+    cleaned, report = clean_price_data(df, '15m', chunk_size=chunk_size, keep=keep)
+
+    pd.testing.assert_frame_equal(cleaned.reset_index(drop=True), expected.reset_index(drop=True))
+    assert report.counts == expected_report.counts
+    assert report['duplicates'] == 1
+    assert report['out_of_order'] == 0
+    resent = df.loc[151, 'close'] if keep == 'last' else df.loc[150, 'close']
+    assert cleaned.loc[cleaned['timestamp'] == df.loc[150, 'timestamp'], 'close'].item() == resent
+
+def test_spikes_removed_in_chunks_match_one_shot():
+    # 隣り合うスパイクの間の正常なバーは残す
+    df = random_walk_ohlcv(1500, interval='15m', seed=3)
+    df.loc[[1000, 1002], ['open', 'high', 'low', 'close']] *= 1.03
+
+    expected, expected_report = clean_price_data(df, '15m')
+    cleaned, report = clean_price_data(df, '15m', chunk_size=7)
+
+    pd.testing.assert_frame_equal(cleaned.reset_index(drop=True), expected.reset_index(drop=True))
+    assert report.counts == expected_report.counts
+    assert expected_report['outliers'] == 2
+    assert (expected['timestamp'] == df.loc[1001, 'timestamp']).any()
@@ -0,0 +1,169 @@
+# scripts/walk_forward.py
+
+import os
+import argparse
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from backtest_engine import DEFAULT_CASH
+from data_access import DEFAULT_DB_PATH
+from optimize_strategy import (PARAM_SPACE, METRIC_COLUMNS, SharedPrices, init_worker, worker_cache,
+                               grid_candidates, random_candidates, metric_score)
+
+# 学習期間と検証期間（バーの位置、stop は含まない）
+Fold = namedtuple('Fold', ['train_start', 'train_stop', 'test_start', 'test_stop'])
+
+def make_folds(n_bars, train_bars, test_bars, step=None, anchored=False):
+    """
+    ウォークフォワードの学習期間と検証期間の組を作ります。
+
+    Args:
+        n_bars (int): 系列全体のバー数
+        train_bars (int): 学習期間のバー数
+        test_bars (int): 検証期間のバー数
+        step (int): 次の組までにずらすバー数（省略時は test_bars）
+        anchored (bool): True の場合は学習期間の先頭を固定し、期間を伸ばしていく
+
+    Returns:
+        list: Fold のリスト
+    """
+    step = step or test_bars
+    folds = []
+    test_start = train_bars
+    while test_start + test_bars <= n_bars:
+        train_start = 0 if anchored else test_start - train_bars
+        folds.append(Fold(train_start, test_start, test_start, test_start + test_bars))
+        test_start += step
+    return folds
+
+def _run_fold(task):
+    # 学習期間で最良のパラメータを選び、続く検証期間で評価する（ワーカープロセスで実行）
+    index, fold, candidates, metric = task
+    cache = worker_cache()
+    if len(candidates) == 1:
+        best, train_result = candidates[0], None
+    else:
+        train_results = [cache.evaluate(p, fold.train_start, fold.train_stop) for p in candidates]
+        train_result = max(train_results, key=lambda r: metric_score(r, metric))
+        best = {k: train_result[k] for k in candidates[0]}
+    test_result = cache.evaluate(best, fold.test_start, fold.test_stop)
+
+    row = {'fold': index, **fold._asdict(), **best}
+    if train_result is not None:
+        row[f'train_{metric}'] = train_result[metric]
+    row.update({f'test_{k}': test_result[k] for k in METRIC_COLUMNS})
+    return row
+
+def _run_folds(df, tasks, max_workers=None):
+    max_workers = max_workers or os.cpu_count() or 1
+    # インジケーターは各ワーカーで系列全体に対して1回だけ計算し、期間ごとに切り出して使う
+    with SharedPrices(df) as prices, \
+            ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker,
+                                initargs=prices.spec) as pool:
+        rows = list(pool.map(_run_fold, tasks))
+
+    results = pd.DataFrame(rows)
+    if 'timestamp' in df.columns:
+        timestamps = df['timestamp'].reset_index(drop=True)
+        results['test_from'] = timestamps.iloc[results['test_start']].to_numpy()
+        results['test_to'] = timestamps.iloc[results['test_stop'] - 1].to_numpy()
+    return results
+
+def walk_forward(df, train_bars, test_bars, step=None, anchored=False, space=PARAM_SPACE,
+                 method='grid', n_iter=50, metric='final_value', max_workers=None, seed=0):
+    """
+    ウォークフォワード検証を行います。
+
+    各組で学習期間のパラメータ探索と検証期間のバックテストを行い、組ごとにプロセスプールで並列に実行します。
+
+    Args:
+        df (pd.DataFrame): open, close（と timestamp）列を持つ価格データ
+        train_bars (int): 学習期間のバー数
+        test_bars (int): 検証期間のバー数
+        step (int): 次の組までにずらすバー数（省略時は test_bars）
+        anchored (bool): True の場合は学習期間の先頭を固定する
+        space (dict): パラメータの候補
+        method (str): 'grid' または 'random'
+        n_iter (int): random で評価する組み合わせの数
+        metric (str): 学習期間で最適化する評価指標（LOWER_IS_BETTER の指標は最小化）
+        max_workers (int): ワーカープロセス数（省略時はCPU数）
+        seed (int): 乱数シード
+
+    Returns:
+        pd.DataFrame: 組ごとの最良のパラメータと検証期間の評価指標
+    """
+    if method not in ['grid', 'random']:
+        raise ValueError(f"ウォークフォワードで未対応の探索方法です: {method}")
+    candidates = grid_candidates(space) if method == 'grid' else random_candidates(space, n_iter, seed)
+    folds = make_folds(len(df), train_bars, test_bars, step, anchored)
+    if not folds:
+        raise ValueError("学習期間と検証期間に対してデータポイントが不足しています。")
+    return _run_folds(df, [(i, fold, candidates, metric) for i, fold in enumerate(folds)], max_workers)
+
+def rolling_backtest(df, params, window_bars, step=None, max_workers=None):
+    """
+    固定したパラメータを一定の長さの期間ごとにバックテストします（期間ごとの安定性の確認用）。
+
+    Args:
+        df (pd.DataFrame): open, close（と timestamp）列を持つ価格データ
+        params (dict): 戦略のパラメータ
+        window_bars (int): 1期間のバー数
+        step (int): 次の期間までにずらすバー数（省略時は window_bars）
+        max_workers (int): ワーカープロセス数（省略時はCPU数）
+
+    Returns:
+        pd.DataFrame: 期間ごとの評価指標
+    """
+    folds = make_folds(len(df), 0, window_bars, step)
+    return _run_folds(df, [(i, fold, [params], 'final_value') for i, fold in enumerate(folds)], max_workers)
+
+def summarize(results, cash=DEFAULT_CASH):
+    """
+    検証期間の結果を集計します。
+
+    Args:
+        results (pd.DataFrame): walk_forward または rolling_backtest の戻り値
+        cash (float): 各期間の初期資金
+
+    Returns:
+        dict: 期間数、検証期間の損益の合計、勝ち期間の割合、最大ドローダウン
+    """
+    pnl = results['test_final_value'] - cash
+    return {
+        'folds': len(results),
+        'total_pnl': float(pnl.sum()),
+        'win_rate': float((pnl > 0).mean()) if len(results) else 0.0,
+        'max_drawdown': float(results['test_max_drawdown'].max()) if len(results) else 0.0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='EnhancedSmaCrossStrategy のウォークフォワード検証')
+    parser.add_argument('--symbol', default='EURUSD')
+    parser.add_argument('--interval', default='daily')
+    parser.add_argument('--train-bars', type=int, default=1000)
+    parser.add_argument('--test-bars', type=int, default=250)
+    parser.add_argument('--step', type=int, default=None)
+    parser.add_argument('--anchored', action='store_true', help='学習期間の先頭を固定する')
+    parser.add_argument('--method', choices=['grid', 'random'], default='grid')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--metric', choices=METRIC_COLUMNS[:-1], default='final_value')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--db-path', default=DEFAULT_DB_PATH)
+    args = parser.parse_args()
+
+    # backtest_strategy は backtrader を読み込むため、コマンドとして実行した場合のみ読み込む
+    from backtest_strategy import fetch_price_data
+    df = fetch_price_data(args.symbol, args.interval, db_path=args.db_path).reset_index(drop=True)
+
+    results = walk_forward(df, args.train_bars, args.test_bars, args.step, args.anchored,
+                           method=args.method, n_iter=args.iterations, metric=args.metric,
+                           max_workers=args.workers)
+    print(results.to_string(index=False))
+    summary = summarize(results)
+    print(f"検証期間: {summary['folds']}件, 損益合計: {summary['total_pnl']:.5f}, "
+          f"勝率: {summary['win_rate']:.1%}, 最大ドローダウン: {summary['max_drawdown']:.6f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# scripts/watermark.py
+
+from datetime import datetime
+
+import pandas as pd
+
+from data_access import connection, TIMESTAMP_FORMAT
+from setup_database import WATERMARK_TABLE, WATERMARK_DDL
+
+def setup_watermark_table(db_path):
+    """
+    処理済み位置（ハイウォーターマーク）を記録するテーブルを作成します。
+
+    Args:
+        db_path (str): データベースのパス
+    """
+    with connection(db_path) as conn, conn:
+        conn.execute(WATERMARK_DDL)
+
+def get_watermark(db_path, symbol, interval, stage):
+    """
+    指定したシリーズ・処理段階の最終処理タイムスタンプを取得します。
+
+    Args:
+        db_path (str): データベースのパス
+        symbol (str): シンボル名
+        interval (str): データの間隔
+        stage (str): 処理段階名（例: 'pivot_points'）
+
+    Returns:
+        str: 最終処理タイムスタンプ（未処理の場合は None）
+    """
+    setup_watermark_table(db_path)
+    with connection(db_path) as conn:
+        row = conn.execute(
+            f"SELECT last_timestamp FROM {WATERMARK_TABLE} WHERE symbol = ? AND interval = ? AND stage = ?",
+            (symbol, interval, stage)
+        ).fetchone()
+    return row[0] if row else None
+
+def set_watermark(db_path, symbol, interval, stage, last_timestamp):
+    """
+    指定したシリーズ・処理段階の最終処理タイムスタンプを更新します。
+
+    Args:
+        db_path (str): データベースのパス
+        symbol (str): シンボル名
+        interval (str): データの間隔
+        stage (str): 処理段階名
+        last_timestamp: 最終処理タイムスタンプ（文字列または datetime）
+    """
+    if not isinstance(last_timestamp, str):
+        last_timestamp = pd.Timestamp(last_timestamp).strftime(TIMESTAMP_FORMAT)
+
+    setup_watermark_table(db_path)
+    with connection(db_path) as conn, conn:
+        conn.execute(f'''
+            INSERT INTO {WATERMARK_TABLE} (symbol, interval, stage, last_timestamp, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (symbol, interval, stage) DO UPDATE SET
+                last_timestamp = excluded.last_timestamp,
+                updated_at = excluded.updated_at
+        ''', (symbol, interval, stage, last_timestamp, datetime.now().strftime(TIMESTAMP_FORMAT)))
+
+def reset_watermark(db_path, symbol, interval, stage):
+    """
+    ウォーターマークを削除し、次回は全履歴を再処理させます。
+
+    Args:
+        db_path (str): データベースのパス
+        symbol (str): シンボル名
+        interval (str): データの間隔
+        stage (str): 処理段階名
+    """
+    setup_watermark_table(db_path)
+    with connection(db_path) as conn, conn:
+        conn.execute(
+            f"DELETE FROM {WATERMARK_TABLE} WHERE symbol = ? AND interval = ? AND stage = ?",
+            (symbol, interval, stage)
+        )